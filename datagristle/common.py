@@ -6,17 +6,13 @@
 """
 import argparse
 import csv
-import inspect
 import math
 from os.path import isdir, isfile, exists
 from os.path import join as pjoin
-from pprint import pprint as pp
 import sys
 import traceback
 from typing import List, Dict, Any, Optional, Tuple, Union, NoReturn
 
-import psutil
-
 from datagristle._version import __version__
 
 
@@ -163,6 +159,7 @@ def abort(summary: str,
 
 
 def get_tracepath():
+    import inspect  # pylint: disable=import-outside-toplevel
     try:
         curframe = inspect.currentframe()
         curframe = inspect.getouterframes(curframe, 2)
@@ -265,6 +262,7 @@ class MemoryLimiter:
                  max_mem_gbytes: Optional[int] = None):
 
         if max_mem_gbytes is None:
+            import psutil  # pylint: disable=import-outside-toplevel
             total_mem = psutil.virtual_memory().total
             self.max_memory_bytes = total_mem * 0.5
         else:
@@ -18,15 +18,14 @@ import copy
 import json
 import os
 from os.path import isfile, splitext, basename, isabs, dirname, abspath, join as pjoin, exists
-from pprint import pprint as pp
 import sys
-from typing import List, Dict, Any, Callable, Optional, NamedTuple, Tuple
-
-import ruamel.yaml as yaml
+from typing import List, Dict, Any, Callable, Optional, NamedTuple, Tuple, TYPE_CHECKING
 
 from datagristle._version import __version__
 import datagristle.common as comm
 import datagristle.csvhelper as csvhelper
+if TYPE_CHECKING:
+    import datagristle.metadata as metadata
 
 
 CONFIG_TYPE = Dict[str, Any]
@@ -82,6 +81,18 @@ STANDARD_CONFIGS['outfile'] = {'short_name': 'o',
                                'default': '-',
                                'required': True,
                                'type': str}
+STANDARD_CONFIGS['write_buffer_kbytes'] = {'default': 1024,
+                                           'type': int,
+                                           'minimum': 0}
+
+# Batch Config Items:
+STANDARD_CONFIGS['out_dir'] = {'default': None,
+                               'type': str}
+STANDARD_CONFIGS['out_pattern'] = {'default': '{name}',
+                                   'type': str}
+STANDARD_CONFIGS['file_workers'] = {'default': None,
+                                    'type': int,
+                                    'minimum': 1}
 
 # CSV Config Items:
 STANDARD_CONFIGS['delimiter'] = {'short_name': 'd',
@@ -165,16 +176,23 @@ class Config(object):
                  app_name: str,
                  short_help: str,
                  long_help: str,
-                 validate_dialect: bool=True) -> None:
+                 validate_dialect: bool=True,
+                 use_file_facts: bool=False) -> None:
+        """ use_file_facts turns on the caching of file facts like the dialect &
+            header within the metadata db.  Since that db adds sqlalchemy to the
+            startup, it's meant for programs that already use it.
+        """
 
         self.app_name = splitext(basename(app_name))[0]
         self.short_help = short_help
         self.long_help = long_help
         self.validate_dialect = validate_dialect
+        self.use_file_facts = use_file_facts
         self.obsolete_options: Dict[str, Any] = {}
         self._app_metadata: META_CONFIG_TYPE = {}
         self.config: Dict = {}
         self.nconfig = self.NConfig
+        self._file_index_tools: Optional['metadata.FileIndexTools'] = None
 
 
     def extend_config(self,
@@ -256,6 +274,14 @@ class Config(object):
         self.add_standard_metadata('no-skipinitialspace')
 
 
+    def add_all_batch_configs(self):
+        """ Adds the standard set of batch mode config items.
+        """
+        self.add_standard_metadata('out_dir')
+        self.add_standard_metadata('out_pattern')
+        self.add_standard_metadata('file_workers')
+
+
     def add_all_config_configs(self):
         """ Adds the standard set of config items.
         """
@@ -316,6 +342,7 @@ class Config(object):
             if self.nconfig.gen_config_fn.endswith('.yml') or self.nconfig.gen_config_fn.endswith('.yaml'):
                 filtered_config = {k:v for k,v in self.config.items() if k not in ARG_ONLY_CONFIGS}
                 filtered_config = {k:v for k,v in filtered_config.items() if k != 'gen_config_fn'}
+                import ruamel.yaml as yaml  # pylint: disable=import-outside-toplevel
                 yaml.dump(filtered_config, outbuf, indent=4, default_flow_style=False)
             elif self.nconfig.gen_config_fn.endswith('.json'):
                 json.dump(self.config, outbuf)
@@ -374,12 +401,20 @@ class Config(object):
         else:
             filenames = self.config['infiles']
         md = self._app_metadata
-        try:
-            autodetected = csvhelper.get_dialect(filenames,
-                                                 verbosity=self.config['verbosity'])
-        except FileNotFoundError:
-            comm.abort('Error: File not found when generating csv dialect config',
-                       f"One of these files was not found: {','.join(self.config['infiles'])}")
+        autodetected = None
+        if len(filenames) == 1:
+            cached_dialect = self.get_file_facts(filenames[0]).get('dialect')
+            if cached_dialect:
+                autodetected = csvhelper.get_dialect_from_dict(cached_dialect)
+        if autodetected is None:
+            try:
+                autodetected = csvhelper.get_dialect(filenames,
+                                                     verbosity=self.config['verbosity'])
+            except FileNotFoundError:
+                comm.abort('Error: File not found when generating csv dialect config',
+                           f"One of these files was not found: {','.join(self.config['infiles'])}")
+            if len(filenames) == 1:
+                self.set_file_facts(filenames[0], dialect=csvhelper.get_dialect_dict(autodetected))
 
         # First override auto-detected dialect with any explicit options
         overridden = csvhelper.override_dialect(autodetected,
@@ -407,6 +442,20 @@ class Config(object):
         self.update_config('dialect', defaulted)
 
 
+    def generate_csv_dialect_options_config(self) -> None:
+        """ Adds the user's csv dialect options, and the defaults for any
+            they didn't provide - for batch modes that detect the dialect of
+            each input file separately.
+
+            Added by calling programs within the extend_config method.
+        """
+        md = self._app_metadata
+        self.update_config('dialect_options',
+                           {key: self.config[key] for key in csvhelper.DIALECT_OPTIONS})
+        self.update_config('dialect_defaults',
+                           {key: md[key]['extended_default'] for key in csvhelper.DIALECT_OPTIONS})
+
+
     def generate_csv_header_config(self,
                                    override_filename=None):
         """ Adds the csv header to the config.
@@ -419,10 +468,69 @@ class Config(object):
             filenames = self.config['infiles']
         header = csvhelper.Header()
         if filenames[0] != '-':
-            header.load_from_files(filenames, self.config['dialect'])
+            # The cached header is only reusable if it was read with the same dialect:
+            dialect_dict = csvhelper.get_dialect_dict(self.config['dialect'])
+            cached_header = self.get_file_facts(filenames[0]).get('header') if len(filenames) == 1 else None
+            if cached_header and cached_header['dialect'] == dialect_dict:
+                header.load_from_rec(cached_header['raw_field_names'], self.config['dialect'])
+            else:
+                header.load_from_files(filenames, self.config['dialect'])
+                if len(filenames) == 1:
+                    self.set_file_facts(filenames[0],
+                                        header={'dialect': dialect_dict,
+                                                'raw_field_names': header.raw_field_names},
+                                        column_count=len(header.field_names))
         self.update_config('header', header)
 
 
+    def get_file_facts(self,
+                       filename: str) -> Dict[str, Any]:
+        """ Returns the facts cached about a file within the metadata db's file_index.
+
+            Returns an empty dictionary for stdin, for files without cached
+            facts, if use_file_facts is off, or if the metadata db is unavailable.
+        """
+        file_index_tools = self._get_file_index_tools(filename)
+        if file_index_tools is None:
+            return {}
+        from sqlalchemy import exc as sqlalchemy_exc  # pylint: disable=import-outside-toplevel
+        try:
+            return file_index_tools.get_file_facts(filename)
+        except (OSError, sqlalchemy_exc.SQLAlchemyError):
+            return {}
+
+
+    def set_file_facts(self,
+                       filename: str,
+                       **facts: Any) -> None:
+        """ Caches facts about a file within the metadata db's file_index.
+
+            Since this is only a cache, an unavailable metadata db is ignored.
+        """
+        file_index_tools = self._get_file_index_tools(filename)
+        if file_index_tools is None:
+            return
+        from sqlalchemy import exc as sqlalchemy_exc  # pylint: disable=import-outside-toplevel
+        try:
+            file_index_tools.set_file_facts(filename, **facts)
+        except (OSError, ValueError, sqlalchemy_exc.SQLAlchemyError):
+            pass
+
+
+    def _get_file_index_tools(self,
+                              filename: str) -> Optional['metadata.FileIndexTools']:
+        if not self.use_file_facts or filename == '-' or not isfile(filename):
+            return None
+        if self._file_index_tools is None:
+            import datagristle.metadata as metadata  # pylint: disable=import-outside-toplevel
+            from sqlalchemy import exc as sqlalchemy_exc  # pylint: disable=import-outside-toplevel
+            try:
+                self._file_index_tools = metadata.GristleMetaData().file_index_tools
+            except (OSError, sqlalchemy_exc.SQLAlchemyError):
+                return None
+        return self._file_index_tools
+
+
     def _validate_config_metadata(self):
         """ Validates the program's configuration metadata (not the user's input).
         """
@@ -575,6 +683,20 @@ class Config(object):
                                        f"Valid values include: {checks['choices']} ")
 
         self._validate_dialect_with_stdin(config)
+        self._validate_batch_config(config)
+
+
+    def _validate_batch_config(self, config) -> None:
+        if not config.get('out_pattern') or not config.get('out_dir'):
+            return
+
+        if not os.path.isdir(config['out_dir']):
+            comm.abort('Error: out_dir does not exist', config['out_dir'])
+        if config.get('outfile', '-') != '-':
+            comm.abort('Error: outfile and out_dir cannot both be provided',
+                       'Batch mode writes each output file within out_dir')
+        if '-' in config.get('infiles', []):
+            comm.abort('Error: batch mode requires input files - stdin cannot be used')
 
 
     def _validate_dialect_with_stdin(self, config) -> None:
@@ -606,6 +728,7 @@ class Config(object):
                      env_args=None,
                      consolidated_args=None,
                      key=None) -> None:
+        from pprint import pprint as pp  # pylint: disable=import-outside-toplevel
 
         for a_key in self.config.keys():
             if key and key != a_key:
@@ -750,6 +873,7 @@ class _FileArgs(object):
 
         _, file_ext = os.path.splitext(self.config_fn)
         if file_ext in ('.yaml', '.yml'):
+            import ruamel.yaml as yaml  # pylint: disable=import-outside-toplevel
             with open(self.config_fn) as buf:
                 file_args = yaml.YAML(typ='safe', pure=True).load(buf)
         elif file_ext in ('.json'):
@@ -772,6 +896,7 @@ class _FileArgs(object):
         self._convert_file_path('outfiles', output_args)
         self._convert_file_path('outdir', output_args)
         self._convert_file_path('out_dir', output_args)
+        self._convert_file_path('err_dir', output_args)
         self._convert_file_path('tmpdir', output_args)
         self._convert_file_path('source_dir', output_args)
         self._convert_file_path('dest_dir', output_args)
@@ -6,13 +6,22 @@
 """
 
 import csv
-import fileinput
+import functools
+import io
 import os.path
-from pprint import pprint as pp
-from typing import Optional, List, Dict, Any, Union, Type
+from typing import Optional, List, Dict, Any, Union, Type, Tuple
 import _csv
 
 import datagristle.common as comm
+import datagristle.file_compression as file_compression
+
+# The dialect & header are detected from a single sample of up to this many
+# chars from the start of each file:
+SAMPLE_CHARS = 64 * 1024
+
+# The dialect options users can provide - which override the detected dialect:
+DIALECT_OPTIONS = ('delimiter', 'quoting', 'quotechar', 'has_header', 'doublequote',
+                   'escapechar', 'skipinitialspace')
 
 
 
@@ -71,13 +80,28 @@ class Header:
         if file_name == '-':
             comm.abort(f'Invalid file_name for Header: {file_name}')
 
-        reader = csv.reader(open(file_name, newline=''), dialect=dialect)
+        # Use the sample that the dialect was detected from - unless the
+        # first record might run past the end of it:
+        sample, is_complete = get_file_sample(file_name)
+        sample_buf = io.StringIO(sample, newline='')
+        reader = csv.reader(sample_buf, dialect=dialect)
         for field_names in reader:
+            if sample_buf.tell() == len(sample) and not is_complete:
+                with file_compression.open_text_input(file_name) as inbuf:
+                    field_names = next(csv.reader(inbuf, dialect=dialect))
             break
         else:
             raise EOFError
 
+        self.load_from_rec(field_names, dialect)
+
 
+    def load_from_rec(self,
+                      field_names: List[str],
+                      dialect):
+        """ Loads the header from the first record of a file - which will
+            only be treated as field names if the dialect has a header.
+        """
         for field_sub, raw_field_name in enumerate(field_names):
             if dialect.has_header:
                 field_name = self.format_raw_header_field_name(raw_field_name)
@@ -228,6 +252,27 @@ def convert_dialect(std_dialect: Type[_csv.Dialect]) -> Dialect:
 
 
 
+def get_dialect_dict(dialect: Dialect) -> Dict[str, Any]:
+    """ Returns the dialect as a json-serializable dictionary.
+    """
+    return {'delimiter': dialect.delimiter,
+            'has_header': dialect.has_header,
+            'quoting': dialect.quoting,
+            'quotechar': dialect.quotechar,
+            'doublequote': dialect.doublequote,
+            'escapechar': dialect.escapechar,
+            'lineterminator': dialect.lineterminator,
+            'skipinitialspace': dialect.skipinitialspace}
+
+
+
+def get_dialect_from_dict(dialect_dict: Dict[str, Any]) -> Dialect:
+    """ Returns the dialect described by a dictionary from get_dialect_dict().
+    """
+    return Dialect(**dialect_dict)
+
+
+
 def get_dialect(infiles: List[str],
                 delimiter: Optional[str] = None,
                 quoting: Optional[str] = None,
@@ -289,6 +334,33 @@ def get_dialect(infiles: List[str],
 
 
 
+def coalesce_dialect(dialect: Dialect,
+                     delimiter: Optional[str],
+                     quoting: Optional[str],
+                     quotechar: Optional[str],
+                     has_header: Optional[bool],
+                     doublequote: Optional[bool],
+                     escapechar: Optional[str],
+                     skipinitialspace: Optional[bool]) -> Dialect:
+    """ Returns a new dialect with any non-None values from the other args,
+        and the dialect's values for the rest - ex: for an output dialect
+        that defaults to the input's.
+    """
+    def coalesce(value, dialect_value):
+        return dialect_value if value is None else value
+
+    return get_dialect(infiles=['-'],
+                       delimiter=coalesce(delimiter, dialect.delimiter),
+                       quoting=quoting or get_quote_name(dialect.quoting),
+                       quotechar=coalesce(quotechar, dialect.quotechar),
+                       has_header=coalesce(has_header, dialect.has_header),
+                       doublequote=coalesce(doublequote, dialect.doublequote),
+                       escapechar=coalesce(escapechar, dialect.escapechar),
+                       skipinitialspace=coalesce(skipinitialspace, dialect.skipinitialspace),
+                       verbosity='normal')
+
+
+
 def get_empty_dialect() -> Dialect:
     return Dialect(delimiter=None,
                    quoting=None,
@@ -412,44 +484,74 @@ def print_dialect(dialect, name) -> None:
 
 
 
+def get_file_sample(fqfn: str) -> Tuple[str, bool]:
+    """ Returns the first SAMPLE_CHARS of a file, and whether that's the
+        entire file.
+
+    The sample is cached by file name, modification time, and size - so that
+    detecting the dialect and then loading the header only reads it once.
+    Newlines are not translated.
+    """
+    stat = os.stat(fqfn)
+    return _read_file_sample(fqfn, stat.st_mtime_ns, stat.st_size)
+
+
+@functools.lru_cache(maxsize=32)
+def _read_file_sample(fqfn: str,
+                      mtime_ns: int,  # pylint: disable=unused-argument
+                      size: int) -> Tuple[str, bool]:  # pylint: disable=unused-argument
+    with file_compression.open_text_input(fqfn) as inbuf:
+        sample = inbuf.read(SAMPLE_CHARS + 1)
+    return sample[:SAMPLE_CHARS], len(sample) <= SAMPLE_CHARS
+
+
+
 def autodetect_dialect(fqfn: str,
                        read_limit: int = 5000) -> Dialect:
     """ gets the dialect for a file
         Uses the csv.Sniffer class
         Then performs additional processing to try to improve accuracy of quoting.
+
+        All of the detection works from a single sample of the file.
     """
     # Verify we have an actual file - not an input stream:
     assert os.path.isfile(fqfn)
 
-    with open(fqfn, newline='') as csvfile:
-        try:
-            dialect = convert_dialect(csv.Sniffer().sniff(csvfile.read(read_limit)))
-            dialect.lineterminator = '\n'
-            dialect.has_header = None
-        except _csv.Error:
-            #This shouldn't raise error here - since it may get overridden later
-            dialect = get_empty_dialect()
+    sample, is_complete = get_file_sample(fqfn)
+    try:
+        dialect = convert_dialect(csv.Sniffer().sniff(sample[:read_limit]))
+        dialect.lineterminator = '\n'
+        dialect.has_header = None
+    except _csv.Error:
+        #This shouldn't raise error here - since it may get overridden later
+        dialect = get_empty_dialect()
 
+    # The quoting & header checks were written for universal newlines:
+    translated_sample = sample.replace('\r\n', '\n').replace('\r', '\n')
 
     # See if we can improve quoting accuracy:
-    dialect.quoting = _get_dialect_quoting(dialect, fqfn)
+    dialect.quoting = _get_dialect_quoting(dialect, translated_sample, is_complete)
 
     # Populate the escapechar attribute
     dialect.escapechar = _get_dialect_escapechar(dialect)
 
     # Populate the has_header attribute:
-    dialect.has_header = _get_has_header(fqfn, read_limit)
+    dialect.has_header = _get_has_header(translated_sample, read_limit)
 
     return dialect
 
 
 
 def _get_dialect_quoting(dialect: _csv.Dialect,
-                         fqfn: str) -> int:
+                         sample: str,
+                         is_complete: bool) -> int:
     """ Since Sniffer tends to default to QUOTE_MINIMAL we're going to try to
         get a more accurate guess.  In the event that there's an extremely
         consistent set of data that is either all quoted or not quoted at
         all we will return that appropriate value.
+
+        Uses up to the first 1001 lines of the sample - but not a partial last
+        line if the sample isn't the complete file.
     """
 
     # total_field_cnt has a key for each number of fields found in a
@@ -463,7 +565,12 @@ def _get_dialect_quoting(dialect: _csv.Dialect,
     #quoted_field_cnt = collections.defaultdict(int)
     quoted_field_cnt: Dict[Any, Union[int, float]] = {}
 
-    for rec in fileinput.input(fqfn):
+    lines = [line + '\n' for line in sample.split('\n')]
+    lines[-1] = lines[-1][:-1]
+    if not is_complete or not lines[-1]:
+        lines.pop()
+
+    for lineno, rec in enumerate(lines, start=1):
         fields = rec[:-1].split(dialect.delimiter)
         try:
             total_field_cnt[len(fields)] += 1
@@ -480,9 +587,8 @@ def _get_dialect_quoting(dialect: _csv.Dialect,
         except KeyError:
             quoted_field_cnt[quoted_cnt] = 1
 
-        if fileinput.lineno() > 1000:
+        if lineno > 1000:
             break
-    fileinput.close()
 
     # "Exact" scenario: simplest and most clear in which we have no confusing
     # data, every record has the same number of fields and either all are quoted
@@ -524,12 +630,11 @@ def _get_dialect_escapechar(dialect: _csv.Dialect):
         return dialect.escapechar
 
 
-def _get_has_header(fqfn: str,
+def _get_has_header(sample: str,
                     read_limit: int = 50000) -> bool:
-    """ Figure out whether or not there's a header based on the first 50,000 bytes
+    """ Figure out whether or not there's a header based on the first 50,000 chars
         Raises:
             - csv.Snipper() can throw exceptions if it can't interpret file
     """
-    sample = open(fqfn, 'r').read(read_limit)
-    return csv.Sniffer().has_header(sample)
+    return csv.Sniffer().has_header(sample[:read_limit])
 
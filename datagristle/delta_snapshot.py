@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+""" Purpose of this module is to manage the snapshots that let gristle_differ
+    skip preparing its old file.
+
+    Daily diffs typically compare today's file against yesterday's - which was
+    the new file of yesterday's diff, and so was already sorted and deduped
+    then.  A snapshot keeps that prepared copy along with the digest of the
+    file it came from, the settings it was prepared with, and the starting
+    values for any sequences.  The next diff then uses the snapshot rather
+    than reading, sorting and deduping its old file again - as long as the old
+    file's digest and the settings still match.
+
+    Snapshots keep whole rows rather than just a digest per key, since the
+    delete, same and chgold outputs are copies of old rows.
+
+    See the file "LICENSE" for the full license governing this code.
+    Copyright 2011-2022 Ken Farmer
+"""
+import json
+import os
+from os.path import join as pjoin
+import shutil
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import datagristle.csvhelper as csvhelper
+from datagristle.hash_cache import HashCache
+
+SNAPSHOT_VERSION = 1
+DATA_NAME = 'snapshot.csv'
+STATE_NAME = 'snapshot.json'
+
+
+
+class Snapshot(NamedTuple):
+    source_digest: str
+    settings: Dict[str, Any]
+    sequence_starts: Dict[int, int]
+
+
+
+def get_settings(dialect: csvhelper.Dialect,
+                 key_cols: List[int]) -> Dict[str, Any]:
+    """ Returns the settings that a prepared file depends on.
+    """
+    return {'key_cols': list(key_cols),
+            'delimiter': dialect.delimiter,
+            'quoting': dialect.quoting,
+            'quotechar': dialect.quotechar,
+            'escapechar': dialect.escapechar,
+            'doublequote': dialect.doublequote,
+            'skipinitialspace': dialect.skipinitialspace,
+            'has_header': dialect.has_header}
+
+
+
+class SnapshotDir(object):
+    """ Manages the snapshot kept within a directory.
+
+        Should be closed so that the file digests it caches are committed.
+    """
+
+    def __init__(self,
+                 snapshot_dir: str) -> None:
+        os.makedirs(snapshot_dir, exist_ok=True)
+        self.data_fqfn = pjoin(snapshot_dir, DATA_NAME)
+        self.state_fqfn = pjoin(snapshot_dir, STATE_NAME)
+        self.hash_cache = HashCache(snapshot_dir)
+
+
+    def load(self,
+             old_fqfn: str,
+             settings: Dict[str, Any]) -> Optional[Snapshot]:
+        """ Returns the snapshot if it was made from the old file with the same
+            settings - or else None.
+        """
+        try:
+            with open(self.state_fqfn, 'r') as inbuf:
+                state = json.load(inbuf)
+        except (OSError, ValueError):
+            return None
+        if (state.get('version') != SNAPSHOT_VERSION
+                or state['settings'] != settings
+                or not os.path.isfile(self.data_fqfn)):
+            return None
+        if self.hash_cache.get_digest(old_fqfn) != state['source_digest']:
+            return None
+        return Snapshot(source_digest=state['source_digest'],
+                        settings=state['settings'],
+                        sequence_starts={field: start
+                                         for field, start in state['sequence_starts']})
+
+
+    def save(self,
+             new_fqfn: str,
+             prepared_fqfn: str,
+             settings: Dict[str, Any],
+             sequence_starts: Dict[int, int]) -> None:
+        """ Replaces the snapshot with the prepared copy of the new file -
+            which is moved into the snapshot unless it is the new file itself.
+        """
+        source_digest = self.hash_cache.get_digest(new_fqfn)
+
+        # Remove the state first - so that a failure part way through leaves
+        # no snapshot, rather than one that doesn't match its data:
+        if os.path.exists(self.state_fqfn):
+            os.remove(self.state_fqfn)
+        if os.path.realpath(prepared_fqfn) == os.path.realpath(new_fqfn):
+            shutil.copyfile(prepared_fqfn, self.data_fqfn)
+        else:
+            shutil.move(prepared_fqfn, self.data_fqfn)
+
+        temp_fqfn = self.state_fqfn + '.tmp'
+        with open(temp_fqfn, 'w') as outbuf:
+            json.dump({'version': SNAPSHOT_VERSION,
+                       'source_digest': source_digest,
+                       'settings': settings,
+                       'sequence_starts': [[field, start]
+                                           for field, start in sequence_starts.items()]},
+                      outbuf)
+        os.replace(temp_fqfn, self.state_fqfn)
+
+
+    def close(self) -> None:
+        self.hash_cache.close()
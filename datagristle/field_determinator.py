@@ -18,7 +18,6 @@
     Copyright 2011-2021 Ken Farmer
 """
 from operator import itemgetter
-from pprint import pprint as pp
 from typing import Optional, List, Tuple, Dict, Any
 
 import datagristle.common as common
@@ -27,6 +26,7 @@ import datagristle.csvhelper as csvhelper
 import datagristle.field_type as typer
 import datagristle.field_math as mather
 import datagristle.field_misc as miscer
+import datagristle.profile_state as profile_state
 
 #------------------------------------------------------------------------------
 # override miscer.get_field_freq max dictionary size defaults:
@@ -61,12 +61,14 @@ class FieldDeterminator(object):
                  filename: str,
                  field_cnt: int,
                  dialect: csvhelper.Dialect,
-                 verbosity: str='normal') -> None:
+                 verbosity: str='normal',
+                 byte_range: Optional[profile_state.ByteRange] = None) -> None:
 
         self.filename = filename
         self.field_cnt = field_cnt
         self.dialect = dialect
         self.verbosity = verbosity
+        self.byte_range = byte_range  # limits reads to this (start, end) range of offsets
         self.max_freq_number:   Optional[int] = None  # will be set in analyze_fields
 
         #--- public field dictionaries - organized by field_number --- #
@@ -101,7 +103,8 @@ class FieldDeterminator(object):
                        field_number: Optional[int] = None,
                        field_types_overrides: Optional[Dict[int, str]] = None,
                        max_freq_number: Optional[int] = None,
-                       read_limit: int = -1) -> None:
+                       read_limit: int = -1,
+                       prior_fields: Optional[Dict[int, profile_state.FieldState]] = None) -> None:
         """ Determines types, names, and characteristics of fields.
 
             Arguments:
@@ -113,6 +116,9 @@ class FieldDeterminator(object):
                  large high-cardinality fields.
                - read_limit: a performance setting that stops file reads after
                  this number.  The default is -1 which means 'no limit'.
+               - prior_fields: the state of each field from a prior run on the
+                 records before the byte_range - that the records within it
+                 are merged into.
             Returns:
                - Nothing directly - populates instance variables.
         """
@@ -140,13 +146,32 @@ class FieldDeterminator(object):
             else:
                 max_items = max_freq_number
 
-            (self.field_freqs[f_no],
-             self.field_trunc[f_no],
-             self.field_rows_invalid[f_no]) = miscer.get_field_freq(self.filename,
-                                                                    self.dialect,
-                                                                    f_no,
-                                                                    max_items,
-                                                                    read_limit)
+            prior = (prior_fields or {}).get(f_no)
+            if prior is None:
+                (self.field_freqs[f_no],
+                 self.field_trunc[f_no],
+                 self.field_rows_invalid[f_no]) = miscer.get_field_freq(self.filename,
+                                                                        self.dialect,
+                                                                        f_no,
+                                                                        max_items,
+                                                                        read_limit,
+                                                                        self.byte_range)
+            elif prior.truncated:
+                # A full read would have stopped within the prior records too:
+                (self.field_freqs[f_no],
+                 self.field_trunc[f_no],
+                 self.field_rows_invalid[f_no]) = prior
+            else:
+                (self.field_freqs[f_no],
+                 self.field_trunc[f_no],
+                 invalid_row_cnt) = miscer.get_field_freq(self.filename,
+                                                          self.dialect,
+                                                          f_no,
+                                                          max_items,
+                                                          read_limit,
+                                                          self.byte_range,
+                                                          freq=prior.freq)
+                self.field_rows_invalid[f_no] = prior.invalid_row_cnt + invalid_row_cnt
             field_freqs = list(self.field_freqs[f_no].items())
 
             self.field_types[f_no] = typer.get_field_type(self.field_freqs[f_no])
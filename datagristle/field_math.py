@@ -20,7 +20,6 @@
 """
 import math
 from typing import Dict, List, Tuple, Any, Union, Optional
-from pprint import pprint as pp
 
 import datagristle.field_type as field_type
 import datagristle.common as common
@@ -19,11 +19,11 @@
 """
 import csv
 from typing import List, Union, Dict, Tuple, Any, Optional
-from pprint import pprint as pp
 
 import datagristle.field_type as typer
 import datagristle.csvhelper as csvhelper
 import datagristle.common as common
+import datagristle.profile_state as profile_state
 
 MAX_FREQ_SIZE_DEFAULT = 1000000     # limits entries within freq dictionaries
 
@@ -126,7 +126,9 @@ def get_field_freq(filename: str,
                    dialect: csvhelper.Dialect,
                    field_number: int,
                    max_freq_size: int = MAX_FREQ_SIZE_DEFAULT,
-                   read_limit: int = -1) -> Tuple[Dict[Any, int], bool, int]:
+                   read_limit: int = -1,
+                   byte_range: Optional[profile_state.ByteRange] = None,
+                   freq: Optional[Dict[Any, int]] = None) -> Tuple[Dict[Any, int], bool, int]:
     """ Collects a frequency distribution for a single field by reading the
         file provided.
 
@@ -138,6 +140,10 @@ def get_field_freq(filename: str,
               over 1M.  A value of -1 will result in 'no limit'.
             - read_limit:  A performance option that stops reading after this
               number of records.  The default is -1 which means, no limit.
+            - byte_range: optionally limits reading to the records within this
+              (start, end) range of byte offsets.
+            - freq: optionally a prior frequency distribution to add the
+              counts to - which is updated in place.
 
         Returns:
             - freq: a dictionary of values & counts
@@ -150,16 +156,21 @@ def get_field_freq(filename: str,
         Issues:
             - has limited checking for wrong number of fields in rec
     """
-    freq: Dict[Any, int] = {}
+    freq = {} if freq is None else freq
     truncated = False
     invalid_row_cnt = 0
 
     row_cnt = 0
-    with open(filename, 'rt', newline='') as infile:
+    if byte_range is None:
+        infile = open(filename, 'rt', newline='')
+    else:
+        infile = profile_state.open_byte_range(filename, byte_range)
+    has_header = dialect.has_header and (byte_range is None or byte_range[0] == 0)
+    with infile:
         reader = csv.reader(infile, dialect)
         for fields in reader:
             row_cnt += 1
-            if row_cnt == 1 and dialect.has_header:
+            if row_cnt == 1 and has_header:
                 continue
             try:
                 freq[fields[field_number].strip()] += 1
@@ -20,7 +20,6 @@
 import datetime
 import math
 from itertools import groupby
-from pprint import pprint as pp
 from typing import Any, List, Tuple, Dict, Optional, Union
 
 
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+""" Supports batch modes - which process many input files into a separate
+    output file for each, and spread the files across a pool of worker
+    processes.
+
+    This is much faster than running a program once per file: the files
+    don't each pay for interpreter startup & imports, and every cpu gets
+    used.  Each file's csv dialect is detected separately, once, within
+    the worker that processes it.
+
+    See the file "LICENSE" for the full license governing this code.
+    Copyright 2011-2022 Ken Farmer
+"""
+import concurrent.futures
+import csv
+import errno
+import functools
+import os
+from os.path import basename, isdir, join as pjoin, realpath, splitext
+import sys
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import datagristle.csvhelper as csvhelper
+import datagristle.file_io as file_io
+
+# Up to this many files are handed to a worker at a time:
+MAX_CHUNK_SIZE = 64
+
+
+
+class BatchFile(NamedTuple):
+    infile: str
+    outfile: str
+    errfile: Optional[str] = None
+
+
+
+class BatchResult(NamedTuple):
+    batch_file: BatchFile
+    returncode: int
+    rec_cnt: int = 0
+    invalid_rec_cnt: int = 0
+    error: Optional[str] = None
+
+
+
+def get_batch_files(infiles: List[str],
+                    out_dir: str,
+                    out_pattern: str = '{name}',
+                    err_dir: Optional[str] = None) -> List[BatchFile]:
+    """ Maps each input file to an output file within out_dir - and
+        optionally to an error file within err_dir.
+
+    Input directories are replaced by the files within them.  The output
+    file names come from out_pattern, which can use {name} for the input
+    file name, {stem} for the name without its extension, and {ext} for
+    the extension.
+
+    Raises:
+        ValueError: for an invalid out_pattern, no input files, or output
+            files that would collide with each other or overwrite an input.
+    """
+    all_infiles = expand_infiles(infiles)
+    if not all_infiles:
+        raise ValueError('No input files were found')
+    real_infiles = {realpath(infile) for infile in all_infiles}
+    real_outfiles: Dict[str, str] = {}
+
+    batch_files = []
+    for infile in all_infiles:
+        out_name = get_out_name(infile, out_pattern)
+        outfile = pjoin(out_dir, out_name)
+        errfile = pjoin(err_dir, out_name) if err_dir else None
+        for fqfn in (outfile, errfile):
+            if fqfn is None:
+                continue
+            if realpath(fqfn) in real_infiles:
+                raise ValueError(f'Output file would overwrite an input file: {fqfn}')
+            if realpath(fqfn) in real_outfiles:
+                raise ValueError(f'Input files {real_outfiles[realpath(fqfn)]} and {infile} '
+                                 f'would both be written to: {fqfn}')
+            real_outfiles[realpath(fqfn)] = infile
+        batch_files.append(BatchFile(infile, outfile, errfile))
+    return batch_files
+
+
+
+def expand_infiles(infiles: List[str]) -> List[str]:
+    """ Returns the input files with any directories replaced by the
+        regular, non-hidden files within them - in name order.
+    """
+    all_infiles = []
+    for infile in infiles:
+        if isdir(infile):
+            with os.scandir(infile) as entries:
+                all_infiles.extend(sorted(entry.path for entry in entries
+                                          if entry.is_file() and not entry.name.startswith('.')))
+        else:
+            all_infiles.append(infile)
+    return all_infiles
+
+
+
+def get_out_name(infile: str,
+                 out_pattern: str) -> str:
+    """ Returns the output file name for an input file.
+
+    Raises:
+        ValueError: if the pattern can't be used - ex: it has unknown
+            fields, or the resulting name includes a directory.
+    """
+    name = basename(infile)
+    stem, ext = splitext(name)
+    try:
+        out_name = out_pattern.format(name=name, stem=stem, ext=ext)
+    except (KeyError, IndexError, ValueError) as err:
+        raise ValueError(f'Invalid out_pattern: {out_pattern} - only {{name}}, {{stem}} '
+                         'and {ext} can be used') from err
+    if not out_name or os.sep in out_name:
+        raise ValueError(f'Invalid out_pattern: {out_pattern} - it must produce a file name')
+    return out_name
+
+
+
+def get_file_dialect(infile: str,
+                     dialect_options: Dict[str, Any],
+                     dialect_defaults: Dict[str, Any]) -> csvhelper.Dialect:
+    """ Returns a file's dialect - by auto-detecting it, overriding that with
+        the user's dialect options, and then defaulting anything still missing.
+
+    Raises:
+        EOFError: if the file is empty
+    """
+    dialect = csvhelper.get_dialect([infile], **dialect_options)
+    return csvhelper.default_dialect(dialect, **dialect_defaults)
+
+
+
+def process_files(task: Callable[[BatchFile], BatchResult],
+                  batch_files: List[BatchFile],
+                  workers: Optional[int] = None,
+                  initializer: Optional[Callable[..., None]] = None,
+                  initargs: Tuple = ()) -> Iterator[BatchResult]:
+    """ Runs the task on every batch file, and returns the results in the
+        order of the batch files.
+
+    Args:
+        task: processes a single file, and must be picklable - so either a
+            module-level function, or a functools.partial of one.
+        workers: the number of worker processes, defaults to the number of
+            cpus.  Just one runs the tasks within this process.
+        initializer: sets up each worker before it runs any tasks
+    """
+    workers = min(workers or os.cpu_count() or 1, len(batch_files))
+    safe_task = functools.partial(_run_task, task)
+    if workers <= 1:
+        if initializer:
+            initializer(*initargs)
+        yield from map(safe_task, batch_files)
+        return
+
+    # Forked workers would otherwise write out any buffered output again on exit:
+    sys.stdout.flush()
+    sys.stderr.flush()
+    chunksize = max(1, min(MAX_CHUNK_SIZE, len(batch_files) // (workers * 4)))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+                                                initializer=initializer,
+                                                initargs=initargs) as executor:
+        yield from executor.map(safe_task, batch_files, chunksize=chunksize)
+
+
+
+def _run_task(task: Callable[[BatchFile], BatchResult],
+              batch_file: BatchFile) -> BatchResult:
+    """ Turns the errors that should only fail a single file into its result.
+    """
+    try:
+        return task(batch_file)
+    except EOFError:
+        return BatchResult(batch_file, errno.ENODATA)
+    except (csv.Error, OSError, UnicodeError) as err:
+        return BatchResult(batch_file, 1, error=f'{type(err).__name__}: {err}')
+
+
+
+def report_results(results: Iterable[BatchResult],
+                   verbosity: str) -> int:
+    """ Reports any failed files as the results arrive, and returns the
+        batch's exit code.
+
+    The exit code is 1 if any file failed, else 74 (EBADMSG) if any had
+    invalid records, else 61 (ENODATA) if any were empty, else 0.
+    """
+    file_cnt = rec_cnt = invalid_rec_cnt = 0
+    returncodes = set()
+    for result in results:
+        file_cnt += 1
+        rec_cnt += result.rec_cnt
+        invalid_rec_cnt += result.invalid_rec_cnt
+        returncodes.add(result.returncode)
+        if result.error:
+            print(f'Error: {result.batch_file.infile} failed: {result.error}', file=sys.stderr)
+        elif result.returncode == errno.ENODATA and verbosity != 'quiet':
+            print(f'Warning: {result.batch_file.infile} is empty', file=sys.stderr)
+
+    if verbosity in ('high', 'debug'):
+        print('')
+        print('file_cnt         | %d ' % file_cnt)
+        print('input_cnt        | %d ' % rec_cnt)
+        print('invalid_cnt      | %d ' % invalid_rec_cnt)
+
+    for returncode in (1, errno.EBADMSG, errno.ENODATA):
+        if returncode in returncodes:
+            return returncode
+    return 0
+
+
+
+def convert_file(batch_file: BatchFile,
+                 dialect_options: Dict[str, Any],
+                 dialect_defaults: Dict[str, Any],
+                 out_dialect_options: Dict[str, Any],
+                 buffer_size: int) -> BatchResult:
+    """ The gristle_converter task - which copies a file into its output file
+        while converting its csv dialect.
+    """
+    dialect = get_file_dialect(batch_file.infile, dialect_options, dialect_defaults)
+    out_dialect = csvhelper.coalesce_dialect(dialect, **out_dialect_options)
+
+    bytes_converter = file_io.get_bytes_converter([batch_file.infile], batch_file.outfile,
+                                                  dialect, out_dialect)
+    if bytes_converter:
+        rec_cnt = bytes_converter.convert(batch_file.infile, batch_file.outfile, buffer_size)
+        return BatchResult(batch_file, 0, rec_cnt)
+
+    input_handler = file_io.InputHandler([batch_file.infile], dialect)
+    output_handler = file_io.OutputHandler(batch_file.outfile, out_dialect, buffer_size=buffer_size)
+    try:
+        file_io.copy_recs(input_handler, output_handler)
+    finally:
+        input_handler.close()
+        output_handler.close()
+    return BatchResult(batch_file, 0, input_handler.rec_cnt)
@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+""" Provides transparent reading & writing of compressed files.
+
+    Supported compressions are gzip, bz2, xz, and zstd.  Compression is
+    identified by the file extension, or when reading, by the file's magic
+    bytes.  Decompression runs in a background thread so that it overlaps
+    with csv parsing.  Zstd uses the zstandard package if it's installed,
+    and otherwise falls back to piping through the zstd command.
+
+    See the file "LICENSE" for the full license governing this code.
+    Copyright 2011-2022 Ken Farmer
+"""
+import bz2
+import gzip
+import io
+import lzma
+from os.path import splitext, isfile
+import queue
+import shutil
+import subprocess
+import sys
+import threading
+from typing import Optional, IO, Union
+
+import datagristle.common as comm
+
+
+EXTENSIONS = {'.gz': 'gzip',
+              '.bz2': 'bz2',
+              '.xz': 'xz',
+              '.zst': 'zstd'}
+
+MAGIC_BYTES = {b'\x1f\x8b': 'gzip',
+               b'BZh': 'bz2',
+               b'\xfd7zXZ\x00': 'xz',
+               b'\x28\xb5\x2f\xfd': 'zstd'}
+MAGIC_BYTES_LEN = max(len(magic) for magic in MAGIC_BYTES)
+
+CHUNK_BYTES = 1024 * 1024
+MAX_QUEUED_CHUNKS = 8
+
+
+
+def get_compression_from_name(fqfn: str) -> Optional[str]:
+    """ Returns the compression implied by the file's extension, or None.
+    """
+    return EXTENSIONS.get(splitext(fqfn)[1].lower())
+
+
+
+def get_compression_from_magic(magic: bytes) -> Optional[str]:
+    """ Returns the compression identified by the leading bytes of a file, or None.
+    """
+    for magic_bytes, compression in MAGIC_BYTES.items():
+        if magic.startswith(magic_bytes):
+            return compression
+    return None
+
+
+
+def get_compression(fqfn: str) -> Optional[str]:
+    """ Returns the compression of an existing file - based first on its
+        extension and then on its magic bytes.
+    """
+    compression = get_compression_from_name(fqfn)
+    if compression is None and isfile(fqfn):
+        with open(fqfn, 'rb') as inbuf:
+            compression = get_compression_from_magic(inbuf.read(MAGIC_BYTES_LEN))
+    return compression
+
+
+
+def open_text_input(fqfn: str,
+                    buffering: int = -1,
+                    newline: Optional[str] = '') -> IO[str]:
+    """ Opens a file for text reading - decompressing it if necessary.
+
+    By default universal newlines translation is turned off, just like the
+    csv module expects.
+    """
+    compression = get_compression(fqfn)
+    if compression is None:
+        return open(fqfn, 'rt', newline=newline, encoding='utf-8', buffering=buffering)
+    return wrap_compressed_input(open(fqfn, 'rb'), compression, buffering, newline)
+
+
+
+def wrap_compressed_input(raw_input: IO[bytes],
+                          compression: str,
+                          buffering: int = -1,
+                          newline: Optional[str] = '') -> IO[str]:
+    """ Wraps an open binary input (file or stdin) with a text stream of its
+        decompressed contents.  Closing the text stream closes raw_input.
+    """
+    reader = DecompressingReader(raw_input, compression)
+    buffer_size = buffering if buffering > 0 else io.DEFAULT_BUFFER_SIZE
+    return io.TextIOWrapper(io.BufferedReader(reader, buffer_size),  # type: ignore
+                            encoding='utf-8', newline=newline)
+
+
+
+def open_text_output(fqfn: str,
+                     compression: str,
+                     mode: str = 'wt',
+                     buffering: int = -1) -> IO[str]:
+    """ Opens a file for compressed text writing.
+    """
+    assert mode in ('wt', 'at', 'w', 'a')
+    binary_mode = mode[0] + 'b'
+    raw_output: Union[IO[bytes], ZstdProcessWriter]
+    if compression == 'gzip':
+        raw_output = gzip.open(fqfn, binary_mode)
+    elif compression == 'bz2':
+        raw_output = bz2.open(fqfn, binary_mode)
+    elif compression == 'xz':
+        raw_output = lzma.open(fqfn, binary_mode)
+    elif compression == 'zstd':
+        raw_output = _open_zstd_output(fqfn, binary_mode)
+    else:
+        raise ValueError(f'Invalid compression: {compression}')
+    buffer_size = buffering if buffering > 0 else io.DEFAULT_BUFFER_SIZE
+    return io.TextIOWrapper(io.BufferedWriter(raw_output, buffer_size),  # type: ignore
+                            encoding='utf-8', newline='')
+
+
+
+def _open_zstd_output(fqfn: str,
+                      binary_mode: str):
+    try:
+        import zstandard  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        _check_zstd_command()
+        return ZstdProcessWriter(fqfn, binary_mode)
+    return zstandard.open(fqfn, binary_mode)
+
+
+
+def _check_zstd_command() -> None:
+    if shutil.which('zstd') is None:
+        comm.abort('Error: zstd files require either the zstandard package or the zstd command')
+
+
+
+class DecompressingReader(io.RawIOBase):
+    """ Provides the decompressed contents of a binary input.
+
+    A background thread reads & decompresses the input a chunk at a time
+    into a small queue, from which readinto() hands out bytes.  Since zlib,
+    bz2, lzma and zstandard all release the GIL while decompressing, this
+    runs in parallel with the csv parsing of the prior chunks.
+    """
+
+    def __init__(self,
+                 raw_input: IO[bytes],
+                 compression: str) -> None:
+
+        self.raw_input = raw_input
+        self.compression = compression
+        self.chunks: queue.Queue = queue.Queue(maxsize=MAX_QUEUED_CHUNKS)
+        self.pending = memoryview(b'')
+        self.at_eof = False
+        self.stopping = threading.Event()
+        self.proc: Optional[subprocess.Popen] = None
+
+        decompressed_input = self._get_decompressed_input()
+        self.thread = threading.Thread(target=self._decompress,
+                                       args=(decompressed_input,),
+                                       daemon=True)
+        self.thread.start()
+
+
+    def _get_decompressed_input(self):
+        if self.compression == 'gzip':
+            return gzip.GzipFile(fileobj=self.raw_input, mode='rb')
+        elif self.compression == 'bz2':
+            return bz2.BZ2File(self.raw_input, mode='rb')
+        elif self.compression == 'xz':
+            return lzma.LZMAFile(self.raw_input, mode='rb')
+        elif self.compression == 'zstd':
+            try:
+                import zstandard  # pylint: disable=import-outside-toplevel
+                return zstandard.ZstdDecompressor().stream_reader(self.raw_input,
+                                                                  read_across_frames=True)
+            except ImportError:
+                _check_zstd_command()
+                fqfn = getattr(self.raw_input, 'name', None)
+                if not isinstance(fqfn, str) or not isfile(fqfn):
+                    comm.abort('Error: reading zstd from stdin requires the zstandard package')
+                self.proc = subprocess.Popen(['zstd', '-dcq', fqfn],
+                                             stdout=subprocess.PIPE)
+                return self.proc.stdout
+        else:
+            raise ValueError(f'Invalid compression: {self.compression}')
+
+
+    def _decompress(self,
+                    decompressed_input) -> None:
+        """ Runs within the background thread.  Any exception is handed over
+            to the reader to raise from readinto().
+        """
+        try:
+            while not self.stopping.is_set():
+                chunk = decompressed_input.read(CHUNK_BYTES)
+                if not chunk and self.proc and self.proc.wait():
+                    raise IOError(f'zstd failed with return code: {self.proc.returncode}')
+                self._put(chunk)
+                if not chunk:
+                    break
+        except Exception as err:  # pylint: disable=broad-except
+            self._put(err)
+
+
+    def _put(self,
+             item: Union[bytes, Exception]) -> None:
+        while not self.stopping.is_set():
+            try:
+                self.chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+
+    def readable(self) -> bool:
+        return True
+
+
+    def readinto(self, buf) -> int:
+        if not self.pending:
+            if self.at_eof:
+                return 0
+            item = self.chunks.get()
+            if isinstance(item, Exception):
+                raise item
+            if not item:
+                self.at_eof = True
+                return 0
+            self.pending = memoryview(item)
+        size = min(len(buf), len(self.pending))
+        buf[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+
+    def close(self) -> None:
+        # At interpreter shutdown the daemon thread may be frozen while holding
+        # locks on our inputs - so leave the cleanup to the os.
+        if not self.closed and not sys.is_finalizing():
+            self.stopping.set()
+            if self.proc:
+                self.proc.kill()
+                self.proc.wait()
+            self.thread.join()
+            if self.proc:
+                self.proc.stdout.close()  # type: ignore
+            self.raw_input.close()
+        super().close()
+
+
+
+class ZstdProcessWriter(io.RawIOBase):
+    """ Writes zstd files by piping through the zstd command - for when the
+        zstandard package isn't installed.
+    """
+
+    def __init__(self,
+                 fqfn: str,
+                 binary_mode: str) -> None:
+        self.outfile = open(fqfn, binary_mode)
+        self.proc = subprocess.Popen(['zstd', '-c', '-q'],
+                                     stdin=subprocess.PIPE,
+                                     stdout=self.outfile)
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, buf) -> int:
+        self.proc.stdin.write(buf)  # type: ignore
+        return len(buf)
+
+    def close(self) -> None:
+        if not self.closed:
+            self.proc.stdin.close()  # type: ignore
+            self.proc.wait()
+            self.outfile.close()
+            if self.proc.returncode:
+                raise IOError(f'zstd failed with return code: {self.proc.returncode}')
+        super().close()
@@ -1,7 +1,6 @@
 #!/usr/bin/env python
 
 import csv
-from pprint import pprint as pp
 from os.path import isdir
 from os.path import dirname, basename
 from os.path import join  as pjoin
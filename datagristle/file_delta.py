@@ -5,12 +5,12 @@ import json
 from os.path import isfile
 from os.path import basename
 from os.path import join  as pjoin
-from pprint import pprint as pp
 from typing import Dict, Tuple, List, Union, Any, Optional, IO
 
 import datagristle.common as comm
 from datagristle.common import abort
 import datagristle.csvhelper as csvhelper
+import datagristle.file_io as file_io
 
 OUTPUT_TYPES = ['insert', 'delete', 'same', 'chgnew', 'chgold']
 
@@ -26,6 +26,8 @@ class FileDelta:
     Args:
         out_dir: the output file directory
         dialect: a csv dialect object
+        buffer_size: the write buffer size in bytes for each of the output
+            files, 0 falls back to python's default buffering
     Raises:
         ValueError: if field_type is invalid
         ValueError: if the same field is referenced by ignore_fields and key_fields
@@ -33,9 +35,11 @@ class FileDelta:
 
     def __init__(self,
                  out_dir: str,
-                 dialect: csvhelper.Dialect) -> None:
+                 dialect: csvhelper.Dialect,
+                 buffer_size: int = file_io.DEFAULT_BUFFER_BYTES) -> None:
         self.out_dir = out_dir
         self.dialect = dialect
+        self.buffer_size = buffer_size
         self.join_fields: FieldPositionsType = []
         self.compare_fields: FieldPositionsType = []
         self.ignore_fields: FieldPositionsType = []
@@ -127,15 +131,18 @@ class FileDelta:
         self._validate_fields()
 
         # set up input csv readers
-        old_f = open(old_fqfn, 'r')
+        old_f = open(old_fqfn, 'r', buffering=file_io.DEFAULT_BUFFER_BYTES)
+        file_io.advise_sequential(old_f)
         self.old_csv = csv.reader(old_f, dialect=self.dialect)
-        new_f = open(new_fqfn, 'r')
+        new_f = open(new_fqfn, 'r', buffering=file_io.DEFAULT_BUFFER_BYTES)
+        file_io.advise_sequential(new_f)
         self.new_csv = csv.reader(new_f, dialect=self.dialect)
 
         # set up output files, counts and writers
         for outtype in OUTPUT_TYPES:
             self.out_fqfn[outtype] = pjoin(self.out_dir, self._get_name(new_fqfn, outtype))
-            self.out_file[outtype] = open(self.out_fqfn[outtype], 'w')
+            self.out_file[outtype] = open(self.out_fqfn[outtype], 'w',
+                                          buffering=self.buffer_size or -1)
             self.out_writer[outtype] = csv.writer(self.out_file[outtype],
                                                   dialect=self.dialect)
         # prime the main loop
@@ -493,19 +500,57 @@ class DeltaAssignments:
         return str(self.seq[src_field]['last_val'])
 
 
+    def get_sequence_maxes(self,
+                           dialect: csvhelper.Dialect,
+                           fqfn: str) -> Dict[int, int]:
+        """ Returns the max values of the sequence fields within a file - which
+            are the starting values that set_sequence_starts would find if it
+            were the old file.  Every record is read - not just those that
+            survive deduping.  Fields without any values, or with non-integer
+            values, are left out - so that set_sequence_starts will read the
+            file for them.
+        """
+        fields = [src_field for src_field in self.seq if src_field is not None]
+        if not fields:
+            return {}
+        maxes: Dict[int, Optional[int]] = {src_field: None for src_field in fields}
+        with open(fqfn, 'rt') as infile:
+            for rec in csv.reader(infile, dialect):
+                for src_field in list(maxes):
+                    if rec[src_field].strip() == '':
+                        continue
+                    try:
+                        new_val = int(rec[src_field])
+                    except ValueError:
+                        del maxes[src_field]
+                        continue
+                    if maxes[src_field] is None or new_val > maxes[src_field]:
+                        maxes[src_field] = new_val
+        return {src_field: max_val for src_field, max_val in maxes.items() if max_val is not None}
+
+
     def set_sequence_starts(self,
                             dialect: csvhelper.Dialect,
-                            old_fqfn: str) -> None:
+                            old_fqfn: str,
+                            known_starts: Optional[Dict[int, int]] = None) -> None:
         """ Sets all sequences to their starting values.
 
         Args:
             dialect: csv dialect of input files
             old_fqfn: fully-qualified old file name
+            known_starts: starting values of sequence fields that are already
+                known - ex: from a snapshot of the old file.  The old file is
+                only read if some sequences still lack a starting value.
         Returns:
             None
         Raises:
             sys.exit: if invalid values found in csv sequence field
         """
+        for src_field, start_val in (known_starts or {}).items():
+            if src_field in self.seq and self.seq[src_field]['start_val'] is None:
+                self.seq[src_field]['start_val'] = start_val
+                self.seq[src_field]['last_val'] = start_val
+
         for key in self.seq:
             if self.seq[key]['start_val'] is None:
                 break
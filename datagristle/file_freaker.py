@@ -1,5 +1,4 @@
 import operator
-from pprint import pprint as pp
 import sys
 from typing import Any, Dict, List, Tuple
 
@@ -8,9 +8,9 @@ import csv
 import errno
 import fileinput
 import io
+import itertools
 import os
 from os.path import join as pjoin
-from pprint import pprint as pp
 import random
 import sys
 import tempfile
@@ -18,6 +18,13 @@ import time
 from typing import List, Optional
 
 import datagristle.csvhelper as csvhelper
+import datagristle.file_compression as file_compression
+
+
+SPOOL_MAX_MEM_BYTES = 256 * 1024 * 1024
+DEFAULT_BATCH_SIZE = 1_000
+DEFAULT_BUFFER_BYTES = 1024 * 1024
+SAMPLE_BLOCK_BYTES = 64 * 1024
 
 
 
@@ -35,22 +42,27 @@ class InputHandler(object):
         - if return_header==True then the first read will be of the header record.  This is
           helpful for programs that need it - like gristle_slicer & gristle_viewer.  Otherwise,
           the header is not returned, but simply kept within self.header.
+        - col_index: if provided, every record (including the header) will only consist
+          of these columns in this order - see ProjectingReader.
     """
 
 
     def __init__(self,
                  files: List[str],
                  dialect: csvhelper.Dialect,
-                 return_header: bool = False) -> None:
+                 return_header: bool = False,
+                 col_index: Optional[List[int]] = None) -> None:
 
         self.dialect = dialect
         self.header: List[str] = []
         self.return_header = return_header
+        self.col_index = col_index
         self.files = files
         self.files_read = 0
         self.rec_cnt = 0                # does not count header records
         self.curr_file_rec_cnt = 0      # does not count header records
         self.infile = None
+        self.input_stream = None
         self.eof = False
 
         # If dialect.has_header==True then it will try to read the header.  If the file is empty
@@ -72,15 +84,25 @@ class InputHandler(object):
             # This will only run once
             if os.isatty(0):  # checks if data was piped into stdin
                 sys.exit(errno.ENODATA)
-            input_stream = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', newline='')
-            self.csv_reader = csv.reader(input_stream, dialect=self.dialect)
+            magic = sys.stdin.buffer.peek(file_compression.MAGIC_BYTES_LEN)
+            compression = file_compression.get_compression_from_magic(magic)
+            if compression:
+                self.input_stream = file_compression.wrap_compressed_input(sys.stdin.buffer,
+                                                                           compression,
+                                                                           DEFAULT_BUFFER_BYTES)
+            else:
+                self.input_stream = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', newline='')
+            self.csv_reader = self._get_reader(self.input_stream)
             self.infile = sys.stdin
             self.files_read = 1
             self.curr_file_rec_cnt = 0
             handle_header()
         elif self.files_read < len(self.files):
-            self.infile = open(self.files[self.files_read - 1], 'rt', newline='', encoding='utf-8')
-            self.csv_reader = csv.reader(self.infile, dialect=self.dialect)
+            self.infile = file_compression.open_text_input(self.files[self.files_read - 1],
+                                                           buffering=DEFAULT_BUFFER_BYTES)
+            advise_sequential(self.infile)
+            self.input_stream = self.infile
+            self.csv_reader = self._get_reader(self.input_stream)
             self.files_read += 1
             self.curr_file_rec_cnt = 0
             handle_header()
@@ -88,6 +110,26 @@ class InputHandler(object):
             raise StopIteration
 
 
+    def _get_reader(self, input_stream):
+        if self.col_index is None:
+            return csv.reader(input_stream, dialect=self.dialect)
+        else:
+            return ProjectingReader(input_stream, self.dialect, self.col_index)
+
+
+    def set_col_projection(self,
+                           col_index: List[int]) -> None:
+        """ Limits all records from here on to the columns within col_index.
+
+        Must be called before any records have been read - since the csv
+        reader for the current file is replaced.
+        """
+        assert self.rec_cnt == 0
+        self.col_index = col_index
+        if self.input_stream is not None:
+            self.csv_reader = self._get_reader(self.input_stream)
+
+
     def __iter__(self):
         return self
 
@@ -118,6 +160,33 @@ class InputHandler(object):
         return rec
 
 
+    def read_batch(self,
+                   batch_size: int = DEFAULT_BATCH_SIZE) -> List[List[str]]:
+        """ Returns a list of up to batch_size input records, or an empty list
+            once all files have been read.
+
+        This avoids the per-record overhead of __next__ for programs that can
+        work through a list of records at a time.  Counts are only updated
+        once per batch, and a batch never spans two files - so files_read and
+        curr_file_rec_cnt still describe every record within it.
+        """
+        while True:
+            batch = list(itertools.islice(self.csv_reader, batch_size))
+            if batch:
+                self.rec_cnt += len(batch)
+                self.curr_file_rec_cnt += len(batch)
+                return batch
+
+            if self.files[0] == '-' and self.files_read == 1 and self.curr_file_rec_cnt == 0:
+                sys.exit(errno.ENODATA)
+            self.infile.close()
+            try:
+                self._open_next_input_file()
+            except StopIteration:
+                self.eof = True
+                return []
+
+
     def close(self) -> None:
         if self.files[0] != '-' and self.infile:
             self.infile.close()
@@ -143,12 +212,221 @@ class InputHandler(object):
 
 
 
+class ProjectingReader(object):
+    """ A csv reader that only builds the fields identified by col_index
+
+    Example usage:
+        reader = file_io.ProjectingReader(inbuf, dialect, col_index=[3, 0])
+        for rec in reader:
+            ...
+    Notes:
+        - Each record returned consists of the fields in col_index, in that
+          order.  Offsets beyond the end of a short record are skipped - just
+          like with slice_processor's get_cols_from_index().
+        - Lines without any quotechar or escapechar are split directly and
+          only up to the last needed column - the rest of the line is never
+          broken into fields.  Any other line is handed to a regular csv reader,
+          which will also pick up any continuation lines of a quoted newline.
+        - Dialects with skipinitialspace or QUOTE_NONNUMERIC always use the csv
+          reader since a plain split can't reproduce their field values.
+        - col_index must only have positive offsets.
+    """
+
+    def __init__(self,
+                 input_stream,
+                 dialect: csvhelper.Dialect,
+                 col_index: List[int]) -> None:
+
+        assert min(col_index, default=0) >= 0
+        self.col_index = col_index
+        self.delimiter = dialect.delimiter
+        self.maxsplit = max(col_index, default=0) + 1
+        self.lines = iter(input_stream)
+        self.pending_line: Optional[str] = None
+        self.csv_reader = csv.reader(self._feed_csv_reader(), dialect=dialect)
+
+        self.escapechar = dialect.escapechar or None
+        self.quotechar = dialect.quotechar if dialect.quoting != csv.QUOTE_NONE else None
+        self.splittable = not (dialect.skipinitialspace
+                               or dialect.quoting == csv.QUOTE_NONNUMERIC)
+
+
+    def _feed_csv_reader(self):
+        """ Feeds the csv reader the line that we're handing off, and then any
+            following lines it needs to finish the record.
+        """
+        while True:
+            if self.pending_line is not None:
+                line, self.pending_line = self.pending_line, None
+                yield line
+            else:
+                try:
+                    yield next(self.lines)
+                except StopIteration:
+                    return
+
+
+    def __iter__(self):
+        return self
+
+
+    def __next__(self) -> List[str]:
+        line = next(self.lines)
+        if (self.splittable
+                and (self.quotechar is None or self.quotechar not in line)
+                and (self.escapechar is None or self.escapechar not in line)):
+            line = line.rstrip('\r\n')
+            fields = line.split(self.delimiter, self.maxsplit) if line else []
+        else:
+            self.pending_line = line
+            fields = next(self.csv_reader)
+
+        field_cnt = len(fields)
+        return [fields[col] for col in self.col_index if col < field_cnt]
+
+
+
+
+class InputSpooler(object):
+    """ Spools all records from an InputHandler so that they can be counted and
+        then read again - typically for stdin, which can only be read once.
+
+    Example usage:
+        input_handler = file_io.InputSpooler(input_handler,
+                                             temp_prefix='gristle_slicer_stdin_temp_')
+        rec_cnt = input_handler.spooled_rec_cnt
+        for rec in input_handler:
+            ...
+    Notes:
+        - Records are held in memory until they exceed max_mem_bytes, at which
+          point they're spilled to a temp file and the rest of the input is
+          streamed to that file.  So small inputs never touch the disk.
+        - Records are counted as they're spooled, so callers don't need a
+          separate counting pass over the data.
+        - The temp file uses the csv module's default dialect regardless of the
+          input dialect, since that can round-trip any record.  It's the caller's
+          responsibility to delete temp_fn once done with it.
+        - The first record is kept in first_rec, which will be the header if the
+          input_handler was created with return_header=True.
+    """
+
+    def __init__(self,
+                 input_handler: InputHandler,
+                 max_mem_bytes: int = SPOOL_MAX_MEM_BYTES,
+                 temp_prefix: str = 'gristle_spool_temp_') -> None:
+
+        self.dialect = input_handler.dialect
+        self.header = input_handler.header
+        self.files = input_handler.files
+        self.max_mem_bytes = max_mem_bytes
+        self.temp_prefix = temp_prefix
+        self.temp_fn: Optional[str] = None
+
+        self.first_rec: Optional[List[str]] = None
+        self.spooled_rec_cnt = 0
+        self.mem_recs: List[List[str]] = []
+        self.mem_bytes = 0
+        self._spool(input_handler)
+
+        self.rec_cnt = 0
+        self.eof = False
+        self._recs = self._get_spooled_recs()
+
+
+    def _spool(self,
+               input_handler: InputHandler) -> None:
+
+        spill_buf = None
+        spill_writer = None
+        try:
+            for rec in input_handler:
+                if self.first_rec is None:
+                    self.first_rec = rec
+                self.spooled_rec_cnt += 1
+                if spill_writer:
+                    spill_writer.writerow(rec)
+                    continue
+                self.mem_recs.append(rec)
+                self.mem_bytes += get_rec_memory_size_mb(rec)
+                if self.mem_bytes > self.max_mem_bytes:
+                    spill_buf = tempfile.NamedTemporaryFile(mode='wt',
+                                                            prefix=self.temp_prefix,
+                                                            newline='',
+                                                            encoding='utf-8',
+                                                            delete=False)
+                    self.temp_fn = spill_buf.name
+                    spill_writer = csv.writer(spill_buf)
+                    spill_writer.writerows(self.mem_recs)
+                    self.mem_recs = []
+                    self.mem_bytes = 0
+        finally:
+            if spill_buf:
+                spill_buf.close()
+
+
+    def _get_spooled_recs(self):
+        if self.temp_fn is None:
+            yield from self.mem_recs
+        else:
+            with open(self.temp_fn, 'rt', newline='', encoding='utf-8') as inbuf:
+                yield from csv.reader(inbuf)
+
+
+    def __iter__(self):
+        return self
+
+
+    def __next__(self):
+        try:
+            rec = next(self._recs)
+        except StopIteration:
+            self.eof = True
+            raise
+        self.rec_cnt += 1
+        return rec
+
+
+    def read_batch(self,
+                   batch_size: int = DEFAULT_BATCH_SIZE) -> List[List[str]]:
+        """ Returns a list of up to batch_size records, or an empty list once
+            all records have been read.
+        """
+        batch = list(itertools.islice(self._recs, batch_size))
+        self.rec_cnt += len(batch)
+        if not batch:
+            self.eof = True
+        return batch
+
+
+    def close(self) -> None:
+        self._recs.close()
+
+
+    def reset(self) -> None:
+        """ Resets the spooler back to its first record
+        """
+        self.close()
+        self.rec_cnt = 0
+        self.eof = False
+        self._recs = self._get_spooled_recs()
+
+
+
 
 
 class OutputHandler(object):
     """ Handles all aspects of writing to output files: opening file,
         writing records, managing random writes, keeping counts,
         closing the file, etc.
+
+    Notes:
+        - buffer_size: the write buffer size in bytes for output files.  A
+          value of 0 will use python's default buffering.
+        - coalesce: if True, rows are first collected in memory and then handed
+          to the output buffer_size bytes at a time.  This mostly helps with
+          stdout & stderr, whose buffering we can't change.  Since this output
+          is held back, any other writes to the same stream should first call
+          flush().
     """
 
     def __init__(self,
@@ -157,7 +435,9 @@ class OutputHandler(object):
                  default_output=sys.stdout,
                  dry_run: bool = False,
                  random_out: float = 1.0,
-                 mode: str = 'wt'):
+                 mode: str = 'wt',
+                 buffer_size: int = DEFAULT_BUFFER_BYTES,
+                 coalesce: bool = False):
 
         assert default_output in (sys.stdout, sys.stderr), "invalid default_output: {}".format(default_output)
         assert 0.0 <= random_out <= 1.0
@@ -169,12 +449,25 @@ class OutputHandler(object):
         self.rec_cnt = 0
         if self.output_filename == '-':
             self.outfile = default_output
+        elif file_compression.get_compression_from_name(self.output_filename):
+            self.outfile = file_compression.open_text_output(self.output_filename,
+                                                             file_compression.get_compression_from_name(self.output_filename),
+                                                             mode,
+                                                             buffering=buffer_size or -1)
+        else:
+            self.outfile = open(self.output_filename, mode, encoding='utf-8', newline='',
+                                buffering=buffer_size or -1)
+
+        self.coalesce_bytes = buffer_size if coalesce else 0
+        if self.coalesce_bytes:
+            self.outbuf = io.StringIO(newline='')
         else:
-            self.outfile = open(self.output_filename, mode, encoding='utf-8', newline='')
+            self.outbuf = self.outfile
+
         if dialect:
-            self.writer = csv.writer(self.outfile, dialect=dialect)
+            self.writer = csv.writer(self.outbuf, dialect=dialect)
         else:
-            self.writer = self.noncsv_writer(self.outfile)  # type: ignore
+            self.writer = self.noncsv_writer(self.outbuf)  # type: ignore
 
 
     class noncsv_writer:
@@ -189,6 +482,10 @@ class OutputHandler(object):
                      record):
             self.outbuf.write(record)
 
+        def writerows(self,
+                      records):
+            self.outbuf.write(''.join(records))
+
 
     def write_rec(self,
                   record: List[str]) -> None:
@@ -208,6 +505,41 @@ class OutputHandler(object):
         except csv.Error:
             print('Invalid record: %s' % record)
             raise
+        if self.coalesce_bytes and self.outbuf.tell() >= self.coalesce_bytes:
+            self._write_coalesced()
+
+
+    def write_batch(self,
+                    records: List[List[str]]) -> None:
+        """ Write a list of records to output in a single call.
+            Behaves just like write_rec - but the silent and randomout checks
+            and the count updates are only done once per batch.
+        """
+        if self.dry_run:
+            return
+        if self.random_out != 1.0:
+            records = [rec for rec in records if random.random() <= self.random_out]
+        try:
+            self.writer.writerows(records)
+            self.rec_cnt += len(records)
+        except csv.Error:
+            print('Invalid record: %s' % self._get_invalid_rec(records))
+            raise
+        if self.coalesce_bytes and self.outbuf.tell() >= self.coalesce_bytes:
+            self._write_coalesced()
+
+
+    def _get_invalid_rec(self,
+                         records: List[List[str]]) -> Optional[List[str]]:
+        """ Identifies the first record in a batch that the writer rejects.
+        """
+        test_writer = csv.writer(io.StringIO(), dialect=self.dialect)
+        for record in records:
+            try:
+                test_writer.writerow(record)
+            except csv.Error:
+                return record
+        return None
 
 
     def write_csv_rec(self,
@@ -217,16 +549,285 @@ class OutputHandler(object):
 
     def write_text_rec(self,
                        record: str) -> None:
-        self.outfile.write(record)
+        self.outbuf.write(record)
+        if self.coalesce_bytes and self.outbuf.tell() >= self.coalesce_bytes:
+            self._write_coalesced()
+
 
+    def _write_coalesced(self) -> None:
+        if self.coalesce_bytes and self.outbuf.tell():
+            self.outfile.write(self.outbuf.getvalue())
+            self.outbuf.seek(0)
+            self.outbuf.truncate()
+
+
+    def flush(self) -> None:
+        """ Writes out any coalesced rows and then flushes the output.
+        """
+        self._write_coalesced()
+        self.outfile.flush()
 
 
     def close(self):
+        self._write_coalesced()
         if self.output_filename != '-':
             self.outfile.close()
 
 
 
+def copy_recs(input_handler: InputHandler,
+              output_handler: OutputHandler) -> None:
+    """ Copies every input record to the output a batch at a time - which
+        converts them from the input's csv dialect to the output's.
+
+    The header of the first input file is written if both dialects have one.
+    """
+    write_header = input_handler.dialect.has_header and output_handler.dialect.has_header
+    while True:
+        recs = input_handler.read_batch()
+        if not recs:
+            break
+        if write_header:
+            if input_handler.files_read == 1 and input_handler.curr_file_rec_cnt == len(recs):
+                output_handler.write_rec(input_handler.header)
+        output_handler.write_batch(recs)
+
+
+
+def get_bytes_converter(infiles: List[str],
+                        outfile: str,
+                        dialect: csvhelper.Dialect,
+                        out_dialect: csvhelper.Dialect) -> Optional['BytesConverter']:
+    """ Plans a conversion - returning a BytesConverter if the input can be
+        converted without parsing it, or None if it has to go through
+        copy_recs().
+
+    This only handles a single, uncompressed input file and an uncompressed
+    output - and only dialects in which every record could be unchanged
+    other than its delimiters & line endings.
+    """
+    if len(infiles) != 1 or infiles[0] == '-' or file_compression.get_compression(infiles[0]):
+        return None
+    if file_compression.get_compression_from_name(outfile.strip()):
+        return None
+    if not BytesConverter.is_possible(dialect, out_dialect):
+        return None
+    return BytesConverter(dialect, out_dialect)
+
+
+
+class BytesConverter(object):
+    """ Converts a csv file to another dialect by translating its bytes -
+        rather than parsing & re-writing every record.
+
+    That works whenever the data has no characters that would make the
+    input get parsed, or the output get written, as anything other than
+    the plain fields between the delimiters: quotes, escapechars, the
+    output delimiter, etc.  Then only the delimiters and line endings have
+    to change, and large blocks can be converted at once.  The data is
+    checked block by block, and from the first block with any of those
+    characters, the rest of the file is parsed & written by the csv module
+    instead.  So the results are identical to copy_recs().
+    """
+
+    def __init__(self,
+                 dialect: csvhelper.Dialect,
+                 out_dialect: csvhelper.Dialect) -> None:
+
+        self.dialect = dialect
+        self.out_dialect = out_dialect
+        self.delimiter = dialect.delimiter.encode('utf-8')
+        self.out_delimiter = out_dialect.delimiter.encode('utf-8')
+
+        special_chars = {'\0', dialect.escapechar, out_dialect.quotechar, out_dialect.escapechar}
+        if dialect.quoting != csv.QUOTE_NONE:
+            special_chars.add(dialect.quotechar)
+        if out_dialect.delimiter != dialect.delimiter:
+            special_chars.add(out_dialect.delimiter)
+        self.special_bytes = [char.encode('utf-8') for char in special_chars if char]
+
+
+    @staticmethod
+    def is_possible(dialect: csvhelper.Dialect,
+                    out_dialect: csvhelper.Dialect) -> bool:
+        """ Returns True if data without any special characters would be
+            converted by copy_recs() into just the same fields.
+        """
+        if dialect.quoting == csv.QUOTE_NONNUMERIC or dialect.skipinitialspace:
+            return False  # fields get changed on input
+        if out_dialect.quoting not in (csv.QUOTE_NONE, csv.QUOTE_MINIMAL):
+            return False  # fields get quoted on output
+        if out_dialect.lineterminator != '\n':
+            return False
+        return all(delimiter and delimiter not in '\r\n'
+                   for delimiter in (dialect.delimiter, out_dialect.delimiter))
+
+
+    def convert(self,
+                infile: str,
+                outfile: str,
+                buffer_size: int = DEFAULT_BUFFER_BYTES) -> int:
+        """ Converts the input file into the output file, or stdout for '-',
+            and returns the number of records - not counting any header.
+
+        Just like copy_recs(), the header is only written if both dialects
+        have one, and the file has any records.
+        """
+        outfile = outfile.strip()
+        if outfile == '-':
+            sys.stdout.flush()
+            outbuf = sys.stdout.buffer
+        else:
+            outbuf = open(outfile, 'wb', buffering=buffer_size or -1)
+        try:
+            with open(infile, 'rb') as inbuf:
+                advise_sequential(inbuf)
+                return self._convert(inbuf, outbuf, buffer_size or DEFAULT_BUFFER_BYTES)
+        finally:
+            if outfile == '-':
+                outbuf.flush()
+            else:
+                outbuf.close()
+
+
+    def _convert(self,
+                 inbuf,
+                 outbuf,
+                 buffer_size: int) -> int:
+        rec_cnt = 0
+        header: Optional[List[str]] = None
+        need_header = bool(self.dialect.has_header)
+        carry = b''
+        unterminated = False
+        while True:
+            data = inbuf.read(buffer_size)
+            block, carry = carry + data, b''
+            if data:
+                # Blocks end on a line ending - but never split up an \r\n:
+                end = max(block.rfind(b'\n'), block.rfind(b'\r', 0, len(block) - 1)) + 1
+                if end == 0:
+                    carry = block
+                    continue
+                block, carry = block[:end], block[end:]
+            elif not block:
+                break
+            elif not block.endswith((b'\n', b'\r')):
+                # The last line's ending is only added for the byte translation,
+                # since the csv module treats it differently - ex: within a quote:
+                unterminated = True
+
+            if need_header:
+                # The header always goes through the csv module:
+                header_end = _get_first_line_end(block)
+                if self._has_special_bytes(block[:header_end]):
+                    return self._convert_recs(block + carry, inbuf, outbuf, has_header=True)
+                header = next(csv.reader(io.StringIO(block[:header_end].decode('utf-8'), newline=''),
+                                         dialect=self.dialect))
+                block = block[header_end:]
+                need_header = False
+            if not block:
+                if not data:
+                    break
+                continue
+
+            if header is not None:
+                if self.out_dialect.has_header:
+                    self._write_recs(outbuf, [header])
+                header = None
+
+            if self._has_special_bytes(block):
+                return rec_cnt + self._convert_recs(block + carry, inbuf, outbuf)
+
+            if unterminated:
+                block += b'\n'
+            block = block.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+            rec_cnt += block.count(b'\n')
+            if self.out_delimiter != self.delimiter:
+                block = block.replace(self.delimiter, self.out_delimiter)
+            outbuf.write(block)
+            if not data:
+                break
+        return rec_cnt
+
+
+    def _has_special_bytes(self,
+                           block: bytes) -> bool:
+        return any(special in block for special in self.special_bytes)
+
+
+    def _convert_recs(self,
+                      start: bytes,
+                      inbuf,
+                      outbuf,
+                      has_header: bool = False) -> int:
+        """ Parses & writes the rest of the input with the csv module - starting
+            with the bytes already read from it.
+        """
+        # The csv reader needs whole lines - so the start can't end partway through one:
+        if not start.endswith(b'\n'):
+            start += inbuf.readline()
+        text_inbuf = io.TextIOWrapper(inbuf, encoding='utf-8', newline='')
+        lines = itertools.chain(io.StringIO(start.decode('utf-8'), newline=''), text_inbuf)
+        try:
+            recs = csv.reader(lines, dialect=self.dialect)
+            if has_header:
+                header = next(recs, None)
+                first_rec = next(recs, None)
+                if first_rec is None:
+                    return 0
+                if self.out_dialect.has_header:
+                    self._write_recs(outbuf, [header])
+                recs = itertools.chain([first_rec], recs)  # type: ignore
+            return self._write_recs(outbuf, recs)
+        finally:
+            text_inbuf.detach()
+
+
+    def _write_recs(self,
+                    outbuf,
+                    recs) -> int:
+        # Each batch is formatted in memory, since wrapping outbuf in a text
+        # layer fails on some unseekable outputs (ex: an inherited stdout):
+        text_batch = io.StringIO(newline='')
+        writer = csv.writer(text_batch, dialect=self.out_dialect)
+        rec_iter = iter(recs)
+        rec_cnt = 0
+        for batch in iter(lambda: list(itertools.islice(rec_iter, DEFAULT_BATCH_SIZE)), []):
+            text_batch.seek(0)
+            text_batch.truncate()
+            writer.writerows(batch)
+            outbuf.write(text_batch.getvalue().encode('utf-8'))
+            rec_cnt += len(batch)
+        return rec_cnt
+
+
+
+def _get_first_line_end(block: bytes) -> int:
+    """ Returns the position just after the first line ending - which could
+        be \n, \r\n, or \r.
+    """
+    end = block.find(b'\n') + 1 or len(block)
+    cr_pos = block.find(b'\r', 0, end)
+    if cr_pos == -1 or block[cr_pos + 1:cr_pos + 2] == b'\n':
+        return end
+    return cr_pos + 1
+
+
+
+def advise_sequential(infile) -> None:
+    """ Tells the os that a file will be read sequentially - so that it can
+        read ahead more aggressively.  Does nothing on platforms without
+        posix_fadvise, or for inputs like pipes that don't support it.
+    """
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    try:
+        os.posix_fadvise(infile.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+    except (OSError, io.UnsupportedOperation):
+        pass
+
+
+
 def get_file_size(files):
     tot_size = int(sum([os.path.getsize(fn)
                         for fn in files
@@ -242,7 +843,7 @@ def get_file_avg_rec_size(files, dialect):
     rec_sizes = []
     rec_cnt = 0
     for fn in files:
-        with open(fn, 'r', newline='', encoding='utf-8') as inbuf:
+        with file_compression.open_text_input(fn) as inbuf:
             csv_reader = csv.reader(inbuf, dialect=dialect)
             for rec in csv_reader:
                 rec_sizes.append(get_rec_memory_size_mb(rec))
@@ -258,6 +859,41 @@ def get_file_avg_rec_size(files, dialect):
 
 
 
+def get_sampled_recs(fqfn: str,
+                     dialect: csvhelper.Dialect,
+                     block_cnt: int,
+                     block_bytes: int = SAMPLE_BLOCK_BYTES) -> List[List[str]]:
+    """ Returns the records from block_cnt randomly-chosen blocks of a file.
+
+    The first block of the file is always included, and any header is
+    skipped.  Since partial lines at the edges of each block are dropped,
+    records with quoted newlines could get misread.  Compressed files can't
+    be sampled this way, so they return an empty list.
+    """
+    if file_compression.get_compression(fqfn):
+        return []
+
+    file_size = os.path.getsize(fqfn)
+    total_block_cnt = (file_size + block_bytes - 1) // block_bytes
+    if total_block_cnt == 0:
+        return []
+    block_nums = [0] + sorted(random.sample(range(1, total_block_cnt),
+                                            min(block_cnt, total_block_cnt) - 1))
+    lines: List[bytes] = []
+    with open(fqfn, 'rb') as inbuf:
+        for block_num in block_nums:
+            inbuf.seek(block_num * block_bytes)
+            block_lines = inbuf.read(block_bytes).split(b'\n')
+            if block_num > 0 or dialect.has_header:
+                block_lines = block_lines[1:]
+            # the last line is either partial or the empty string after the final newline:
+            lines.extend(block_lines[:-1])
+
+    text = '\n'.join(line.decode('utf-8') for line in lines)
+    return list(csv.reader(io.StringIO(text, newline=''), dialect=dialect))
+
+
+
 def get_rec_memory_size_mb(rec):
     return sum([sys.getsizeof(field) for field in rec])
 
@@ -270,7 +906,7 @@ def get_approx_rec_count(files):
     for fn in files:
         if fn == '-':
             continue
-        with open(fn, 'r') as inbuf:
+        with file_compression.open_text_input(fn, newline=None) as inbuf:
             for rec in inbuf:
                 rec_size += len(rec)
                 rec_cnt += 1
@@ -295,7 +931,8 @@ def get_rec_count(files: List[str],
         return None
 
     for fn in files:
-        with open(fn, 'r', newline='', encoding='utf-8') as inbuf:
+        with file_compression.open_text_input(fn, buffering=DEFAULT_BUFFER_BYTES) as inbuf:
+            advise_sequential(inbuf)
             csv_reader = csv.reader(inbuf, dialect=dialect)
             for _ in csv_reader:
                 rec_cnt += 1
@@ -6,7 +6,6 @@ from operator import itemgetter
 from os.path import isfile, isdir
 from os.path import dirname, basename
 from os.path import join  as pjoin
-from pprint import pprint as pp
 import subprocess
 import sys
 import time
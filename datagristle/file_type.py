@@ -14,9 +14,9 @@ import os
 import os.path
 from pprint import pprint
 from typing import Optional, Tuple
-from pprint import pprint as pp
 
 import datagristle.csvhelper as csvhelper
+import datagristle.profile_state as profile_state
 
 
 
@@ -31,16 +31,22 @@ class FileTyper(object):
     def __init__(self,
                  dialect: csvhelper.Dialect,
                  fqfn: str,
-                 read_limit: int = -1) -> None:
+                 read_limit: int = -1,
+                 byte_range: Optional[profile_state.ByteRange] = None,
+                 prior_record_cnt: int = 0) -> None:
         """
         Arguments:
             - dialect = a csv dialect - should be valid, not empty
             - fqfn = fully qualified file name
             - read_limit = default is -1, which means unlimited
+            - byte_range = optionally limits counting records to this (start,
+              end) range of offsets - and adds them to the prior_record_cnt
         """
         assert read_limit is not None
         self.dialect = dialect
         self.fqfn = fqfn
+        self.byte_range = byte_range
+        self.prior_record_cnt = prior_record_cnt
         self.field_cnt: Optional[int] = None
         self.record_cnt: Optional[int] = None
         self.record_cnt_is_est: Optional[bool] = None
@@ -87,6 +93,12 @@ class FileTyper(object):
             except  ZeroDivisionError:
                 pass
 
+        elif self.byte_range:
+            rec_cnt = self.prior_record_cnt
+            with profile_state.open_byte_range(self.fqfn, self.byte_range) as infile:
+                for _ in csv.reader(infile, self.dialect):
+                    rec_cnt += 1
+
         else:
             # much slower method, but most accurate
             with open(self.fqfn, 'rt') as infile:
@@ -1,13 +1,17 @@
+import collections
+import concurrent.futures
+import copy
+import errno
+import functools
+import os
 from os.path import basename, exists, join as pjoin
-from pprint import pprint as pp
+import re
 import sys
-from typing import Any, Optional, Dict, List, Tuple, Union
-
-import jsonschema
-import ruamel.yaml as yaml
+from typing import Any, Callable, Optional, Dict, List, Sequence, Set, Tuple, Union
 
 import datagristle.common as comm
 import datagristle.csvhelper as csvhelper
+import datagristle.file_batcher as file_batcher
 import datagristle.file_io as file_io
 
 
@@ -22,7 +26,9 @@ class RecordProcessor:
                  rec_validator: 'RecValidator',
                  err_out_fields: bool,
                  err_out_text: bool,
-                 verbosity: int) -> None:
+                 verbosity: int,
+                 workers: int = 1,
+                 max_errors: Optional[int] = None) -> None:
 
         self.input_handler = input_handler
         self.outfile_handler = outfile_handler
@@ -31,10 +37,13 @@ class RecordProcessor:
         self.err_out_fields = err_out_fields
         self.err_out_text = err_out_text
         self.verbosity = verbosity
+        self.workers = workers
+        self.max_errors = max_errors
 
         self.valid_rec_cnt = 0
         self.invalid_rec_cnt = 0
         self.invalid_field_cnt = 0
+        self.valid_recs: List[List[str]] = []
 
         # Set up fields for cleaning msgs when using err_out_fields or err_out_text:
         if self.outerr_handler.dialect.doublequote or self.outerr_handler.dialect.escapechar:
@@ -52,41 +61,145 @@ class RecordProcessor:
 
 
     def process_recs(self):
-
-        for rec in self.input_handler:
-            self._process_rec(rec)
-
+        """ Validates the input a batch at a time - with the valid records from
+            each batch written out together.
+        """
+        if self.workers > 1:
+            self._process_recs_in_parallel()
+        else:
+            while not self.is_error_budget_exceeded():
+                recs = self.input_handler.read_batch()
+                if not recs:
+                    break
+                if self.input_handler.dialect.has_header and self.input_handler.rec_cnt == len(recs):
+                    self._process_header()
+                self._write_validated_batch(recs, self.rec_validator.validate_batch(recs))
+
+        # Coalesced valid recs must reach stdout before the stats do:
+        self.outfile_handler.flush()
         if self.verbosity in ('high', 'debug'):
             write_stats(self.input_handler.rec_cnt,
                         self.valid_rec_cnt,
                         self.invalid_rec_cnt)
 
 
-    def _process_rec(self,
-                     rec):
-
-        write_appended_error_info = True
-        write_field_error_recs = True
+    def _process_recs_in_parallel(self):
+        """ Validates batches of records within a pool of worker processes.
 
-        if self.input_handler.dialect.has_header and self.input_handler.rec_cnt == 1:
-            self.rec_validator.check_field_cnt(len(self.input_handler.header))
-            if self.rec_validator.rec_error_count:
-                self._write_error_rec(self.input_handler.header)
+        Workers only return the errors for their invalid records, and the
+        batches are written out here in their original order - so that the
+        outputs, counts, and error annotations are identical to the serial
+        mode.  Up to two batches per worker are kept in flight.
+        """
+        in_flight: collections.deque = collections.deque()
+        executor = None
+        try:
+            while not self.is_error_budget_exceeded():
+                recs = self.input_handler.read_batch()
+                if not recs:
+                    break
+                if self.input_handler.dialect.has_header and self.input_handler.rec_cnt == len(recs):
+                    self._process_header()
+                if executor is None:
+                    # Workers need the field count that serial mode would pick up from the first rec:
+                    if self.rec_validator.valid_field_cnt is None:
+                        self.rec_validator.valid_field_cnt = len(recs[0])
+                    # Forked workers would otherwise write out any buffered output again on exit:
+                    self.outfile_handler.flush()
+                    self.outerr_handler.flush()
+                    executor = concurrent.futures.ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        initializer=init_worker_validator,
+                        initargs=(self.rec_validator.header,
+                                  self.rec_validator.valid_field_cnt,
+                                  self.rec_validator.rec_schema,
+                                  self.rec_validator.columnar))
+                in_flight.append((recs, executor.submit(_validate_batch, recs)))
+                if len(in_flight) >= self.workers * 2:
+                    recs, future = in_flight.popleft()
+                    self._write_validated_batch(recs, future.result())
+            while in_flight and not self.is_error_budget_exceeded():
+                recs, future = in_flight.popleft()
+                self._write_validated_batch(recs, future.result())
+        finally:
+            for _, future in in_flight:
+                future.cancel()
+            if executor:
+                executor.shutdown()
+
+
+    def _write_validated_batch(self,
+                               recs: List[List[str]],
+                               batch_errors: Dict[int, List[Dict[str, Any]]]) -> None:
+        """ Writes a batch of records - using the errors from RecValidator.validate_batch().
+
+        Stops early once the error budget is exceeded.
+        """
+        for rec_num, rec in enumerate(recs):
+            if self.is_error_budget_exceeded():
+                break
+            if rec_num in batch_errors:
+                self.rec_validator.rec_errors = batch_errors[rec_num]
+                self.rec_validator.rec_error_count = len(batch_errors[rec_num])
+                self._write_error_rec(rec)
             else:
-                self._write_valid_rec(self.input_handler.header)
+                self._write_valid_rec(rec)
+        self._flush_valid_recs()
 
-        self.rec_validator.run_all_checks(rec)
 
-        # Write recs:
+    def is_error_budget_exceeded(self) -> bool:
+        """ Returns True once max_errors invalid records have been found.
+        """
+        return self.max_errors is not None and self.invalid_rec_cnt >= self.max_errors
+
+
+    def quick_check(self,
+                    block_cnt: int) -> bool:
+        """ Validates records from a random sample of blocks from each input
+            file, and returns False if any are invalid.
+
+        This is intended to quickly reject obviously broken files before
+        reading them in full.  Invalid sample records are written to the
+        errfile just like in the full validation.  Inputs that can't be
+        sampled (stdin & compressed files) are left to the full validation.
+        """
+        if self.input_handler.dialect.has_header and self.rec_validator.valid_field_cnt is None:
+            # Mirror the full validation - which gets the field count from the header:
+            self.rec_validator.valid_field_cnt = len(self.input_handler.header)
+
+        for fqfn in self.input_handler.files:
+            if fqfn == '-':
+                continue
+            recs = file_io.get_sampled_recs(fqfn, self.input_handler.dialect, block_cnt)
+            if not recs:
+                continue
+            batch_errors = self.rec_validator.validate_batch(recs)
+            for rec_num in sorted(batch_errors):
+                self.rec_validator.rec_errors = batch_errors[rec_num]
+                self.rec_validator.rec_error_count = len(batch_errors[rec_num])
+                self._write_error_rec(recs[rec_num])
+            if batch_errors:
+                return False
+        return True
+
+
+    def _process_header(self):
+
+        self.rec_validator.check_field_cnt(len(self.input_handler.header))
         if self.rec_validator.rec_error_count:
-            self._write_error_rec(rec)
+            self._write_error_rec(self.input_handler.header)
         else:
-            self._write_valid_rec(rec)
+            self._write_valid_rec(self.input_handler.header)
 
 
     def _write_valid_rec(self, rec):
         self.valid_rec_cnt += 1
-        self.outfile_handler.write_rec(rec)
+        self.valid_recs.append(rec)
+
+
+    def _flush_valid_recs(self):
+        self.outfile_handler.write_batch(self.valid_recs)
+        self.valid_recs = []
 
 
     def _write_error_rec(self,
@@ -134,6 +247,85 @@ class RecordProcessor:
 
 
 
+# Each worker process gets its own RecValidator:
+_worker_validator: Optional['RecValidator'] = None
+
+def init_worker_validator(header: csvhelper.Header,
+                           valid_field_cnt: int,
+                           rec_schema: Optional[Dict[Any, Any]],
+                           columnar: bool) -> None:
+    global _worker_validator  # pylint: disable=global-statement
+    _worker_validator = RecValidator(header, valid_field_cnt, rec_schema, columnar)
+
+
+def _validate_batch(recs: List[List[str]]) -> Dict[int, List[Dict[str, Any]]]:
+    """ Runs within a worker process.
+    """
+    assert _worker_validator
+    return _worker_validator.validate_batch(recs)
+
+
+
+def validate_file(batch_file: file_batcher.BatchFile,
+                  dialect_options: Dict[str, Any],
+                  dialect_defaults: Dict[str, Any],
+                  err_out_fields: bool,
+                  err_out_text: bool,
+                  random_out: float,
+                  buffer_size: int,
+                  max_errors: Optional[int] = None,
+                  quick_check: Optional[int] = None) -> file_batcher.BatchResult:
+    """ The gristle_validator batch task - which validates a file into its
+        output & error files.
+
+    Runs after init_worker_validator(), and every file gets a copy of that
+    RecValidator - so the schema only gets compiled once per worker.
+    Invalid records are discarded if there's no error file.
+    """
+    assert _worker_validator
+    dialect = file_batcher.get_file_dialect(batch_file.infile, dialect_options, dialect_defaults)
+    header = csvhelper.Header()
+    header.load_from_files([batch_file.infile], dialect)
+    rec_validator = copy.copy(_worker_validator)
+    rec_validator.header = header
+    rec_validator.rec_errors = []
+
+    input_handler = file_io.InputHandler([batch_file.infile], dialect)
+    outfile_handler = file_io.OutputHandler(batch_file.outfile,
+                                            dialect,
+                                            random_out=random_out,
+                                            buffer_size=buffer_size)
+    outerr_handler = file_io.OutputHandler(batch_file.errfile or os.devnull,
+                                           dialect,
+                                           random_out=random_out,
+                                           buffer_size=buffer_size)
+    processor = RecordProcessor(input_handler,
+                                outfile_handler,
+                                outerr_handler,
+                                rec_validator,
+                                err_out_fields,
+                                err_out_text,
+                                verbosity='normal',
+                                max_errors=max_errors)
+    try:
+        if not quick_check or processor.quick_check(quick_check):
+            processor.process_recs()
+    finally:
+        input_handler.close()
+        outfile_handler.close()
+        outerr_handler.close()
+
+    if processor.invalid_rec_cnt > 0:
+        returncode = errno.EBADMSG
+    elif input_handler.rec_cnt == 0:
+        returncode = errno.ENODATA
+    else:
+        returncode = 0
+    return file_batcher.BatchResult(batch_file, returncode, input_handler.rec_cnt,
+                                    processor.invalid_rec_cnt)
+
+
+
 def write_stats(input_cnt: int, valid_cnt: int, invalid_cnt: int) -> None:
     """ Writes input, output, and validation counts to stdout.
     """
@@ -166,6 +358,8 @@ def load_schema(schema_file: str,
     schema_dict = None
     if schema_file:
         schema_file = find_schema_file_on_path(schema_file)
+        import jsonschema  # pylint: disable=import-outside-toplevel
+        import ruamel.yaml as yaml  # pylint: disable=import-outside-toplevel
         with open(schema_file, 'r') as schema_buf:
             schema_dict = yaml.YAML(typ='safe', pure=True).load(schema_buf)
 
@@ -190,29 +384,91 @@ class RecValidator(object):
     def __init__(self,
                  header: csvhelper.Header,
                  valid_field_cnt: Optional[int] = None,
-                 rec_schema=None) -> None:
+                 rec_schema=None,
+                 columnar: bool = False) -> None:
 
         self.header = header
         self.rec_schema = rec_schema
+        self.columnar = columnar
         self.valid_field_cnt: Optional[int] = valid_field_cnt
         self.last_field_cnt: Optional[int] = None
         self.rec_errors: List[dict[str, str]] = []
         self.rec_error_count = 0
         if rec_schema:
+            import jsonschema  # pylint: disable=import-outside-toplevel
             self.validator = jsonschema.Draft7Validator(self.rec_schema)
+            try:
+                self.compiled_schema: Optional[CompiledSchema] = CompiledSchema(self.rec_schema)
+            except ValueError:
+                self.compiled_schema = None
         else:
             self.validator = None
+            self.compiled_schema = None
 
 
     def run_all_checks(self,
                        record: List[str]):
+        """ Runs the field count check, and then the schema checks.
 
+        The schema checks are first run through the compiled schema, and only
+        records that fail it (or schemas that couldn't be compiled) go through
+        jsonschema - which provides the detailed error messages.
+        """
         self.rec_errors = []
         self.rec_error_count = 0
 
         self.check_field_cnt(len(record))
         if self.rec_schema and self.rec_error_count == 0:
-            self.check_schema(record)
+            if self.compiled_schema is None or not self.compiled_schema.is_valid(record):
+                self.check_schema(record)
+
+
+    def validate_batch(self,
+                       recs: List[List[str]]) -> Dict[int, List[Dict[str, Any]]]:
+        """ Validates a batch of records, and returns the errors of each invalid
+            record - keyed by its position within the batch.
+
+        In columnar mode the batch is first checked a column at a time, and
+        then only the records flagged there go through run_all_checks - to
+        get their detailed errors.
+        """
+        if self.columnar and (self.compiled_schema or not self.rec_schema):
+            rec_nums: Sequence[int] = sorted(self._get_invalid_rec_nums(recs))
+        else:
+            rec_nums = range(len(recs))
+
+        batch_errors = {}
+        for rec_num in rec_nums:
+            self.run_all_checks(recs[rec_num])
+            if self.rec_error_count:
+                batch_errors[rec_num] = self.rec_errors
+        return batch_errors
+
+
+    def _get_invalid_rec_nums(self,
+                              recs: List[List[str]]) -> Set[int]:
+        """ Returns the positions of the records that fail either the field
+            count or the compiled schema checks.
+        """
+        if self.valid_field_cnt is None:
+            self.valid_field_cnt = len(recs[0])
+
+        invalid_rec_nums = set()
+        good_rec_nums = []
+        for rec_num, rec in enumerate(recs):
+            if len(rec) == self.valid_field_cnt:
+                good_rec_nums.append(rec_num)
+            else:
+                invalid_rec_nums.add(rec_num)
+
+        if self.compiled_schema and good_rec_nums:
+            if len(good_rec_nums) == len(recs):
+                good_recs = recs
+            else:
+                good_recs = [recs[rec_num] for rec_num in good_rec_nums]
+            for position in self.compiled_schema.get_invalid_positions(good_recs):
+                invalid_rec_nums.add(good_rec_nums[position])
+        return invalid_rec_nums
 
 
     def check_field_cnt(self,
@@ -305,6 +561,190 @@ class RecValidator(object):
 
 
 
+@functools.lru_cache(maxsize=None)
+def get_numpy():
+    """ Returns the numpy module, or None if it's not installed.
+
+    Numpy is optional, and slow to import - so it's only imported here, on
+    first use.
+    """
+    try:
+        import numpy  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return None
+    return numpy
+
+
+
+class CompiledSchema:
+    """ Provides a fast pass/fail check of records against a validation schema.
+
+    The schema is compiled once into a list of per-column check functions -
+    with the casting, regexes, enum sets and bounds all prepared up front.
+    The results are identical to running fix_types & jsonschema on the
+    record, but without jsonschema's generic per-record dispatch.  Only the
+    small vocabulary allowed by config_validation_simple is supported.
+
+    It can also check a batch of records a column at a time - which avoids
+    most of the per-record overhead, and lets numeric columns get parsed &
+    checked by numpy if it's installed.
+
+    Raises:
+        ValueError: if the schema has anything that can't be compiled, in
+            which case the caller should just use jsonschema.
+    """
+
+    def __init__(self,
+                 rec_schema: Dict[Any, Any]) -> None:
+
+        self.col_checks: List[Callable[[str], bool]] = [self._compile_field_checks(field_schema)
+                                                        for field_schema in rec_schema['items']]
+        self.col_cnt = len(self.col_checks)
+        self.field_schemas = rec_schema['items']
+        self._batch_col_checks: Optional[List[Callable[[Sequence[str]], List[int]]]] = None
+
+
+    @property
+    def batch_col_checks(self) -> List[Callable[[Sequence[str]], List[int]]]:
+        """ The column checks are only compiled when first used - so that numpy
+            only gets imported for columnar validation.
+        """
+        if self._batch_col_checks is None:
+            self._batch_col_checks = [self._compile_batch_col_checks(field_schema, field_check)
+                                      for field_schema, field_check
+                                      in zip(self.field_schemas, self.col_checks)]
+        return self._batch_col_checks
+
+
+    def get_invalid_positions(self,
+                              recs: List[List[str]]) -> Set[int]:
+        """ Returns the positions of the records that fail any schema check.
+
+        All records must have the same number of fields.
+        """
+        if len(recs[0]) > self.col_cnt:
+            return set(range(len(recs)))
+        invalid_positions: Set[int] = set()
+        for batch_col_check, col in zip(self.batch_col_checks, zip(*recs)):
+            invalid_positions.update(batch_col_check(col))
+        return invalid_positions
+
+
+    def is_valid(self,
+                 record: List[str]) -> bool:
+        """ Returns True if the record passes every schema check.
+
+        Records with more fields than the schema has items always fail, so
+        that they're handed over to fix_types for its error handling.
+        """
+        if len(record) > self.col_cnt:
+            return False
+        for check, field in zip(self.col_checks, record):
+            if not check(field):
+                return False
+        return True
+
+
+    @staticmethod
+    def _compile_field_checks(field_schema: Dict[str, Any]) -> Callable[[str], bool]:
+        """ Returns a single function that applies all of a field's checks.
+
+        Mirrors fix_types: number fields are cast to floats, and if that fails
+        they stay strings - which then fails the type check.  Since jsonschema
+        only applies numeric checks to numbers, and length & pattern checks
+        to strings, a column only ever needs one of those two sets.
+        """
+        field_type = field_schema.get('type')
+        if field_type in ('boolean', 'null'):
+            # fix_types never produces these types
+            return lambda field: False
+        if field_type not in ('string', 'number', None):
+            raise ValueError(f'Unsupported type: {field_type}')
+
+        enum: Optional[frozenset] = None
+        if 'enum' in field_schema:
+            # Booleans compare equal to 1 & 0 in a set but not to jsonschema:
+            if any(isinstance(val, (bool, list, dict)) for val in field_schema['enum']):
+                raise ValueError('Unsupported enum values')
+            enum = frozenset(field_schema['enum'])
+
+        if field_type == 'number':
+            minimum = field_schema.get('minimum')
+            maximum = field_schema.get('maximum')
+
+            def check_number(field: str) -> bool:
+                try:
+                    val = float(field)
+                except ValueError:
+                    return False
+                if minimum is not None and val < minimum:
+                    return False
+                if maximum is not None and val > maximum:
+                    return False
+                if enum is not None and val not in enum:
+                    return False
+                return True
+            return check_number
+
+        min_length = field_schema.get('minLength')
+        max_length = field_schema.get('maxLength')
+        pattern = re.compile(field_schema['pattern']) if 'pattern' in field_schema else None
+
+        def check_string(field: str) -> bool:
+            if min_length is not None and len(field) < min_length:
+                return False
+            if max_length is not None and len(field) > max_length:
+                return False
+            if pattern is not None and not pattern.search(field):
+                return False
+            if enum is not None and field not in enum:
+                return False
+            return True
+        return check_string
+
+
+    @staticmethod
+    def _compile_batch_col_checks(field_schema: Dict[str, Any],
+                                  field_check: Callable[[str], bool]) -> Callable[[Sequence[str]], List[int]]:
+        """ Returns a function that checks a whole column, and returns the
+            positions of its invalid fields.
+
+        Numeric columns are converted and compared by numpy when it's
+        available - and if any field won't convert, that column falls back
+        to the field checks to sort out which ones.
+        """
+        def check_col(col: Sequence[str]) -> List[int]:
+            return [position for position, field in enumerate(col) if not field_check(field)]
+
+        np = get_numpy()
+        if np is None or field_schema.get('type') != 'number':
+            return check_col
+
+        minimum = field_schema.get('minimum')
+        maximum = field_schema.get('maximum')
+        if 'enum' in field_schema:
+            num_enum = np.array([val for val in field_schema['enum'] if isinstance(val, (int, float))],
+                                dtype=np.float64)
+        else:
+            num_enum = None
+
+        def check_number_col(col: Sequence[str]) -> List[int]:
+            try:
+                vals = np.array(col, dtype=np.float64)
+            except ValueError:
+                return check_col(col)
+            invalid = np.zeros(len(vals), dtype=bool)
+            if minimum is not None:
+                invalid |= vals < minimum
+            if maximum is not None:
+                invalid |= vals > maximum
+            if num_enum is not None:
+                invalid |= ~np.isin(vals, num_enum)
+            return np.flatnonzero(invalid).tolist()
+        return check_number_col
+
+
+
 def config_validation_simple(schema: Dict[Any, Any]):
 
     valid_keys = ['type', 'minimum', 'maximum', 'minLength', 'maxLength', 'title',
@@ -351,6 +791,7 @@ def config_validation_detailed(schema):
     are very difficult to read.
     """
 
+    import jsonschema  # pylint: disable=import-outside-toplevel
     jsonschema.validate(instance=None, schema=schema)
     try:
         jsonschema.validate(instance=None, schema=schema)
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+""" Purpose of this module is to manage a persistent cache of file content
+    digests - so that comparing files that haven't changed since a prior run
+    doesn't require reading them again.
+
+    Each version of a file is identified by its absolute name, inode, size
+    and modification time in nanoseconds.  The cache is a small sqlite
+    database kept next to the metadata database - but it uses the sqlite3
+    module directly rather than sqlalchemy, since it's needed by programs
+    that don't otherwise use the metadata database.
+
+    See the file "LICENSE" for the full license governing this code.
+    Copyright 2011-2022 Ken Farmer
+"""
+import hashlib
+import mmap
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional, Tuple
+
+DEFAULT_DB_NAME = 'hash_cache.db'
+
+# Entries not used for this long are deleted:
+MAX_UNUSED_SECONDS = 86400 * 365
+
+# Changes are committed after this many writes - and on close:
+COMMIT_INTERVAL = 1000
+
+READ_CHUNK_SIZE = 8 * 1024 * 1024
+
+FileIdentity = Tuple[str, int, int, int]
+
+
+
+def get_default_db_dir() -> str:
+    import appdirs  # pylint: disable=import-outside-toplevel
+    return appdirs.user_data_dir('datagristle')
+
+
+
+def get_file_identity(filename: str) -> FileIdentity:
+    """ Returns the absolute filename, inode, size and modification time in
+        nanoseconds that together identify a version of a file.
+    """
+    file_stat = os.stat(filename)
+    return (os.path.abspath(filename),
+            file_stat.st_ino,
+            file_stat.st_size,
+            file_stat.st_mtime_ns)
+
+
+
+def get_file_digest(filename: str) -> str:
+    """ Returns the blake2b hex digest of a file's content.
+    """
+    digest = hashlib.blake2b()
+    with open(filename, 'rb') as inbuf:
+        if os.fstat(inbuf.fileno()).st_size:
+            with mmap.mmap(inbuf.fileno(), 0, access=mmap.ACCESS_READ) as in_map:
+                for offset in range(0, len(in_map), READ_CHUNK_SIZE):
+                    digest.update(in_map[offset:offset + READ_CHUNK_SIZE])
+    return digest.hexdigest()
+
+
+
+class HashCache(object):
+    """ Provides file content digests - from the cache for unchanged files, or
+        else by reading the file and then caching its digest.
+
+        Should be closed (or used as a context manager) so that the last
+        changes are committed.  Can be shared by threads: the db access is
+        serialized, but the files are read concurrently.
+    """
+
+    def __init__(self,
+                 db_dir: Optional[str] = None,
+                 db_name: str = DEFAULT_DB_NAME) -> None:
+
+        db_dir = db_dir or get_default_db_dir()
+        os.makedirs(db_dir, exist_ok=True)
+        self.fqdb_name = os.path.join(db_dir, db_name)
+        self.connect = sqlite3.connect(self.fqdb_name, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.connect.execute(""" CREATE TABLE IF NOT EXISTS file_digest
+                                     (fqfn             TEXT    NOT NULL,
+                                      inode            INTEGER NOT NULL,
+                                      file_size        INTEGER NOT NULL,
+                                      mtime_ns         INTEGER NOT NULL,
+                                      digest           TEXT    NOT NULL,
+                                      last_used_epoch  REAL    NOT NULL,
+                                      PRIMARY KEY (fqfn, inode, file_size, mtime_ns))
+                             """)
+        self.connect.execute(""" CREATE INDEX IF NOT EXISTS file_digest_ix1
+                                     ON file_digest (last_used_epoch)
+                             """)
+        self.connect.commit()
+        self.uncommitted_cnt = 0
+        self.hit_cnt = 0
+        self.miss_cnt = 0
+
+
+    def __enter__(self) -> 'HashCache':
+        return self
+
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+    def get_cached_digest(self,
+                          filename: str) -> Optional[str]:
+        """ Returns the cached digest for the current version of a file - or
+            None if it isn't cached.
+        """
+        identity = get_file_identity(filename)
+        with self.lock:
+            row = self.connect.execute(""" SELECT digest
+                                           FROM file_digest
+                                           WHERE fqfn = ? AND inode = ? AND file_size = ? AND mtime_ns = ?
+                                       """, identity).fetchone()
+            if row is None:
+                return None
+            self.hit_cnt += 1
+            self._write(""" UPDATE file_digest
+                            SET last_used_epoch = ?
+                            WHERE fqfn = ? AND inode = ? AND file_size = ? AND mtime_ns = ?
+                        """, (time.time(), *identity))
+        return row[0]
+
+
+    def get_digest(self,
+                   filename: str) -> str:
+        """ Returns the digest for the current version of a file - reading the
+            file and caching its digest if it isn't already cached.
+        """
+        digest = self.get_cached_digest(filename)
+        if digest is not None:
+            return digest
+
+        identity = get_file_identity(filename)
+        digest = get_file_digest(filename)
+        self.cache_digest(identity, digest)
+        return digest
+
+
+    def cache_digest(self,
+                     identity: FileIdentity,
+                     digest: str) -> None:
+        """ Caches a digest that was computed elsewhere - ex: while comparing
+            files - where identity was taken before the file was read.
+        """
+        with self.lock:
+            self.miss_cnt += 1
+            # Don't cache a digest that may not match the identity - ex: if the
+            # file was modified while it was being read:
+            if get_file_identity(identity[0]) == identity:
+                self._write(""" DELETE FROM file_digest
+                                WHERE fqfn = ?
+                            """, identity[:1])
+                self._write(""" INSERT INTO file_digest
+                                    (fqfn, inode, file_size, mtime_ns, digest, last_used_epoch)
+                                VALUES (?, ?, ?, ?, ?, ?)
+                            """, (*identity, digest, time.time()))
+
+
+    def _write(self,
+               sql: str,
+               params: tuple) -> None:
+        self.connect.execute(sql, params)
+        self.uncommitted_cnt += 1
+        if self.uncommitted_cnt >= COMMIT_INTERVAL:
+            self.connect.commit()
+            self.uncommitted_cnt = 0
+
+
+    def prune(self) -> int:
+        """ Deletes any entries that haven't been used within MAX_UNUSED_SECONDS.
+        """
+        with self.lock:
+            cursor = self.connect.execute(""" DELETE FROM file_digest
+                                              WHERE last_used_epoch < ?
+                                          """, (time.time() - MAX_UNUSED_SECONDS,))
+            self.connect.commit()
+        return cursor.rowcount
+
+
+    def close(self) -> None:
+        """ Prunes old entries, and commits all changes.
+        """
+        self.prune()
+        self.connect.close()
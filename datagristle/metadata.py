@@ -27,6 +27,7 @@
        - collection_analysis
        - field_analysis
        - field_analysis_value
+       - field_analysis_dist
 
     Reporting Views
        - rpt_collection_analysis_v
@@ -35,23 +36,53 @@
     Copyright 2011-2022 Ken Farmer
 """
 
+import atexit
 import datetime
 import hashlib
+import json
 import logging
 import os
-from pprint import pprint as pp
 import time
-from typing import Tuple, List, Dict
+from typing import Tuple, List, Dict, Any, NamedTuple, Optional, Sequence
+import zlib
 
 import appdirs
-from sqlalchemy import (Table, Column, Boolean, Integer, String, Float, Index,
+from sqlalchemy import (Table, Column, Boolean, Integer, String, Float, Index, LargeBinary,
                         MetaData, DATETIME,
                         UniqueConstraint, ForeignKeyConstraint, CheckConstraint,
-                        event, text, create_engine)
+                        event, text, create_engine, pool)
 from sqlalchemy import exc
 
 import datagristle.simplesql as simplesql
 
+# How long to wait on another process's write lock:
+LOCK_TIMEOUT_SECONDS = 30
+
+# How many times to try creating the db objects while other processes also are:
+SCHEMA_CREATE_ATTEMPTS = 5
+
+# Cached entries not used for this long are deleted:
+MAX_UNUSED_SECONDS = 86400 * 365
+
+# Reads only update an entry's last_update_epoch once it's this old - and
+# those updates are batched:
+LAST_USED_RESOLUTION_SECONDS = 86400
+MAX_PENDING_LAST_USED = 100
+
+
+
+def _set_pragmas_on_connect(dbapi_con, con_record):
+    """ Turns foreign key enforcement on, and tunes each new connection.
+
+        Write-ahead logging lets readers - like concurrent gristle_slicer
+        runs - proceed while another process writes, and with it normal
+        synchronous mode is still safe from corruption.
+    """
+    dbapi_con.execute('pragma foreign_keys=ON')
+    dbapi_con.execute('pragma journal_mode=WAL')
+    dbapi_con.execute('pragma synchronous=NORMAL')
+    dbapi_con.execute('pragma temp_store=MEMORY')
+
 
 
 
@@ -85,9 +116,6 @@ class GristleMetaData(object):
     def __init__(self, db_dir=None, db_name='metadata.db'):
         """ Gets datagristle config, and creates db objects if necessary.
         """
-        logging.basicConfig(filename='/tmp/datagristle_metadata.log')
-        logging.getLogger('sqlalchemy.engine').setLevel(logging.DEBUG)
-
         if db_dir is None:
             user_data_dir = appdirs.user_data_dir('datagristle')
         else:
@@ -97,12 +125,13 @@ class GristleMetaData(object):
             os.makedirs(user_data_dir)
 
         self.fqdb_name = os.path.join(user_data_dir, db_name)
-        self.engine = create_engine('sqlite:////%s' % self.fqdb_name)
-        def _fk_pragma_on_connect(dbapi_con, con_record):
-            """ turns foreign key enforcement on"""
-            dbapi_con.execute('pragma foreign_keys=ON')
-
-        event.listen(self.engine, 'connect', _fk_pragma_on_connect)
+        # A single connection per thread is reused by every query, rather than
+        # connecting (and setting the pragmas) again for each one.  The timeout
+        # is how long to wait for another process's write lock.
+        self.engine = create_engine('sqlite:////%s' % self.fqdb_name,
+                                    poolclass=pool.SingletonThreadPool,
+                                    connect_args={'timeout': LOCK_TIMEOUT_SECONDS})
+        event.listen(self.engine, 'connect', _set_pragmas_on_connect)
 
         self.engine.echo = False
 
@@ -119,6 +148,20 @@ class GristleMetaData(object):
 
         self.create_db_tables_declaratively()
 
+        # Batched updates are written at exit - if not before:
+        atexit.register(self.close)
+
+
+    def close(self):
+        """ Writes any batched updates, and closes the db connections.
+        """
+        try:
+            self.file_index_tools.flush_last_used()
+        except exc.SQLAlchemyError:
+            pass  # they're only cache updates
+        self.connect.close()
+        self.engine.dispose()
+
 
 
     def create_db_tables_declaratively(self):
@@ -160,19 +203,84 @@ class GristleMetaData(object):
         self.field_analysis_value_tools = FieldAnalysisValueTools(self.metadata, self.engine)
         self.field_analysis_value = self.field_analysis_value_tools.table_create()
 
+        self.field_analysis_dist_tools = FieldAnalysisDistTools(self.metadata, self.engine)
+        self.field_analysis_dist = self.field_analysis_dist_tools.table_create()
+
         self.file_index_tools = FileIndexTools(self.metadata, self.engine)
         self.file_index = self.file_index_tools.table_create()
 
+        self.profile_state_tools = ProfileStateTools(self.metadata, self.engine)
+        self.profile_state = self.profile_state_tools.table_create()
+
         self.migration_tools = MigrationTools(self.metadata, self.engine)
         self.migration = self.migration_tools.table_create()
 
-        self.metadata.create_all()
+        # Concurrent processes creating a new db can race between checking for
+        # an object and creating it - the loser just checks again:
+        for attempt in range(SCHEMA_CREATE_ATTEMPTS):
+            try:
+                self.metadata.create_all()
+                self.file_index_tools.add_missing_columns()
+                self.add_missing_indexes()
+
+                # we can't easily create views with sqlalchemy - so do that manually:
+                create_views(self.engine, self.connect)
+                break
+            except exc.OperationalError as err:
+                if (attempt + 1 == SCHEMA_CREATE_ATTEMPTS
+                        or ('already exists' not in str(err) and 'duplicate column' not in str(err))):
+                    raise
+
 
-        # we can't easily create views with sqlalchemy - so do that manually:
-        create_views(self.engine, self.connect)
 
 
 
+    def add_missing_indexes(self):
+        """ Adds any indexes missing from tables created by earlier versions -
+            since create_all() only creates indexes along with new tables.
+        """
+        for table in self.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(self.engine, checkfirst=True)
+
+
+    def write_analysis(self,
+                       analysis_id: int,
+                       collection_id: int,
+                       collection_analysis: Dict[str, Any],
+                       field_analyses: Sequence[Dict[str, Any]] = ()) -> int:
+        """ Writes the results of analyzing a collection - its collection_analysis
+            along with any fields, field_analyses and top field values - within a
+            single transaction, using bulk upserts rather than a round-trip per row.
+
+            Inputs:
+                - collection_analysis - the collection_analysis columns other
+                  than its ids
+                - field_analyses - a dictionary per field, with its field_order,
+                  field_name, field_type & field_len, its field_analysis (fa_*)
+                  columns, and optionally its top_values: a list of (value, count)
+            Returns:
+                - the ca_id of the collection_analysis
+        """
+        with self.engine.begin() as connection:
+            ca_id = self.collection_analysis_tools.upsert(connection,
+                                                          analysis_id=analysis_id,
+                                                          collection_id=collection_id,
+                                                          **collection_analysis)
+            if field_analyses:
+                field_ids = self.field_tools.get_field_ids(connection, collection_id, field_analyses)
+                fa_rows = []
+                for field in field_analyses:
+                    fa_row = {key: val for key, val in field.items() if key.startswith('fa_')}
+                    fa_row.update(ca_id=ca_id, field_id=field_ids[field['field_order']])
+                    fa_rows.append(fa_row)
+                fa_ids = self.field_analysis_tools.bulk_upsert(connection, ca_id, fa_rows)
+                self.field_analysis_dist_tools.bulk_replace(
+                    connection,
+                    {fa_ids[field_ids[field['field_order']]]: field['top_values']
+                     for field in field_analyses if field.get('top_values') is not None})
+        return ca_id
+
 
 
     #---- reporting methods -------------------------------------------------
@@ -490,6 +598,77 @@ class FieldTools(simplesql.TableTools):
                                field_desc=field_desc)
 
 
+    def get_field_ids(self,
+                      connection,
+                      collection_id: int,
+                      fields: Sequence[Dict[str, Any]]) -> Dict[int, int]:
+        """ The bulk version of get_field_id: gets the field_ids of many fields,
+            creating any that don't exist yet - using the caller's connection
+            and transaction.
+
+            Named fields are found by their name - and moved to their new
+            field_order if a column was added or removed ahead of them.
+            Unnamed fields are found by their field_order, like get_field_id.
+            Returns:
+                - dictionary of field_order to field_id
+        """
+        select_sql = text(""" SELECT field_id, field_order, field_name
+                              FROM field
+                              WHERE collection_id = :collection_id
+                          """)
+        rows = connection.execute(select_sql, {'collection_id': collection_id}).fetchall()
+        ids_by_name = {row.field_name: row.field_id for row in rows}
+        ids_by_order = {row.field_order: row.field_id for row in rows}
+        orders_by_id = {row.field_id: row.field_order for row in rows}
+
+        field_ids: Dict[int, int] = {}
+        moved_fields = []
+        new_fields = []
+        field_names = set()
+        for field in fields:
+            field_order = field['field_order']
+            default_name = 'field%s' % field_order
+            field_name = field.get('field_name') or default_name
+            if field_name in field_names:
+                # Duplicate names would otherwise resolve to the same field:
+                field_name = default_name
+            field_names.add(field_name)
+
+            if not field.get('field_name') and field_order in ids_by_order:
+                field_ids[field_order] = ids_by_order[field_order]
+            elif field_name in ids_by_name:
+                field_id = ids_by_name[field_name]
+                field_ids[field_order] = field_id
+                if orders_by_id[field_id] != field_order:
+                    moved_fields.append({'field_id': field_id, 'field_order': field_order})
+            else:
+                new_fields.append({'collection_id': collection_id,
+                                   'field_order': field_order,
+                                   'field_name': field_name,
+                                   'field_desc': field.get('field_desc') or default_name,
+                                   'field_type': field.get('field_type'),
+                                   'field_len': field.get('field_len')})
+        if moved_fields:
+            update_sql = text(""" UPDATE field
+                                  SET field_order = :field_order
+                                  WHERE field_id  = :field_id
+                              """)
+            connection.execute(update_sql, moved_fields)
+        if new_fields:
+            insert_sql = text(""" INSERT INTO field
+                                      (collection_id, field_order, field_name, field_desc,
+                                       field_type, field_len)
+                                  VALUES (:collection_id, :field_order, :field_name, :field_desc,
+                                          :field_type, :field_len)
+                              """)
+            connection.execute(insert_sql, new_fields)
+            rows = connection.execute(select_sql, {'collection_id': collection_id}).fetchall()
+            ids_by_name = {row.field_name: row.field_id for row in rows}
+            for field in new_fields:
+                field_ids[field['field_order']] = ids_by_name[field['field_name']]
+        return field_ids
+
+
     def insert(self, **kwargs):
         """ Inserts schema values into database.
             Inputs:
@@ -969,6 +1148,9 @@ class CollectionAnalysisTools(simplesql.TableTools):
                                                 nullable=True),
                                          UniqueConstraint('analysis_id','collection_id',
                                                 name='collection_analysis_uk1'),
+                                         # supports finding a collection's latest analysis:
+                                         Index('collection_analysis_ix1',
+                                               'collection_id', 'analysis_id'),
                                          ForeignKeyConstraint(columns=['analysis_id'],
                                                 refcolumns=['analysis.analysis_id'],
                                                 name='collection_analysis_fk1',
@@ -984,6 +1166,31 @@ class CollectionAnalysisTools(simplesql.TableTools):
         return self._table
 
 
+    def upsert(self,
+               connection,
+               **kwargs: Any) -> int:
+        """ Inserts or updates a collection_analysis by its analysis_id and
+            collection_id - using the caller's connection and transaction.
+            Returns:
+                - ca_id
+        """
+        cols = list(kwargs)
+        updates = ', '.join(f'{col} = excluded.{col}' for col in cols
+                            if col not in ('analysis_id', 'collection_id'))
+        upsert_sql = text(f""" INSERT INTO collection_analysis ({', '.join(cols)})
+                               VALUES ({', '.join(':' + col for col in cols)})
+                               ON CONFLICT (analysis_id, collection_id) DO UPDATE
+                                   SET {updates}
+                           """)
+        connection.execute(upsert_sql, kwargs)
+        select_sql = text(""" SELECT ca_id
+                              FROM collection_analysis
+                              WHERE analysis_id   = :analysis_id
+                                AND collection_id = :collection_id
+                          """)
+        return connection.execute(select_sql, kwargs).scalar()
+
+
 
 class FieldAnalysisTools(simplesql.TableTools):
     """ Includes all methods for the 'field_analysis' table.
@@ -1048,6 +1255,8 @@ class FieldAnalysisTools(simplesql.TableTools):
                                            nullable=True),
                                     UniqueConstraint('ca_id', 'field_id',
                                            name='field_analysis_uk1'),
+                                    # supports a field's history across analyses:
+                                    Index('field_analysis_ix1', 'field_id', 'ca_id'),
                                     ForeignKeyConstraint(columns=['ca_id'],
                                            refcolumns=['collection_analysis.ca_id'],
                                            name='field_analysis_fk1',
@@ -1065,6 +1274,34 @@ class FieldAnalysisTools(simplesql.TableTools):
         return self._table
 
 
+    def bulk_upsert(self,
+                    connection,
+                    ca_id: int,
+                    rows: Sequence[Dict[str, Any]]) -> Dict[int, int]:
+        """ Inserts or updates many field_analysis rows of a collection_analysis
+            with a single executemany - using the caller's connection and
+            transaction.  Columns missing from some rows are written as nulls.
+            Returns:
+                - dictionary of field_id to fa_id for the collection_analysis
+        """
+        if rows:
+            cols = list(dict.fromkeys(col for row in rows for col in row))
+            rows = [{col: row.get(col) for col in cols} for row in rows]
+            updates = ', '.join(f'{col} = excluded.{col}' for col in cols
+                                if col not in ('ca_id', 'field_id'))
+            upsert_sql = text(f""" INSERT INTO field_analysis ({', '.join(cols)})
+                                   VALUES ({', '.join(':' + col for col in cols)})
+                                   ON CONFLICT (ca_id, field_id) DO UPDATE
+                                       SET {updates}
+                               """)
+            connection.execute(upsert_sql, rows)
+        select_sql = text(""" SELECT field_id, fa_id
+                              FROM field_analysis
+                              WHERE ca_id = :ca_id
+                          """)
+        return dict(connection.execute(select_sql, {'ca_id': ca_id}).fetchall())
+
+
 
 class FieldAnalysisValueTools(simplesql.TableTools):
     """ Includes all methods for the 'field_analysis' table.
@@ -1090,6 +1327,9 @@ class FieldAnalysisValueTools(simplesql.TableTools):
                                                  nullable=False),
                                           UniqueConstraint('fa_id', 'fav_value',
                                                            name='field_analysis_value_uk1'),
+                                          # covers listing a field's top values:
+                                          Index('field_analysis_value_ix1',
+                                                'fa_id', 'fav_count', 'fav_value'),
                                           ForeignKeyConstraint(columns=['fa_id'],
                                                                refcolumns=['field_analysis.fa_id'],
                                                                name='field_analysis_value_fk1',
@@ -1102,8 +1342,116 @@ class FieldAnalysisValueTools(simplesql.TableTools):
 
 
 
+class ValueCount(NamedTuple):
+    fav_value: str
+    fav_count: int
+
+
+
+def pack_value_dist(values: Sequence[Tuple[Any, int]]) -> bytes:
+    """ Packs a field's (value, count) tuples into a compressed blob - that
+        keeps their order.
+    """
+    return zlib.compress(json.dumps([[str(value), count] for value, count in values],
+                                    separators=(',', ':')).encode('utf-8'))
+
+
+
+def unpack_value_dist(packed: bytes,
+                      limit: Optional[int] = None) -> List[ValueCount]:
+    values = json.loads(zlib.decompress(packed).decode('utf-8'))
+    return [ValueCount(value, count) for value, count in values[:limit]]
+
+
+
+class FieldAnalysisDistTools(simplesql.TableTools):
+    """ Includes all methods for the 'field_analysis_dist' table.
+
+        Holds the distribution of each field_analysis's most frequent values -
+        packed into a single row per field_analysis, rather than the row per
+        value (and its index entries) of field_analysis_value, which is now only
+        read for analyses written by earlier versions.
+    """
+
+    def table_create(self):
+        """ Creates the 'field_analysis_dist' table.
+        """
+        self.field_analysis_dist = Table('field_analysis_dist',
+                                         self.metadata,
+                                         Column('fa_id',
+                                                Integer,
+                                                nullable=False,
+                                                primary_key=True),
+                                         Column('fad_value_cnt',
+                                                Integer,
+                                                nullable=False),
+                                         Column('fad_values',
+                                                LargeBinary,
+                                                nullable=False),
+                                         ForeignKeyConstraint(columns=['fa_id'],
+                                                              refcolumns=['field_analysis.fa_id'],
+                                                              name='field_analysis_dist_fk1',
+                                                              ondelete='CASCADE'),
+                                         extend_existing=True)
+
+        self._table = self.field_analysis_dist
+        self._table_name = 'field_analysis_dist'
+        return self._table
+
+
+    def bulk_replace(self,
+                     connection,
+                     values_by_fa_id: Dict[int, Sequence[Tuple[Any, int]]]) -> None:
+        """ Replaces the values of each field_analysis with the given (value,
+            count) tuples - using the caller's connection and transaction.
+        """
+        if not values_by_fa_id:
+            return
+        connection.execute(text(""" INSERT INTO field_analysis_dist
+                                        (fa_id, fad_value_cnt, fad_values)
+                                    VALUES (:fa_id, :fad_value_cnt, :fad_values)
+                                    ON CONFLICT (fa_id) DO UPDATE
+                                        SET fad_value_cnt = excluded.fad_value_cnt,
+                                            fad_values    = excluded.fad_values
+                                """),
+                           [{'fa_id': fa_id,
+                             'fad_value_cnt': len(values),
+                             'fad_values': pack_value_dist(values)}
+                            for fa_id, values in values_by_fa_id.items()])
+        # Drop any rows an earlier version wrote for the same field analyses:
+        connection.execute(text(""" DELETE FROM field_analysis_value
+                                    WHERE fa_id = :fa_id
+                                """),
+                           [{'fa_id': fa_id} for fa_id in values_by_fa_id])
+
+
+
+
+FILE_FACTS = ('record_count', 'column_count', 'dialect', 'header', 'offset_index', 'profile_summary')
+JSON_FILE_FACTS = ('dialect', 'header', 'profile_summary')
+
+
+
+def get_file_identity(filename: str) -> Tuple[str, datetime.datetime, int]:
+    """ Returns the absolute filename, modification datetime and size that
+        together identify a version of a file within the file_index.
+    """
+    file_stat = os.stat(filename)
+    return (os.path.abspath(filename),
+            datetime.datetime.fromtimestamp(file_stat.st_mtime),
+            file_stat.st_size)
+
+
+
 class FileIndexTools(simplesql.TableTools):
     """ Includes all methods for the 'file_index' table.
+
+        The file_index is a cache of facts about each version of a file -
+        counts, csv dialect, header, a pointer to an offset index, and a
+        profile summary - so that a later run on an unchanged file can
+        skip rediscovering them.  Each version is identified by a hash of
+        its name, modification time and size.  Dialect, header and profile
+        summary are stored as json.
     """
 
     def table_create(self):
@@ -1121,6 +1469,18 @@ class FileIndexTools(simplesql.TableTools):
                                 Column('column_count',
                                         Integer,
                                         nullable=True),
+                                Column('dialect',
+                                        String(1024),
+                                        nullable=True),
+                                Column('header',
+                                        String,
+                                        nullable=True),
+                                Column('offset_index',
+                                        String(1024),
+                                        nullable=True),
+                                Column('profile_summary',
+                                        String,
+                                        nullable=True),
                                 Column('last_update_epoch',
                                         Float,
                                         index=True,
@@ -1132,9 +1492,23 @@ class FileIndexTools(simplesql.TableTools):
         self._table = self.file_index
         self._table_name = 'file_index'
         self.instance = None # assigned in InstanceTools
+        self._pending_last_used: Dict[str, float] = {}
+        self._prune_checked = False
         return self._table
 
 
+    def add_missing_columns(self) -> None:
+        """ Adds the file-facts columns to file_index tables created by
+            earlier versions - since create_all() won't alter existing tables.
+        """
+        result = self.engine.execute(text('PRAGMA table_info(file_index)'))
+        existing_cols = [row.name for row in result.fetchall()]
+        for col_name in FILE_FACTS:
+            if col_name not in existing_cols:
+                col_type = 'INTEGER' if col_name.endswith('_count') else 'VARCHAR'
+                self.engine.execute(text(f'ALTER TABLE file_index ADD COLUMN {col_name} {col_type}'))
+
+
     def _hash_file_index(self, filename, mod_datetime, file_bytes):
         string = bytes(filename + mod_datetime.isoformat() + str(file_bytes), 'utf-8')
         hash_object = hashlib.sha1(string)
@@ -1150,15 +1524,15 @@ class FileIndexTools(simplesql.TableTools):
         """
 
         file_hash = self._hash_file_index(filename, mod_datetime, file_bytes)
-        sql = """ SELECT record_count
+        sql = """ SELECT record_count, last_update_epoch
                   FROM file_index
                   WHERE file_hash = :file_hash
               """
         select_sql = text(sql)
         result = self.engine.execute(select_sql, file_hash=file_hash)
         rows = result.fetchall()
-        self.update(filename, mod_datetime, file_bytes)
         try:
+            self._touch(file_hash, rows[0].last_update_epoch)
             return rows[0].record_count
         except IndexError:  # No rows found
             return -1
@@ -1188,20 +1562,84 @@ class FileIndexTools(simplesql.TableTools):
         sql = text(raw_sql)
         curr_epoch = time.time()
         try:
-            connection = self.engine.connect()
-            result = connection.execute(sql,
-                                        file_hash=file_hash,
-                                        rec_count=rec_count,
-                                        col_count=col_count,
-                                        epoch=curr_epoch)
+            with self.engine.begin() as connection:
+                result = connection.execute(sql,
+                                            file_hash=file_hash,
+                                            rec_count=rec_count,
+                                            col_count=col_count,
+                                            epoch=curr_epoch)
+                self._write_last_used(connection)
+                self._prune_if_due(connection)
         except exc.IntegrityError as err:
             raise ValueError('Insert failed. %s' % err)
         else:
-            self.prune()
             return (result.lastrowid,
                     result.rowcount)
 
 
+    def get_file_facts(self,
+                       filename: str) -> Dict[str, Any]:
+        """ Returns the cached facts for the current version of a file.
+
+            Facts that haven't been cached are excluded - so an unknown
+            file returns an empty dictionary.
+        """
+        fqfn, mod_datetime, file_bytes = get_file_identity(filename)
+        file_hash = self._hash_file_index(fqfn, mod_datetime, file_bytes)
+        sql = """ SELECT %s, last_update_epoch
+                  FROM file_index
+                  WHERE file_hash = :file_hash
+              """ % ', '.join(FILE_FACTS)
+        result = self.engine.execute(text(sql), file_hash=file_hash)
+        rows = result.fetchall()
+        if not rows:
+            return {}
+        self._touch(file_hash, rows[0].last_update_epoch)
+
+        facts = {}
+        for fact_name in FILE_FACTS:
+            fact = getattr(rows[0], fact_name)
+            if fact is None:
+                continue
+            facts[fact_name] = json.loads(fact) if fact_name in JSON_FILE_FACTS else fact
+        return facts
+
+
+    def set_file_facts(self,
+                       filename: str,
+                       **facts: Any) -> None:
+        """ Caches facts for the current version of a file.
+
+            Only the facts provided are changed - any others already cached
+            for this version of the file are kept.
+        """
+        invalid_facts = set(facts) - set(FILE_FACTS)
+        if invalid_facts:
+            raise ValueError(f'Invalid file facts: {sorted(invalid_facts)}')
+        fqfn, mod_datetime, file_bytes = get_file_identity(filename)
+        file_hash = self._hash_file_index(fqfn, mod_datetime, file_bytes)
+        params = {key: json.dumps(val) if key in JSON_FILE_FACTS and val is not None else val
+                  for key, val in facts.items()}
+        params['file_hash'] = file_hash
+        params['epoch'] = time.time()
+
+        assignments = ''.join(f'{key} = :{key}, ' for key in facts)
+        upsert_sql = f""" INSERT INTO file_index
+                              (file_hash, {''.join(f'{key}, ' for key in facts)}last_update_epoch)
+                          VALUES (:file_hash, {''.join(f':{key}, ' for key in facts)}:epoch)
+                          ON CONFLICT (file_hash) DO UPDATE
+                              SET {assignments}last_update_epoch = :epoch
+                      """
+        try:
+            with self.engine.begin() as connection:
+                connection.execute(text(upsert_sql), **params)
+                self._pending_last_used.pop(file_hash, None)
+                self._write_last_used(connection)
+                self._prune_if_due(connection)
+        except exc.IntegrityError as err:
+            raise ValueError('Upsert failed. %s' % err)
+
+
     def update(self,
                filename,
                mod_datetime,
@@ -1217,10 +1655,10 @@ class FileIndexTools(simplesql.TableTools):
         sql = text(raw_sql)
         curr_epoch = time.time()
         try:
-            connection = self.engine.connect()
-            result = connection.execute(sql,
-                                        file_hash=file_hash,
-                                        epoch=curr_epoch)
+            with self.engine.begin() as connection:
+                result = connection.execute(sql,
+                                            file_hash=file_hash,
+                                            epoch=curr_epoch)
         except exc.IntegrityError as err:
             raise ValueError('Update failed. %s' % err)
         else:
@@ -1228,19 +1666,77 @@ class FileIndexTools(simplesql.TableTools):
                     result.rowcount)
 
 
-    def prune(self) -> int:
+    def _touch(self,
+               file_hash: str,
+               last_update_epoch: float) -> None:
+        """ Records that an entry was just used - so that it isn't pruned.
+
+            Reads would otherwise each need a write lock - so this only
+            happens once an entry's last_update_epoch is a day old, and the
+            updates are batched.  They're written with the next write, once
+            enough are pending, or by flush_last_used().
+        """
+        if time.time() - last_update_epoch < LAST_USED_RESOLUTION_SECONDS:
+            return
+        self._pending_last_used[file_hash] = time.time()
+        if len(self._pending_last_used) >= MAX_PENDING_LAST_USED:
+            self.flush_last_used()
+
+
+    def flush_last_used(self) -> None:
+        """ Writes any pending last_update_epoch updates.
+        """
+        if not self._pending_last_used:
+            return
+        with self.engine.begin() as connection:
+            self._write_last_used(connection)
+
+
+    def _write_last_used(self,
+                         connection) -> None:
+        if not self._pending_last_used:
+            return
+        sql = text(""" UPDATE file_index
+                       SET last_update_epoch = :epoch
+                       WHERE file_hash = :file_hash
+                   """)
+        connection.execute(sql, [{'file_hash': file_hash, 'epoch': epoch}
+                                 for file_hash, epoch in self._pending_last_used.items()])
+        self._pending_last_used.clear()
+
+
+    def _prune_if_due(self,
+                      connection) -> None:
+        """ Prunes at most once per process - and then only if the oldest entry
+            has expired, which the index on last_update_epoch makes cheap to check.
+        """
+        if self._prune_checked:
+            return
+        self._prune_checked = True
+        sql = text(""" SELECT MIN(last_update_epoch)
+                       FROM file_index
+                   """)
+        oldest_epoch = connection.execute(sql).scalar()
+        if oldest_epoch is not None and oldest_epoch < time.time() - MAX_UNUSED_SECONDS:
+            self.prune(connection)
+
+
+    def prune(self,
+              connection=None) -> int:
         """ Deletes any entries more than a year old
         """
 
-        min_epoch = time.time() - (86400 * 365)
+        min_epoch = time.time() - MAX_UNUSED_SECONDS
         raw_sql = """ DELETE FROM file_index
                       WHERE last_update_epoch < :epoch
                   """
         sql = text(raw_sql)
         try:
-            connection = self.engine.connect()
-            result = connection.execute(sql,
-                                        epoch=min_epoch)
+            if connection is None:
+                with self.engine.begin() as connection:
+                    result = connection.execute(sql, epoch=min_epoch)
+            else:
+                result = connection.execute(sql, epoch=min_epoch)
         except exc.IntegrityError as err:
             raise ValueError('Delete failed. %s' % err)
         else:
@@ -1248,6 +1744,72 @@ class FileIndexTools(simplesql.TableTools):
 
 
 
+class ProfileStateTools(simplesql.TableTools):
+    """ Includes all methods for the 'profile_state' table.
+
+        Holds the packed state of the last incremental profile of each file -
+        see datagristle.profile_state.  Unlike the file_index, it's keyed by
+        just the file name, since the next run is on a longer version of the
+        same file.
+    """
+
+    def table_create(self):
+        """ Creates the 'profile_state' table.
+        """
+        self.profile_state = Table('profile_state',
+                                   self.metadata,
+                                   Column('fqfn',
+                                          String,
+                                          nullable=False,
+                                          primary_key=True),
+                                   Column('ps_state',
+                                          LargeBinary,
+                                          nullable=False),
+                                   Column('last_update_epoch',
+                                          Float,
+                                          index=True,
+                                          nullable=False),
+                                   extend_existing=True)
+
+        self._table = self.profile_state
+        self._table_name = 'profile_state'
+        return self._table
+
+
+    def get_state(self,
+                  filename: str) -> Optional[bytes]:
+        """ Returns the packed state saved for the file - or None.
+        """
+        sql = text(""" SELECT ps_state
+                       FROM profile_state
+                       WHERE fqfn = :fqfn
+                   """)
+        return self.engine.execute(sql, fqfn=os.path.abspath(filename)).scalar()
+
+
+    def set_state(self,
+                  filename: str,
+                  packed_state: bytes) -> None:
+        """ Saves the packed state for the file - replacing any prior state, and
+            deleting the state of any files not profiled within MAX_UNUSED_SECONDS.
+        """
+        now = time.time()
+        with self.engine.begin() as connection:
+            connection.execute(text(""" INSERT INTO profile_state
+                                            (fqfn, ps_state, last_update_epoch)
+                                        VALUES (:fqfn, :ps_state, :epoch)
+                                        ON CONFLICT (fqfn) DO UPDATE
+                                            SET ps_state          = excluded.ps_state,
+                                                last_update_epoch = excluded.last_update_epoch
+                                    """),
+                               fqfn=os.path.abspath(filename), ps_state=packed_state, epoch=now)
+            connection.execute(text(""" DELETE FROM profile_state
+                                        WHERE last_update_epoch < :epoch
+                                    """),
+                               epoch=now - MAX_UNUSED_SECONDS)
+
+
+
 class MigrationTools(simplesql.TableTools):
     """ Tracks the schema versions
     """
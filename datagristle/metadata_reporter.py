@@ -0,0 +1,349 @@
+#!/usr/bin/env python
+""" Purpose of this module is to provide the read queries used to report on
+    the metadata database - by gristle_md_reporter and the web UI.
+
+    All queries run on a single read-only connection that's reused for the
+    life of the reporter, rather than connecting for each request.  Results
+    are cached until any other connection - from this process or another -
+    changes the database, which sqlite reports through its data_version.
+    Listings that can grow without limit - like a field's values or its
+    history across years of analyses - are paginated by key rather than by
+    offset, so that later pages are as fast as the first.
+
+    See the file "LICENSE" for the full license governing this code.
+    Copyright 2011-2022 Ken Farmer
+"""
+import collections
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import create_engine, event, pool, text
+
+import datagristle.metadata as metadata
+
+DEFAULT_PAGE_SIZE = 100
+DEFAULT_TOP_VALUE_CNT = 20
+
+# The most query results to keep cached:
+MAX_CACHED_RESULTS = 256
+
+
+
+class Page(NamedTuple):
+    rows: List[Any]
+    next_key: Optional[Any] = None   # None if this is the last page
+
+
+
+def _set_read_pragmas_on_connect(dbapi_con, con_record):
+    """ Keeps the reporting connection from ever writing - which the cache
+        relies on - and keeps its sorts in memory.
+    """
+    dbapi_con.execute('pragma query_only=ON')
+    dbapi_con.execute('pragma temp_store=MEMORY')
+
+
+
+class MetadataReporter(object):
+    """ Runs the reporting queries against a GristleMetaData's database.
+
+        Can be shared by threads - ex: by a web server's request handlers:
+        queries are serialized on the single connection.
+    """
+
+    def __init__(self,
+                 md: metadata.GristleMetaData) -> None:
+
+        self.engine = create_engine('sqlite:////%s' % md.fqdb_name,
+                                    poolclass=pool.StaticPool,
+                                    connect_args={'timeout': metadata.LOCK_TIMEOUT_SECONDS,
+                                                  'check_same_thread': False})
+        event.listen(self.engine, 'connect', _set_read_pragmas_on_connect)
+        self.connection = self.engine.connect()
+        self.lock = threading.Lock()
+
+        self.cache: 'collections.OrderedDict[Tuple, List[Any]]' = collections.OrderedDict()
+        self.data_version: Optional[int] = None
+        self.hit_cnt = 0
+        self.miss_cnt = 0
+
+
+    def close(self) -> None:
+        self.connection.close()
+        self.engine.dispose()
+
+
+    def _query(self,
+               sql: str,
+               **params: Any) -> List[Any]:
+        """ Returns all rows of the query - from the cache if the database
+            hasn't changed since they were cached.
+        """
+        key = (sql, tuple(sorted(params.items())))
+        with self.lock:
+            data_version = self.connection.execute(text('PRAGMA data_version')).scalar()
+            if data_version != self.data_version:
+                self.cache.clear()
+                self.data_version = data_version
+            elif key in self.cache:
+                self.hit_cnt += 1
+                self.cache.move_to_end(key)
+                return list(self.cache[key])
+
+            self.miss_cnt += 1
+            rows = self.connection.execute(text(sql), params).fetchall()
+            self.cache[key] = rows
+            if len(self.cache) > MAX_CACHED_RESULTS:
+                self.cache.popitem(last=False)
+        return list(rows)
+
+
+    def _query_page(self,
+                    sql: str,
+                    key_col: str,
+                    key_condition: str,
+                    after_key: Optional[Any],
+                    page_size: int,
+                    **params: Any) -> Page:
+        """ Returns a page of rows - where the sql is ordered by key_col, and
+            has a {key_filter} for the key_condition that selects the rows after
+            :after_key.  The condition is only added when there's an after_key,
+            since a condition that's sometimes null would keep sqlite from
+            using it to search the index.
+        """
+        if after_key is None:
+            sql = sql.format(key_filter='')
+        else:
+            sql = sql.format(key_filter=f'AND {key_condition}')
+            params['after_key'] = after_key
+        rows = self._query(sql + ' LIMIT :limit', limit=page_size + 1, **params)
+        if len(rows) > page_size:
+            return Page(rows[:page_size], getattr(rows[page_size - 1], key_col))
+        return Page(rows)
+
+
+    #---- schemas, collections & fields ------------------------------------
+
+    def get_schemas(self) -> List[Any]:
+        """ Returns every schema along with its count of collections.
+        """
+        sql = """ SELECT s.schema_name,
+                         s.schema_id,
+                         s.schema_desc,
+                         COUNT(c.collection_id) AS coll_cnt
+                  FROM schema s
+                     LEFT OUTER JOIN collection c
+                        ON s.schema_id = c.schema_id
+                  GROUP BY s.schema_name,
+                           s.schema_id,
+                           s.schema_desc
+                  ORDER BY s.schema_name DESC
+              """
+        return self._query(sql)
+
+
+    def get_schema(self,
+                   schema_id: int) -> Optional[Any]:
+        sql = """ SELECT schema_name, schema_id, schema_desc
+                  FROM schema
+                  WHERE schema_id = :schema_id
+              """
+        rows = self._query(sql, schema_id=schema_id)
+        return rows[0] if rows else None
+
+
+    def get_collections(self,
+                        schema_id: int) -> List[Any]:
+        sql = """ SELECT collection_id, collection_name, collection_desc
+                  FROM collection
+                  WHERE schema_id = :schema_id
+                  ORDER BY collection_name
+              """
+        return self._query(sql, schema_id=schema_id)
+
+
+    def get_fields(self,
+                   collection_id: int) -> List[Any]:
+        sql = """ SELECT field_id, field_name, field_desc, field_type,
+                         field_order, field_len
+                  FROM field
+                  WHERE collection_id = :collection_id
+                  ORDER BY field_order, field_name
+              """
+        return self._query(sql, collection_id=collection_id)
+
+
+    def get_field_values(self,
+                         field_id: int,
+                         after_value: Optional[str] = None,
+                         page_size: int = DEFAULT_PAGE_SIZE) -> Page:
+        """ Returns a page of a field's described values - in value order,
+            starting after after_value.
+        """
+        sql = """ SELECT fv_value, fv_desc, fv_issues
+                  FROM field_value
+                  WHERE field_id = :field_id
+                    {key_filter}
+                  ORDER BY fv_value
+              """
+        return self._query_page(sql, 'fv_value', 'fv_value > :after_key', after_value,
+                                page_size, field_id=field_id)
+
+
+    def get_field_value(self,
+                        field_id: int,
+                        fv_value: str) -> Optional[Any]:
+        sql = """ SELECT fv_value, fv_desc, fv_issues
+                  FROM field_value
+                  WHERE field_id = :field_id
+                    AND fv_value = :fv_value
+              """
+        rows = self._query(sql, field_id=field_id, fv_value=fv_value)
+        return rows[0] if rows else None
+
+
+    #---- analyses ----------------------------------------------------------
+
+    def get_latest_analysis_id(self,
+                               collection_id: int) -> Optional[int]:
+        """ Returns the id of the most recent analysis of the collection - or
+            None if it has never been analyzed.
+        """
+        sql = """ SELECT MAX(analysis_id) AS analysis_id
+                  FROM collection_analysis
+                  WHERE collection_id = :collection_id
+              """
+        return self._query(sql, collection_id=collection_id)[0].analysis_id
+
+
+    def get_collection_analysis(self,
+                                collection_id: int,
+                                analysis_id: int) -> Optional[Any]:
+        sql = """ SELECT *
+                  FROM rpt_collection_analysis_v
+                  WHERE collection_id = :collection_id
+                    AND analysis_id   = :analysis_id
+              """
+        rows = self._query(sql, collection_id=collection_id, analysis_id=analysis_id)
+        return rows[0] if rows else None
+
+
+    def get_field_analyses(self,
+                           collection_id: int,
+                           analysis_id: int,
+                           field_id: Optional[int] = None,
+                           field_name: Optional[str] = None) -> List[Any]:
+        """ Returns each field of the collection - in field order - along with
+            its results from the analysis, if it has any.  Can be restricted to
+            a single field by id or name.
+        """
+        sql = """ SELECT f.collection_id,
+                         ca.analysis_id,
+                         ca.ca_id,
+                         f.field_id,
+                         f.field_name,
+                         f.field_type,
+                         f.field_order,
+                         f.field_len,
+                         f.field_desc,
+                         fa.fa_id,
+                         fa.fa_type,
+                         fa.fa_unique_cnt,
+                         fa.fa_known_cnt,
+                         fa.fa_unknown_cnt,
+                         fa.fa_min,
+                         fa.fa_max,
+                         fa.fa_mean,
+                         fa.fa_median,
+                         fa.fa_stddev,
+                         fa.fa_variance,
+                         fa.fa_min_len,
+                         fa.fa_max_len,
+                         fa.fa_mean_len,
+                         fa.fa_case
+                  FROM field f
+                     INNER JOIN collection_analysis ca
+                        ON f.collection_id = ca.collection_id
+                       AND ca.analysis_id  = :analysis_id
+                     LEFT OUTER JOIN field_analysis fa
+                        ON ca.ca_id    = fa.ca_id
+                       AND f.field_id  = fa.field_id
+                  WHERE f.collection_id = :collection_id
+                    AND (:field_id IS NULL OR f.field_id = :field_id)
+                    AND (:field_name IS NULL OR f.field_name = :field_name)
+                  ORDER BY f.field_order, f.field_name
+              """
+        return self._query(sql, collection_id=collection_id, analysis_id=analysis_id,
+                           field_id=field_id, field_name=field_name)
+
+
+    def get_top_values(self,
+                       fa_id: int,
+                       limit: int = DEFAULT_TOP_VALUE_CNT) -> List[metadata.ValueCount]:
+        """ Returns a field analysis's most frequent values - most frequent
+            first.
+        """
+        sql = """ SELECT fad_values
+                  FROM field_analysis_dist
+                  WHERE fa_id = :fa_id
+              """
+        rows = self._query(sql, fa_id=fa_id)
+        if rows:
+            return metadata.unpack_value_dist(rows[0].fad_values, limit)
+
+        # Analyses written by earlier versions have a row per value instead:
+        sql = """ SELECT fav_value, fav_count
+                  FROM field_analysis_value
+                  WHERE fa_id = :fa_id
+                  ORDER BY fav_count DESC, fav_value DESC
+                  LIMIT :limit
+              """
+        return [metadata.ValueCount(*row) for row in self._query(sql, fa_id=fa_id, limit=limit)]
+
+
+    def get_field_history(self,
+                          field_id: int,
+                          before_ca_id: Optional[int] = None,
+                          page_size: int = DEFAULT_PAGE_SIZE) -> Page:
+        """ Returns a page of a field's results across analyses - most recently
+            written first, starting before before_ca_id.
+        """
+        sql = """ SELECT fa.ca_id,
+                         ca.analysis_id,
+                         a.analysis_timestamp,
+                         ca.ca_row_cnt,
+                         fa.fa_id,
+                         fa.fa_type,
+                         fa.fa_unique_cnt,
+                         fa.fa_known_cnt,
+                         fa.fa_unknown_cnt,
+                         fa.fa_min,
+                         fa.fa_max,
+                         fa.fa_mean,
+                         fa.fa_case
+                  FROM field_analysis fa
+                     INNER JOIN collection_analysis ca
+                        ON fa.ca_id = ca.ca_id
+                     INNER JOIN analysis a
+                        ON ca.analysis_id = a.analysis_id
+                  WHERE fa.field_id = :field_id
+                    {key_filter}
+                  ORDER BY fa.ca_id DESC
+              """
+        return self._query_page(sql, 'ca_id', 'fa.ca_id < :after_key', before_ca_id,
+                                page_size, field_id=field_id)
+
+
+    def get_data_dictionary(self,
+                            collection_id: int) -> Dict[str, Any]:
+        """ Returns the collection's latest analysis, and its fields with their
+            results and top values - or an empty dict if it was never analyzed.
+        """
+        analysis_id = self.get_latest_analysis_id(collection_id)
+        if analysis_id is None:
+            return {}
+        fields = self.get_field_analyses(collection_id, analysis_id)
+        return {'collection_analysis': self.get_collection_analysis(collection_id, analysis_id),
+                'fields': fields,
+                'top_values': {field.field_id: self.get_top_values(field.fa_id)
+                               for field in fields if field.fa_id is not None}}
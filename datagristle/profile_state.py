@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+""" Purpose of this module is to support incremental profiling of files that
+    only grow - like logs and daily appends.
+
+    A profile's mergeable state - the record count, and each field's frequency
+    distribution - is saved along with the byte offset that it covers.  The
+    next run then reads only the records appended after that offset, and
+    merges them into the saved state.  Everything else the profiler reports
+    is derived from the frequency distributions.
+
+    The state is only reused if the file's first and last processed blocks
+    are unchanged, and if it was produced with the same settings.  Otherwise
+    the file is profiled from the start.
+
+    See the file "LICENSE" for the full license governing this code.
+    Copyright 2011-2022 Ken Farmer
+"""
+import hashlib
+import io
+import json
+import os
+from typing import Any, Dict, NamedTuple, Optional, TextIO, Tuple
+import zlib
+
+STATE_VERSION = 1
+
+# The size of the blocks whose checksums confirm that a file is unchanged:
+CHECK_BLOCK_SIZE = 64 * 1024
+
+READ_BUFFER_SIZE = 1024 * 1024
+
+ByteRange = Tuple[int, int]
+
+
+
+class FieldState(NamedTuple):
+    freq: Dict[Any, int]
+    truncated: bool
+    invalid_row_cnt: int
+
+
+
+class ProfileState(NamedTuple):
+    end_offset: int
+    block_digests: Tuple[str, str]
+    settings: Dict[str, Any]
+    record_cnt: int
+    fields: Dict[int, FieldState]
+
+
+
+def get_end_offset(filename: str) -> int:
+    """ Returns the offset just past the file's last complete line - so that
+        a record that's still being appended is left for the next run.
+    """
+    size = os.path.getsize(filename)
+    with open(filename, 'rb') as inbuf:
+        end_offset = size
+        while end_offset > 0:
+            start_offset = max(0, end_offset - CHECK_BLOCK_SIZE)
+            inbuf.seek(start_offset)
+            newline_pos = inbuf.read(end_offset - start_offset).rfind(b'\n')
+            if newline_pos > -1:
+                return start_offset + newline_pos + 1
+            end_offset = start_offset
+    return 0
+
+
+
+def get_block_digests(filename: str,
+                      end_offset: int) -> Tuple[str, str]:
+    """ Returns the checksums of the first and last blocks before end_offset.
+    """
+    digests = []
+    with open(filename, 'rb') as inbuf:
+        for start_offset in (0, max(0, end_offset - CHECK_BLOCK_SIZE)):
+            inbuf.seek(start_offset)
+            block = inbuf.read(min(CHECK_BLOCK_SIZE, end_offset - start_offset))
+            digests.append(hashlib.blake2b(block, digest_size=16).hexdigest())
+    return digests[0], digests[1]
+
+
+
+def get_resume_offset(state: Optional[ProfileState],
+                      filename: str,
+                      settings: Dict[str, Any]) -> int:
+    """ Returns the offset that a profile can resume from using the state - or
+        zero if the state can't be used.
+    """
+    if state is None or state.settings != settings:
+        return 0
+    if os.path.getsize(filename) < state.end_offset:
+        return 0
+    if get_block_digests(filename, state.end_offset) != state.block_digests:
+        return 0
+    return state.end_offset
+
+
+
+class _ByteRangeReader(io.RawIOBase):
+    """ Reads only up to a limit from a binary file.
+    """
+
+    def __init__(self,
+                 inbuf,
+                 limit: int) -> None:
+        super().__init__()
+        self.inbuf = inbuf
+        self.remaining = limit
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self.remaining <= 0:
+            return 0
+        read_cnt = self.inbuf.readinto(memoryview(buffer)[:min(len(buffer), self.remaining)])
+        self.remaining -= read_cnt
+        return read_cnt
+
+    def close(self) -> None:
+        self.inbuf.close()
+        super().close()
+
+
+
+def open_byte_range(filename: str,
+                    byte_range: ByteRange) -> TextIO:
+    """ Opens a file for reading the text within the byte range - which must
+        start and end on record boundaries.
+    """
+    start_offset, end_offset = byte_range
+    inbuf = open(filename, 'rb')
+    inbuf.seek(start_offset)
+    return io.TextIOWrapper(io.BufferedReader(_ByteRangeReader(inbuf, end_offset - start_offset),
+                                              buffer_size=READ_BUFFER_SIZE),
+                            newline='')
+
+
+
+def pack_state(state: ProfileState) -> bytes:
+    """ Packs the state into compressed json.  Frequency distributions are
+        kept as lists of [value, count] pairs, so non-string values - like the
+        floats from QUOTE_NONNUMERIC - keep their types.
+    """
+    return zlib.compress(json.dumps({'version': STATE_VERSION,
+                                     'end_offset': state.end_offset,
+                                     'block_digests': state.block_digests,
+                                     'settings': state.settings,
+                                     'record_cnt': state.record_cnt,
+                                     'fields': [[f_no, list(field.freq.items()), field.truncated,
+                                                 field.invalid_row_cnt]
+                                                for f_no, field in state.fields.items()]},
+                                    separators=(',', ':')).encode('utf-8'),
+                         1)
+
+
+
+def unpack_state(packed: bytes) -> Optional[ProfileState]:
+    """ Returns the unpacked state - or None if it was packed by an
+        incompatible version.
+    """
+    state = json.loads(zlib.decompress(packed).decode('utf-8'))
+    if state.get('version') != STATE_VERSION:
+        return None
+    return ProfileState(end_offset=state['end_offset'],
+                        block_digests=tuple(state['block_digests']),
+                        settings=state['settings'],
+                        record_cnt=state['record_cnt'],
+                        fields={f_no: FieldState(dict(freq), truncated, invalid_row_cnt)
+                                for f_no, freq, truncated, invalid_row_cnt in state['fields']})
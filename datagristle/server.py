@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+""" Runs gristle tools within a long-lived server process - so that many
+    small runs don't each pay for interpreter startup & imports.
+
+    The server loads the tools' modules and their dependencies once, then
+    listens on a Unix socket.  Each request is handled by a forked child
+    process, which inherits all of those warm imports.  The client passes
+    its own stdin, stdout and stderr file descriptors along with the
+    request - so the tool reads & writes them directly, exactly as if it
+    had been run by the client, and its exit code is handed back.
+
+    The client side, and the messages between the two, are within
+    server_client - which is kept small so that the client starts fast.
+
+    See the file "LICENSE" for the full license governing this code.
+    Copyright 2011-2022 Ken Farmer
+"""
+import importlib.machinery
+import importlib.util
+import logging
+import os
+from os.path import exists, join as pjoin
+import selectors
+import signal
+import socket
+import struct
+import sys
+import traceback
+from types import ModuleType
+from typing import Dict, List, Optional, Tuple
+
+from datagristle.server_client import STD_FDS, send_msg, recv_msg
+
+
+SERVED_TOOLS = ('gristle_converter', 'gristle_differ', 'gristle_dir_merger', 'gristle_freaker',
+                'gristle_profiler', 'gristle_slicer', 'gristle_sorter', 'gristle_validator',
+                'gristle_viewer')
+
+# The tools import these lazily - the server imports them up front so every request gets them warm:
+PRELOADED_MODULES = ('jsonschema', 'numpy', 'psutil', 'ruamel.yaml', 'sqlalchemy',
+                     'datagristle.file_validator', 'datagristle.metadata',
+                     'datagristle.slice_processor')
+
+class GristleServer(object):
+    """ Serves requests to run gristle tools - see the module docstring.
+
+    Args:
+        socket_path: the Unix socket to listen on
+        tools_dir: the directory holding the gristle_* scripts
+    """
+
+    def __init__(self,
+                 socket_path: str,
+                 tools_dir: str) -> None:
+
+        self.socket_path = socket_path
+        self.tools_dir = tools_dir
+        self.tools: Dict[str, ModuleType] = {}
+        self.tool_log_handlers: Dict[str, List[logging.Handler]] = {}
+        self.listener: Optional[socket.socket] = None
+        self.children: Dict[int, socket.socket] = {}  # pid: client connection
+
+
+    def load_tools(self) -> None:
+        """ Imports every served tool and the modules they'd otherwise import lazily.
+        """
+        for module_name in PRELOADED_MODULES:
+            try:
+                importlib.import_module(module_name)
+            except ImportError:
+                pass  # optional dependencies like numpy
+        for tool in SERVED_TOOLS:
+            tool_fqfn = pjoin(self.tools_dir, tool)
+            if not exists(tool_fqfn):
+                continue
+            loader = importlib.machinery.SourceFileLoader(tool, tool_fqfn)
+            spec = importlib.util.spec_from_loader(tool, loader)
+            module = importlib.util.module_from_spec(spec)  # type: ignore
+            # Any logging a tool sets up on import is set aside for just its own requests:
+            prior_handlers = list(logging.root.handlers)
+            loader.exec_module(module)
+            self.tools[tool] = module
+            self.tool_log_handlers[tool] = [handler for handler in logging.root.handlers
+                                            if handler not in prior_handlers]
+            for handler in self.tool_log_handlers[tool]:
+                logging.root.removeHandler(handler)
+
+
+    def listen(self) -> None:
+        """ Binds the socket - replacing any left behind by a server that's no longer running.
+
+        Raises:
+            OSError: if another server is already listening on the socket.
+        """
+        if exists(self.socket_path):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                try:
+                    probe.connect(self.socket_path)
+                except ConnectionRefusedError:
+                    os.remove(self.socket_path)
+                else:
+                    raise OSError(f'A server is already listening on: {self.socket_path}')
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # Requests run with the server's privileges - so only its user may connect:
+        old_umask = os.umask(0o177)
+        try:
+            self.listener.bind(self.socket_path)
+        finally:
+            os.umask(old_umask)
+        self.listener.listen(64)
+
+
+    def serve_forever(self) -> None:
+        """ Handles requests until terminated by SIGINT or SIGTERM.
+        """
+        assert self.listener
+        wakeup_read_fd, wakeup_write_fd = os.pipe()
+        os.set_blocking(wakeup_read_fd, False)
+        os.set_blocking(wakeup_write_fd, False)
+        # SIGCHLD writes to the wakeup pipe - so finished requests get reported immediately:
+        signal.set_wakeup_fd(wakeup_write_fd)
+        signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        # The tools set SIGPIPE to its default - which would kill the server when a client goes away:
+        signal.signal(signal.SIGPIPE, signal.SIG_IGN)
+
+        selector = selectors.DefaultSelector()
+        selector.register(self.listener, selectors.EVENT_READ)
+        selector.register(wakeup_read_fd, selectors.EVENT_READ)
+        try:
+            while True:
+                for key, _ in selector.select():
+                    if key.fileobj is self.listener:
+                        self._start_request(wakeup_read_fd, wakeup_write_fd)
+                    else:
+                        _drain(wakeup_read_fd)
+                self._reap_children()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            signal.set_wakeup_fd(-1)
+            selector.close()
+            self.listener.close()
+            os.remove(self.socket_path)
+            self._reap_children(block=True)
+            os.close(wakeup_read_fd)
+            os.close(wakeup_write_fd)
+
+
+    def _start_request(self,
+                       *wakeup_fds: int) -> None:
+        conn, _ = self.listener.accept()  # type: ignore
+        pid = os.fork()
+        if pid == 0:
+            returncode = 1
+            try:
+                self._reset_child_state(conn, wakeup_fds)
+                returncode = self._run_request(conn)
+            finally:
+                os._exit(returncode)
+        self.children[pid] = conn
+
+
+    def _reset_child_state(self,
+                           conn: socket.socket,
+                           wakeup_fds: Tuple[int, ...]) -> None:
+        signal.set_wakeup_fd(-1)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGPIPE, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        for wakeup_fd in wakeup_fds:
+            os.close(wakeup_fd)
+        self.listener.close()  # type: ignore
+        for other_conn in self.children.values():
+            other_conn.close()
+
+
+    def _run_request(self,
+                     conn: socket.socket) -> int:
+        """ Runs within the forked child - taking over the client's identity
+            and then running the tool's main().
+        """
+        if hasattr(socket, 'SO_PEERCRED'):
+            creds = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+            _, peer_uid, _ = struct.unpack('3i', creds)
+            if peer_uid != os.getuid():
+                return 1
+
+        request, fds = recv_msg(conn, max_fds=len(STD_FDS))
+        # The response is sent by the parent once this process exits:
+        conn.close()
+
+        # The sys std streams wrap fds 0-2, so they now read & write the client's:
+        for std_fd, fd in zip(STD_FDS, fds):
+            os.dup2(fd, std_fd)
+            os.close(fd)
+        sys.stdout.reconfigure(line_buffering=sys.stdout.isatty())  # type: ignore
+
+        tool = self.tools.get(request['tool'])
+        if tool is None:
+            print(f"Error: {request['tool']} is not served - valid tools include: "
+                  f"{', '.join(sorted(self.tools))}", file=sys.stderr)
+            return 1
+
+        os.chdir(request['cwd'])
+        os.environ.clear()
+        os.environ.update(request['env'])
+        for handler in self.tool_log_handlers[request['tool']]:
+            logging.root.addHandler(handler)
+        sys.argv = [tool.__file__] + request['args']  # type: ignore
+        try:
+            returncode = tool.main()  # type: ignore
+        except SystemExit as err:
+            returncode = err.code
+        except Exception:  # pylint: disable=broad-except
+            traceback.print_exc()
+            returncode = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+
+        if returncode is None:
+            return 0
+        if not isinstance(returncode, int):
+            print(returncode, file=sys.stderr)
+            return 1
+        return returncode & 0xFF
+
+
+    def _reap_children(self,
+                       block: bool = False) -> None:
+        """ Sends the exit codes of finished requests back to their clients.
+        """
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, 0 if block else os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            if os.WIFSIGNALED(status):
+                returncode = -os.WTERMSIG(status)
+            else:
+                returncode = os.WEXITSTATUS(status)
+            conn = self.children.pop(pid, None)
+            if conn is None:
+                continue
+            try:
+                send_msg(conn, {'returncode': returncode})
+            except OSError:
+                pass  # the client went away
+            conn.close()
+
+
+
+def _drain(fd: int) -> None:
+    try:
+        while os.read(fd, 1024):
+            pass
+    except BlockingIOError:
+        pass
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+""" The client side of gristle_server - see the server module - along with
+    the messages passed between the two.
+
+    Messages are length-prefixed json, and the client's stdin, stdout and
+    stderr file descriptors are passed with its request.  Only small
+    standard library modules are imported, so that the client starts fast.
+
+    See the file "LICENSE" for the full license governing this code.
+    Copyright 2011-2022 Ken Farmer
+"""
+import array
+import json
+import os
+from os.path import join as pjoin
+import socket
+import struct
+from typing import Any, Dict, List, Optional, Tuple
+
+
+STD_FDS = (0, 1, 2)
+MSG_LEN_FORMAT = '!I'
+MSG_LEN_BYTES = struct.calcsize(MSG_LEN_FORMAT)
+
+
+
+def get_default_socket_path() -> str:
+    """ Returns the socket path from the GRISTLE_SERVER_SOCKET envvar, or else
+        a per-user path within the runtime or temp directory.
+    """
+    if os.environ.get('GRISTLE_SERVER_SOCKET'):
+        return os.environ['GRISTLE_SERVER_SOCKET']
+    import tempfile  # pylint: disable=import-outside-toplevel
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    return pjoin(runtime_dir, f'gristle_server_{os.getuid()}.sock')
+
+
+
+def send_msg(sock: socket.socket,
+             msg: Dict[str, Any],
+             fds: Tuple[int, ...] = ()) -> None:
+    """ Sends a length-prefixed json message - along with any file descriptors.
+    """
+    body = json.dumps(msg).encode('utf-8')
+    data = struct.pack(MSG_LEN_FORMAT, len(body)) + body
+    ancillary = [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array('i', fds))] if fds else []
+    sent = sock.sendmsg([data], ancillary)
+    sock.sendall(data[sent:])
+
+
+
+def recv_msg(sock: socket.socket,
+             max_fds: int = 0) -> Tuple[Dict[str, Any], List[int]]:
+    """ Receives a message from send_msg() - and any file descriptors sent with it.
+
+    Raises:
+        ConnectionError: if the connection is closed before a whole message arrives.
+    """
+    fds = array.array('i')
+    data, ancillary, _, _ = sock.recvmsg(64 * 1024, socket.CMSG_SPACE(max_fds * fds.itemsize))
+    for level, msg_type, fd_data in ancillary:
+        if level == socket.SOL_SOCKET and msg_type == socket.SCM_RIGHTS:
+            fds.frombytes(fd_data[:len(fd_data) - (len(fd_data) % fds.itemsize)])
+    while len(data) < MSG_LEN_BYTES or len(data) < MSG_LEN_BYTES + _get_msg_len(data):
+        chunk = sock.recv(64 * 1024)
+        if not chunk:
+            raise ConnectionError('Connection closed before the message was complete')
+        data += chunk
+    body = data[MSG_LEN_BYTES:MSG_LEN_BYTES + _get_msg_len(data)]
+    return json.loads(body.decode('utf-8')), list(fds)
+
+
+
+def _get_msg_len(data: bytes) -> int:
+    return struct.unpack(MSG_LEN_FORMAT, data[:MSG_LEN_BYTES])[0]
+
+
+
+def run_client(tool: str,
+               args: List[str],
+               socket_path: Optional[str] = None) -> int:
+    """ Has the server run a tool with the client's args, current directory,
+        environment and standard file descriptors.
+
+    Returns:
+        The tool's exit code - or the negative signal number if it was
+        killed by a signal (ex: SIGPIPE).
+    Raises:
+        FileNotFoundError or ConnectionRefusedError: if no server is running.
+        ConnectionError: if the server drops the request.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path or get_default_socket_path())
+        send_msg(sock,
+                 {'tool': tool, 'args': args, 'cwd': os.getcwd(), 'env': dict(os.environ)},
+                 fds=STD_FDS)
+        response, _ = recv_msg(sock)
+    return response['returncode']
@@ -17,7 +17,6 @@
 
 from sqlalchemy import exc
 from sqlalchemy import UniqueConstraint
-from pprint import pprint as pp
 
 import logging
 
@@ -135,7 +134,7 @@ class TableTools(object):
 
         try:
             ins_sql = self._table.insert()
-            pp(ins_sql)
+            logging.debug(ins_sql)
             result = ins_sql.execute(kw_insert)
             if result.rowcount == 0:
                 raise KeyError    # by missing column
@@ -150,7 +149,7 @@ class TableTools(object):
                     kw_update[key] = kw[key]
             upd_sql = self._table.update()
             upd_sql = self._create_where(upd_sql, kw_update)
-            pp(upd_sql)
+            logging.debug(upd_sql)
             try:
                 result = upd_sql.execute(kw_update)
             except exc.IntegrityError as except_detail:
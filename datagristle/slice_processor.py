@@ -1,14 +1,11 @@
 #!/usr/bin/env python
-import csv
-import datetime as dt
 import functools
 import os
-from pprint import pprint as pp
-import tempfile
 import time
 from typing import List, Tuple, Dict, Any, Optional, IO, Hashable
 
 import datagristle.common as comm
+import datagristle.csvhelper as csvhelper
 from datagristle import file_io
 import datagristle.slice_specs as slicer
 
@@ -60,8 +57,7 @@ class SliceRunner:
         except (slicer.NegativeOffsetWithoutItemCountError,
                 slicer.NegativeStepWithoutItemCountError) as err:
             if self.are_infiles_from_stdin():
-                self._write_stdin_to_file()
-                self.nconfig, _ = self.config_manager.get_config(self.temp_fn)
+                self._spool_stdin()
             self._setup_counts()
             try:
                 self._setup_specs()
@@ -90,19 +86,27 @@ class SliceRunner:
         self._pp(f'    is_optimized_with_col_index: {self.col_index.is_valid}')
 
 
-    def _write_stdin_to_file(self):
+    def _spool_stdin(self):
+        """ Spools stdin so that it can be counted and then re-read.
+
+        Small inputs stay in memory, larger ones spill into a temp file.  Either
+        way the records are counted as they're spooled, and since the header
+        can't be read from stdin up front we also load it here from the first
+        spooled record.
+        """
         start_time = time.time()
         assert self.nconfig.infiles == ['-']
 
-        tf = tempfile.NamedTemporaryFile(prefix='gristle_slicer_stdin_temp_', delete=False)
-        self.temp_fn = tf.name
-        with open(self.temp_fn, 'w', newline='', encoding='utf-8') as outbuf:
-            writer = csv.writer(outbuf)
-            writer.writerows(self.input_handler)
-        self.input_handler = file_io.InputHandler([self.temp_fn],
-                                                  self.nconfig.dialect,
-                                                  return_header=True)
-        self._pp(f'--------> write_stdin_to_file duration: {time.time() - start_time:.2f}')
+        self.input_handler = file_io.InputSpooler(self.input_handler,
+                                                  temp_prefix='gristle_slicer_stdin_temp_')
+        self.temp_fn = self.input_handler.temp_fn
+
+        header = csvhelper.Header()
+        if self.input_handler.first_rec is not None:
+            header.load_from_rec(self.input_handler.first_rec, self.nconfig.dialect)
+        self.config_manager.update_config('header', header)
+        self.nconfig = self.config_manager.nconfig
+        self._pp(f'--------> spool_stdin duration: {time.time() - start_time:.2f}')
 
 
     def _pp(self,
@@ -133,38 +137,28 @@ class SliceRunner:
                                                   self.nconfig.dialect,
                                                   return_header=True)
         self.output_handler = file_io.OutputHandler(self.nconfig.outfile,
-                                                    self.input_handler.dialect)
-
-
-    def _get_file_info(self, filename):
-        file_timestamp = os.path.getmtime(filename)
-        file_dt = dt.datetime.fromtimestamp(file_timestamp)
-        file_size = os.path.getsize(filename)
-        return file_dt, file_size
+                                                    self.input_handler.dialect,
+                                                    buffer_size=self.nconfig.write_buffer_kbytes * 1024,
+                                                    coalesce=True)
 
 
     def _setup_counts(self) -> None:
         start_time = time.time()
         self.col_cnt = len(self.nconfig.header.field_names)
 
-        if self.temp_fn:
-            self.rec_cnt = file_io.get_rec_count([self.temp_fn], self.input_handler.dialect)
+        if self.are_infiles_from_stdin():
+            self.rec_cnt = self.input_handler.spooled_rec_cnt
         else:
             self.rec_cnt = -1
-            mod_datetime, file_size = self._get_file_info(self.nconfig.infiles[0])
             if len(self.nconfig.infiles) == 1:
-                self.rec_cnt = self.metadata.file_index_tools.get_file_index_rec_count(filename=self.nconfig.infiles[0],
-                                                                                       mod_datetime=mod_datetime,
-                                                                                       file_bytes=file_size)
+                file_facts = self.metadata.file_index_tools.get_file_facts(self.nconfig.infiles[0])
+                self.rec_cnt = file_facts.get('record_count', -1)
             if self.rec_cnt == -1:
                 self.rec_cnt = file_io.get_rec_count(self.nconfig.infiles, self.input_handler.dialect)
                 if len(self.nconfig.infiles) == 1:
-                    mod_datetime, file_size = self._get_file_info(self.nconfig.infiles[0])
-                    self.metadata.file_index_tools.set_file_index_counts(filename=self.nconfig.infiles[0],
-                                                                         mod_datetime=mod_datetime,
-                                                                         file_bytes=file_size,
-                                                                         rec_count=self.rec_cnt,
-                                                                         col_count=self.col_cnt)
+                    self.metadata.file_index_tools.set_file_facts(self.nconfig.infiles[0],
+                                                                  record_count=self.rec_cnt,
+                                                                  column_count=self.col_cnt)
 
         assert self.col_cnt > 0
         if self.nconfig.verbosity == 'debug':
@@ -225,6 +219,9 @@ class SliceRunner:
                 processor.process()
 
             else:
+                projected_cols = self.is_col_projection_possible()
+                if projected_cols:
+                    self.input_handler.set_col_projection(self.col_index.index)
                 processor = FileProcessor(self.nconfig.verbosity,
                                         self.input_handler,
                                         self.output_handler,
@@ -236,7 +233,8 @@ class SliceRunner:
                                         self.col_index,
                                         self.col_cnt,
                                         self.mem_limiter,
-                                        self.nconfig.any_order)
+                                        self.nconfig.any_order,
+                                        projected_cols=projected_cols)
                 processor.process()
         except:
             # Run shutdown just in case we've redirected stdin into a named
@@ -274,6 +272,22 @@ class SliceRunner:
                     and self.excl_rec_slicer.has_exclusions is False)
 
 
+    def is_col_projection_possible(self) -> bool:
+        """ Determines if the col index can be pushed down into the csv parser
+            so that unneeded columns are never built.
+
+        This can't be done with a col_default_range since its index gets pruned
+        based on the actual column count, nor with spooled stdin whose records
+        have already been parsed.
+        """
+        return bool(self.col_index.is_valid
+                    and not self.col_index.col_default_range
+                    and not self.is_optimized_for_all_cols()
+                    and min(self.col_index.index, default=0) >= 0
+                    and isinstance(self.input_handler, file_io.InputHandler)
+                    and self.input_handler.rec_cnt == 0)
+
+
     def are_infiles_from_stdin(self) -> bool:
         return bool(self.input_handler.files == ['-'])
 
@@ -297,7 +311,8 @@ class Processor:
                  col_index,
                  col_cnt,
                  mem_limiter,
-                 any_order):
+                 any_order,
+                 projected_cols=False):
 
         self.input_handler = input_handler
         self.output_handler = output_handler
@@ -312,6 +327,8 @@ class Processor:
         self.col_cnt = col_cnt
         self.mem_limiter = mem_limiter
         self.any_order = any_order
+        self.projected_cols = projected_cols
+        self.output_recs: List[List[str]] = []
 
 
     def is_optimized_for_all_recs(self) -> bool:
@@ -334,6 +351,32 @@ class Processor:
             print(val)
 
 
+    def read_recs(self):
+        """ Yields input records - which are read from the input_handler a batch
+            at a time to avoid its per-record overhead.
+        """
+        while True:
+            recs = self.input_handler.read_batch()
+            if not recs:
+                return
+            yield from recs
+
+
+    def write_rec(self,
+                  output_rec: List[str]) -> None:
+        """ Collects output records so that they can be written a batch at a time
+            by flush_recs().
+        """
+        self.output_recs.append(output_rec)
+        if len(self.output_recs) >= file_io.DEFAULT_BATCH_SIZE:
+            self.flush_recs()
+
+
+    def flush_recs(self) -> None:
+        self.output_handler.write_batch(self.output_recs)
+        self.output_recs = []
+
+
     def get_cols_from_index(self,
                             input_rec: List[str],
                             col_index: List[int]) -> List[str]:
@@ -399,7 +442,7 @@ class FileProcessor(Processor):
         self._pp(f'process: process_recs_from_file')
         next_index_sub = 0
 
-        for rec_number, rec in enumerate(self.input_handler):
+        for rec_number, rec in enumerate(self.read_recs()):
             if self.is_optimized_for_all_recs():
                 pass
             elif self.rec_index.is_valid and not self.any_order:
@@ -430,7 +473,7 @@ class FileProcessor(Processor):
 
             output_rec = []
 
-            if self.is_optimized_for_all_cols():
+            if self.is_optimized_for_all_cols() or self.projected_cols:
                 output_rec = rec
             elif self.col_index.is_valid:
                 output_rec = self.get_cols_from_index(rec,
@@ -444,7 +487,9 @@ class FileProcessor(Processor):
                                                      self.excl_col_slicer)
 
             if output_rec:
-                self.output_handler.write_rec(record=output_rec)
+                self.write_rec(output_rec)
+
+        self.flush_recs()
 
 
 
@@ -466,7 +511,7 @@ class MemProcessor(Processor):
         all_rows = []
 
         rec: List[str] = []
-        for rec_number, rec in enumerate(self.input_handler):
+        for rec_number, rec in enumerate(self.read_recs()):
             if rec_number > self.rec_index.stop_rec:
                 if self.are_infiles_from_stdin():
                     for _ in self.input_handler:
@@ -505,7 +550,9 @@ class MemProcessor(Processor):
             except IndexError:
                 pass
             if output_rec:
-                self.output_handler.write_rec(record=output_rec)
+                self.write_rec(output_rec)
+
+        self.flush_recs()
 
 
 
@@ -44,7 +44,6 @@
 import copy
 import functools
 import more_itertools
-from pprint import pprint as pp
 import re
 import random
 import sys
@@ -10,6 +10,7 @@
 #pylint: disable=no-self-use
 
 import csv
+import json
 import os
 from os.path import dirname
 from pprint import pprint as pp
@@ -72,6 +73,16 @@ class TestOverrideDialect(object):
         assert override_dialect.escapechar == '\\'
 
 
+class TestDialectDict(object):
+
+    def test_round_trip(self):
+        dialect = csvhelper.Dialect(delimiter='|', has_header=True, quoting=csv.QUOTE_ALL,
+                                    quotechar="'", doublequote=False, escapechar='\\')
+        dialect_dict = csvhelper.get_dialect_dict(dialect)
+        assert json.loads(json.dumps(dialect_dict)) == dialect_dict
+        assert csvhelper.get_dialect_dict(csvhelper.get_dialect_from_dict(dialect_dict)) == dialect_dict
+
+
 class TestGetDialect(object):
 
     def setup_method(self, method):
@@ -185,6 +196,18 @@ class TestHeader(object):
         assert header.get_field_position_from_any('name') == 3
 
 
+    def test_load_from_file_longer_than_sample(self, monkeypatch):
+        monkeypatch.setattr(csvhelper, 'SAMPLE_CHARS', 20)
+        dialect = csvhelper.Dialect(delimiter=',', quoting=csv.QUOTE_MINIMAL, has_header=True)
+        fqfn = os.path.join(self.temp_dir, 'long_header.csv')
+        with open(fqfn, 'w', newline='') as outbuf:
+            outbuf.write('id,"a long, long name",color\n1,foo,blue\n')
+
+        header = csvhelper.Header()
+        header.load_from_file(fqfn, dialect)
+        assert header.raw_field_names == ['id', 'a long, long name', 'color']
+
+
     def test_load_from_files(self):
         dialect = csvhelper.Dialect(delimiter='|', quoting=csv.QUOTE_ALL, has_header=True)
         fqfn1 = ttools.make_team_file(self.temp_dir, dialect, 0)
@@ -202,3 +225,43 @@ class TestHeader(object):
         assert header.get_field_position_from_any('3') == 3
         assert header.get_field_position_from_any('name') == 3
 
+
+
+
+class TestGetFileSample(object):
+
+    def setup_method(self, method):
+        self.temp_dir = tempfile.mkdtemp(prefix='gristle_test_')
+        self.fqfn = os.path.join(self.temp_dir, 'sample.csv')
+
+    def teardown_method(self, method):
+        shutil.rmtree(self.temp_dir)
+
+    def test_complete_and_partial_samples(self, monkeypatch):
+        monkeypatch.setattr(csvhelper, 'SAMPLE_CHARS', 10)
+        with open(self.fqfn, 'w', newline='') as outbuf:
+            outbuf.write('a,b\r\nc,d\r\n')
+        assert csvhelper.get_file_sample(self.fqfn) == ('a,b\r\nc,d\r\n', True)
+
+        with open(self.fqfn, 'a', newline='') as outbuf:
+            outbuf.write('e,f\r\n')
+        assert csvhelper.get_file_sample(self.fqfn) == ('a,b\r\nc,d\r\n', False)
+
+    def test_autodetect_reads_file_once(self, monkeypatch):
+        with open(self.fqfn, 'w', newline='') as outbuf:
+            outbuf.write('id,name,size\n' + ''.join(f'{x},"name {x}",{x * 3}\n' for x in range(2000)))
+        opens = []
+        real_open_text_input = csvhelper.file_compression.open_text_input
+        def open_text_input(*args, **kwargs):
+            opens.append(args[0])
+            return real_open_text_input(*args, **kwargs)
+        monkeypatch.setattr(csvhelper.file_compression, 'open_text_input', open_text_input)
+
+        dialect = csvhelper.autodetect_dialect(self.fqfn)
+        header = csvhelper.Header()
+        header.load_from_file(self.fqfn, dialect)
+
+        assert opens == [self.fqfn]
+        assert dialect.delimiter == ','
+        assert dialect.has_header
+        assert header.field_names == ['id', 'name', 'size']
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+""" See the file "LICENSE" for the full license governing this code.
+    Copyright 2022 Ken Farmer
+"""
+#adjust pylint for pytest oddities:
+#pylint: disable=missing-docstring
+#pylint: disable=unused-argument
+#pylint: disable=attribute-defined-outside-init
+#pylint: disable=protected-access
+#pylint: disable=no-self-use
+
+import csv
+import os
+from os.path import join as pjoin
+import shutil
+import tempfile
+
+from datagristle.csvhelper import Dialect
+import datagristle.delta_snapshot as mod
+
+
+
+class TestSnapshotDir(object):
+
+    def setup_method(self, method):
+        self.temp_dir = tempfile.mkdtemp(prefix='gristle_delta_snapshot_')
+        self.new_fqfn = self.write_file('new.csv', 'b,2\na,1\n')
+        self.prepared_fqfn = self.write_file('new.csv.uniq', 'a,1\nb,2\n')
+        self.settings = mod.get_settings(Dialect(delimiter=',', quoting=csv.QUOTE_NONE,
+                                                 has_header=False), [0])
+        self.snapshot_dir = mod.SnapshotDir(pjoin(self.temp_dir, 'snapshots'))
+
+    def teardown_method(self, method):
+        self.snapshot_dir.close()
+        shutil.rmtree(self.temp_dir)
+
+    def write_file(self, name, data):
+        fqfn = pjoin(self.temp_dir, name)
+        with open(fqfn, 'w') as outbuf:
+            outbuf.write(data)
+        return fqfn
+
+    def test_snapshot_of_new_file_is_used_for_it_later(self):
+        assert self.snapshot_dir.load(self.new_fqfn, self.settings) is None
+        self.snapshot_dir.save(self.new_fqfn, self.prepared_fqfn, self.settings, {1: 2})
+        assert not os.path.exists(self.prepared_fqfn)
+        with open(self.snapshot_dir.data_fqfn) as inbuf:
+            assert inbuf.read() == 'a,1\nb,2\n'
+
+        snapshot = self.snapshot_dir.load(self.new_fqfn, self.settings)
+        assert snapshot.sequence_starts == {1: 2}
+
+    def test_snapshot_is_not_used_after_changes(self):
+        self.snapshot_dir.save(self.new_fqfn, self.prepared_fqfn, self.settings, {})
+        other_settings = dict(self.settings, key_cols=[0, 1])
+        assert self.snapshot_dir.load(self.new_fqfn, other_settings) is None
+
+        self.write_file('new.csv', 'b,2\na,3\n')
+        assert self.snapshot_dir.load(self.new_fqfn, self.settings) is None
+
+    def test_prepared_new_file_is_copied(self):
+        self.snapshot_dir.save(self.new_fqfn, self.new_fqfn, self.settings, {})
+        assert os.path.exists(self.new_fqfn)
+        assert self.snapshot_dir.load(self.new_fqfn, self.settings) is not None
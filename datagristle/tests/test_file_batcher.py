@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+""" See the file "LICENSE" for the full license governing this code.
+    Copyright 2022 Ken Farmer
+"""
+#adjust pylint for pytest oddities:
+#pylint: disable=missing-docstring
+#pylint: disable=unused-argument
+#pylint: disable=attribute-defined-outside-init
+#pylint: disable=protected-access
+#pylint: disable=no-self-use
+
+import errno
+import functools
+import os
+from os.path import join as pjoin
+import shutil
+import tempfile
+
+import pytest
+
+import datagristle.configulator as conf
+import datagristle.csvhelper as csvhelper
+import datagristle.file_batcher as mod
+
+DIALECT_OPTIONS = {key: None for key in csvhelper.DIALECT_OPTIONS}
+DIALECT_DEFAULTS = {key: conf.STANDARD_CONFIGS[key]['extended_default']
+                    for key in csvhelper.DIALECT_OPTIONS}
+OUT_DIALECT_OPTIONS = {**DIALECT_OPTIONS, 'delimiter': '|'}
+
+
+
+class TestGetBatchFiles(object):
+
+    def setup_method(self, method):
+        self.temp_dir = tempfile.mkdtemp(prefix='gristle_batch_')
+        self.in_dir = pjoin(self.temp_dir, 'in')
+        self.out_dir = pjoin(self.temp_dir, 'out')
+        os.mkdir(self.in_dir)
+        os.mkdir(self.out_dir)
+        for file_name in ('b.csv', 'a.csv', '.hidden.csv'):
+            with open(pjoin(self.in_dir, file_name), 'w') as outbuf:
+                outbuf.write('a,b\n')
+        os.mkdir(pjoin(self.in_dir, 'subdir'))
+
+    def teardown_method(self, method):
+        shutil.rmtree(self.temp_dir)
+
+    def test_directories_are_expanded(self):
+        batch_files = mod.get_batch_files([self.in_dir], self.out_dir)
+        assert batch_files == [mod.BatchFile(pjoin(self.in_dir, 'a.csv'), pjoin(self.out_dir, 'a.csv')),
+                               mod.BatchFile(pjoin(self.in_dir, 'b.csv'), pjoin(self.out_dir, 'b.csv'))]
+
+    def test_out_pattern_and_err_dir(self):
+        batch_files = mod.get_batch_files([pjoin(self.in_dir, 'a.csv')], self.out_dir,
+                                          '{stem}.out{ext}', err_dir=self.temp_dir)
+        assert batch_files == [mod.BatchFile(pjoin(self.in_dir, 'a.csv'),
+                                             pjoin(self.out_dir, 'a.out.csv'),
+                                             pjoin(self.temp_dir, 'a.out.csv'))]
+
+    def test_invalid_batch_files(self):
+        with pytest.raises(ValueError):
+            mod.get_batch_files([self.in_dir], self.out_dir, '{size}.csv')
+        with pytest.raises(ValueError):
+            mod.get_batch_files([self.in_dir], self.out_dir, 'all.csv')
+        with pytest.raises(ValueError):
+            mod.get_batch_files([self.in_dir], self.in_dir)
+        with pytest.raises(ValueError):
+            mod.get_batch_files([pjoin(self.in_dir, 'subdir')], self.out_dir)
+
+
+
+class TestProcessFiles(object):
+
+    def setup_method(self, method):
+        self.temp_dir = tempfile.mkdtemp(prefix='gristle_batch_')
+        self.out_dir = pjoin(self.temp_dir, 'out')
+        os.mkdir(self.out_dir)
+        self.infiles = []
+        for file_num in range(20):
+            self.infiles.append(pjoin(self.temp_dir, f'in_{file_num}.csv'))
+            with open(self.infiles[-1], 'w') as outbuf:
+                # Every other file is tab-delimited - and gets detected separately:
+                delimiter = ',' if file_num % 2 else '\t'
+                outbuf.write(delimiter.join(['id', 'name']) + '\n')
+                for rec_num in range(file_num):
+                    outbuf.write(delimiter.join([str(rec_num), f'name{rec_num}']) + '\n')
+        self.task = functools.partial(mod.convert_file,
+                                      dialect_options=DIALECT_OPTIONS,
+                                      dialect_defaults=DIALECT_DEFAULTS,
+                                      out_dialect_options=OUT_DIALECT_OPTIONS,
+                                      buffer_size=1024)
+
+    def teardown_method(self, method):
+        shutil.rmtree(self.temp_dir)
+
+    @pytest.mark.parametrize('workers', [1, 3])
+    def test_convert_files(self, workers):
+        batch_files = mod.get_batch_files(self.infiles, self.out_dir)
+        results = list(mod.process_files(self.task, batch_files, workers))
+        assert [result.batch_file for result in results] == batch_files
+        assert [result.rec_cnt for result in results] == list(range(20))
+        with open(pjoin(self.out_dir, 'in_3.csv')) as inbuf:
+            assert inbuf.read() == 'id|name\n0|name0\n1|name1\n2|name2\n'
+        with open(pjoin(self.out_dir, 'in_4.csv')) as inbuf:
+            assert inbuf.read().startswith('id|name\n0|name0\n')
+
+    def test_failed_and_empty_files(self):
+        open(self.infiles[5], 'w').close()
+        os.remove(self.infiles[6])
+        batch_files = mod.get_batch_files(self.infiles, self.out_dir)
+        results = list(mod.process_files(self.task, batch_files, workers=2))
+        assert results[5].returncode == errno.ENODATA
+        assert results[6].returncode == 1
+        assert 'FileNotFoundError' in results[6].error
+        assert results[7].returncode == 0
+        assert mod.report_results(results, 'quiet') == 1
+        assert mod.report_results(results[:6], 'quiet') == errno.ENODATA
+        assert mod.report_results(results[:5], 'quiet') == 0
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+""" See the file "LICENSE" for the full license governing this code.
+    Copyright 2017-2022 Ken Farmer
+"""
+#adjust pylint for pytest oddities:
+#pylint: disable=missing-docstring
+#pylint: disable=unused-argument
+#pylint: disable=attribute-defined-outside-init
+#pylint: disable=protected-access
+#pylint: disable=no-self-use
+
+import csv
+import gzip
+from os.path import join as pjoin
+import shutil
+import tempfile
+
+import pytest
+
+import datagristle.file_compression as mod
+import datagristle.file_io as file_io
+from datagristle.csvhelper import Dialect
+
+COMPRESSIONS = ['gzip', 'bz2', 'xz']
+if shutil.which('zstd'):
+    COMPRESSIONS.append('zstd')
+
+
+
+class TestGetCompression(object):
+
+    def setup_method(self, method):
+        self.temp_dir = tempfile.mkdtemp(prefix='gristle_test_')
+
+    def teardown_method(self, method):
+        shutil.rmtree(self.temp_dir)
+
+    def test_from_name(self):
+        assert mod.get_compression_from_name('/tmp/foo.csv.gz') == 'gzip'
+        assert mod.get_compression_from_name('/tmp/foo.csv.BZ2') == 'bz2'
+        assert mod.get_compression_from_name('/tmp/foo.xz') == 'xz'
+        assert mod.get_compression_from_name('/tmp/foo.csv.zst') == 'zstd'
+        assert mod.get_compression_from_name('/tmp/foo.csv') is None
+
+    def test_from_magic(self):
+        fqfn = pjoin(self.temp_dir, 'no_extension')
+        with gzip.open(fqfn, 'wt') as outbuf:
+            outbuf.write('a,b\n')
+        assert mod.get_compression(fqfn) == 'gzip'
+
+        fqfn = pjoin(self.temp_dir, 'plain.csv')
+        with open(fqfn, 'w') as outbuf:
+            outbuf.write('a,b\n')
+        assert mod.get_compression(fqfn) is None
+
+
+
+class TestReadAndWrite(object):
+
+    def setup_method(self, method):
+        self.temp_dir = tempfile.mkdtemp(prefix='gristle_test_')
+        self.data = ''.join(f'{x},foo{x},"bar, {x}"\r\n' for x in range(50_000))
+
+    def teardown_method(self, method):
+        shutil.rmtree(self.temp_dir)
+
+    @pytest.mark.parametrize('compression', COMPRESSIONS)
+    def test_round_trip(self, compression):
+        fqfn = pjoin(self.temp_dir, 'data.csv')
+        with mod.open_text_output(fqfn, compression) as outbuf:
+            outbuf.write(self.data)
+        assert mod.get_compression(fqfn) == compression
+        with mod.open_text_input(fqfn) as inbuf:
+            assert inbuf.read() == self.data
+
+    def test_early_close(self):
+        fqfn = pjoin(self.temp_dir, 'data.csv.gz')
+        with mod.open_text_output(fqfn, 'gzip') as outbuf:
+            outbuf.write(self.data * 10)
+        inbuf = mod.open_text_input(fqfn)
+        assert inbuf.readline() == '0,foo0,"bar, 0"\r\n'
+        inbuf.close()
+        assert inbuf.closed
+
+    def test_corrupt_input(self):
+        fqfn = pjoin(self.temp_dir, 'data.csv.gz')
+        with open(fqfn, 'wb') as outbuf:
+            outbuf.write(gzip.compress(self.data.encode())[:-100])
+        with pytest.raises(EOFError):
+            with mod.open_text_input(fqfn) as inbuf:
+                inbuf.read()
+
+    def test_handlers(self):
+        dialect = Dialect(delimiter=',', quoting=csv.QUOTE_MINIMAL, has_header=True)
+        in_fqfn = pjoin(self.temp_dir, 'in.csv.bz2')
+        out_fqfn = pjoin(self.temp_dir, 'out.csv.xz')
+        with mod.open_text_output(in_fqfn, 'bz2') as outbuf:
+            outbuf.write('id,name\n1,foo\n2,bar\n')
+
+        input_handler = file_io.InputHandler([in_fqfn], dialect)
+        output_handler = file_io.OutputHandler(out_fqfn, dialect)
+        output_handler.write_batch(input_handler.read_batch())
+        input_handler.close()
+        output_handler.close()
+
+        assert input_handler.header == ['id', 'name']
+        with mod.open_text_input(out_fqfn) as inbuf:
+            assert inbuf.read() == '1,foo\n2,bar\n'
@@ -171,6 +171,31 @@ class TestAssignment(object):
         dass.assign('chgnew', cur_rec, old_rec, new_rec)
         assert cur_rec == ['7', 'b', '8', 'd']
 
+    def test_assign_sequence_from_known_starts(self):
+        cur_rec = ['', 'b', 'c', 'd']
+        dass = mod.DeltaAssignments()
+        dass.set_assignment('insert', 0, 'sequence', None, 'old', 0)
+
+        # The old file isn't read - since the only sequence's start is known:
+        dass.set_sequence_starts(self.dialect, pjoin(self.temp_dir, 'missing.csv'), {0: 41})
+        dass.assign('insert', cur_rec, None, ['0', 'n1', 'n2', 'n3'])
+        assert cur_rec == ['42', 'b', 'c', 'd']
+
+    def test_get_sequence_maxes(self):
+        dass = mod.DeltaAssignments()
+        dass.set_assignment('insert', 1, 'sequence', None, 'old', 1)
+        dass.set_assignment('insert', 2, 'sequence', None, 'old', 2)
+        dass.set_assignment('insert', 3, 'sequence', None, 'old', 3)
+
+        # Includes the duplicate key that deduping would drop:
+        fqfn = pjoin(self.temp_dir, 'new.csv')
+        with open(fqfn, 'w') as f:
+            f.write('a,9,x,\n')
+            f.write('b,,y,\n')
+            f.write('a,99,z,\n')
+            f.write('c,5,w,\n')
+        assert dass.get_sequence_maxes(self.dialect, fqfn) == {1: 99}
+
     def test_assign_sequences_empty_old(self):
         old_rec = None
         new_rec = ['0', 'n1', 'n2', 'n3']
@@ -509,6 +534,7 @@ class TestComparison(object):
         assert chgnew_rec_cnt == 4
 
 
+
 def create_test_file(temp_dir):
     fqfn = pjoin(temp_dir, 'foo.csv')
     with open(fqfn, 'w') as f:
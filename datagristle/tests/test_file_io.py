@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+""" See the file "LICENSE" for the full license governing this code.
+    Copyright 2017-2022 Ken Farmer
+"""
+#adjust pylint for pytest oddities:
+#pylint: disable=missing-docstring
+#pylint: disable=unused-argument
+#pylint: disable=attribute-defined-outside-init
+#pylint: disable=protected-access
+#pylint: disable=no-self-use
+
+import csv
+import io
+import os
+import random
+from os.path import exists, join as pjoin
+import shutil
+import tempfile
+
+import datagristle.file_io as mod
+from datagristle.csvhelper import Dialect
+
+
+
+class TestProjectingReader(object):
+
+    def get_recs(self, data, dialect, col_index):
+        return list(mod.ProjectingReader(io.StringIO(data, newline=''), dialect, col_index))
+
+    def test_unquoted(self):
+        dialect = Dialect(delimiter='|', quoting=csv.QUOTE_NONE, has_header=False)
+        data = 'a0|a1|a2|a3\nb0|"b1"|b2|b3\n\nc0|c1\n'
+        assert self.get_recs(data, dialect, [2, 0]) == [['a2', 'a0'], ['b2', 'b0'], [], ['c0']]
+        assert self.get_recs(data, dialect, [1]) == [['a1'], ['"b1"'], [], ['c1']]
+
+    def test_quoted_fields_use_csv_reader(self):
+        dialect = Dialect(delimiter=',', quoting=csv.QUOTE_MINIMAL, has_header=False)
+        data = 'a0,a1,a2\r\nb0,"b,1","b\n2"\r\nc0,c1,c2\r\n'
+        assert self.get_recs(data, dialect, [2, 1]) == [['a2', 'a1'], ['b\n2', 'b,1'], ['c2', 'c1']]
+
+    def test_escapechar(self):
+        dialect = Dialect(delimiter=',', quoting=csv.QUOTE_NONE, escapechar='\\',
+                          doublequote=False, has_header=False)
+        data = 'a0,a\\,1,a2\nb0,b1,b2\n'
+        assert self.get_recs(data, dialect, [1, 2]) == [['a,1', 'a2'], ['b1', 'b2']]
+
+    def test_input_handler_projection(self):
+        temp_dir = tempfile.mkdtemp(prefix='gristle_test_')
+        try:
+            fqfn = pjoin(temp_dir, 'in.csv')
+            with open(fqfn, 'w', newline='') as outbuf:
+                outbuf.write('id,name,size\n1,foo,9\n2,bar,8\n')
+            dialect = Dialect(delimiter=',', quoting=csv.QUOTE_NONE, has_header=True)
+            input_handler = mod.InputHandler([fqfn], dialect, col_index=[2, 0])
+            assert input_handler.header == ['size', 'id']
+            assert list(input_handler) == [['9', '1'], ['8', '2']]
+
+            input_handler = mod.InputHandler([fqfn], dialect, return_header=True)
+            input_handler.set_col_projection([1])
+            assert list(input_handler) == [['name'], ['foo'], ['bar']]
+        finally:
+            shutil.rmtree(temp_dir)
+
+
+
+class TestInputSpooler(object):
+
+    def setup_method(self, method):
+        self.temp_dir = tempfile.mkdtemp(prefix='gristle_test_')
+        self.dialect = Dialect(delimiter='|', quoting=csv.QUOTE_NONE, has_header=True)
+        self.recs = [['id', 'name']] + [[str(x), f'name "{x}", etc'] for x in range(100)]
+        self.fqfn = pjoin(self.temp_dir, 'in.csv')
+        with open(self.fqfn, 'w', newline='') as outbuf:
+            for rec in self.recs:
+                outbuf.write('|'.join(rec) + '\n')
+
+    def teardown_method(self, method):
+        shutil.rmtree(self.temp_dir)
+
+    def get_spooler(self, max_mem_bytes):
+        input_handler = mod.InputHandler([self.fqfn], self.dialect, return_header=True)
+        return mod.InputSpooler(input_handler,
+                                max_mem_bytes=max_mem_bytes,
+                                temp_prefix='gristle_test_spool_')
+
+    def test_small_input_stays_in_memory(self):
+        spooler = self.get_spooler(max_mem_bytes=1_000_000)
+        assert spooler.temp_fn is None
+        assert spooler.spooled_rec_cnt == 101
+        assert spooler.first_rec == ['id', 'name']
+        assert list(spooler) == self.recs
+        assert spooler.rec_cnt == 101
+        assert spooler.eof
+
+    def test_large_input_spills_to_disk(self):
+        spooler = self.get_spooler(max_mem_bytes=1_000)
+        try:
+            assert spooler.temp_fn is not None
+            assert spooler.mem_recs == []
+            assert spooler.spooled_rec_cnt == 101
+            assert spooler.first_rec == ['id', 'name']
+            assert list(spooler) == self.recs
+        finally:
+            spooler.close()
+            os.remove(spooler.temp_fn)
+
+    def test_reset(self):
+        spooler = self.get_spooler(max_mem_bytes=1_000)
+        try:
+            assert next(spooler) == ['id', 'name']
+            spooler.reset()
+            assert list(spooler) == self.recs
+        finally:
+            spooler.close()
+            os.remove(spooler.temp_fn)
+        assert not exists(spooler.temp_fn)
+
+
+
+class TestBatches(object):
+
+    def setup_method(self, method):
+        self.temp_dir = tempfile.mkdtemp(prefix='gristle_test_')
+        self.dialect = Dialect(delimiter=',', quoting=csv.QUOTE_MINIMAL, has_header=True)
+        self.fqfn1 = pjoin(self.temp_dir, 'in1.csv')
+        self.fqfn2 = pjoin(self.temp_dir, 'in2.csv')
+        with open(self.fqfn1, 'w', newline='') as outbuf:
+            outbuf.write('id,name\n' + ''.join(f'{x},foo\n' for x in range(5)))
+        with open(self.fqfn2, 'w', newline='') as outbuf:
+            outbuf.write('id,name\n' + ''.join(f'{x},bar\n' for x in range(3)))
+
+    def teardown_method(self, method):
+        shutil.rmtree(self.temp_dir)
+
+    def test_read_batch_does_not_span_files(self):
+        input_handler = mod.InputHandler([self.fqfn1], self.dialect)
+        assert input_handler.read_batch(2) == [['0', 'foo'], ['1', 'foo']]
+        assert input_handler.read_batch(2) == [['2', 'foo'], ['3', 'foo']]
+        assert input_handler.read_batch(2) == [['4', 'foo']]
+        assert input_handler.read_batch(2) == []
+        assert input_handler.rec_cnt == 5
+        assert input_handler.header == ['id', 'name']
+        assert input_handler.eof
+
+    def test_read_batch_from_multiple_files(self):
+        input_handler = mod.InputHandler([self.fqfn2, self.fqfn1], self.dialect)
+        batches = []
+        while True:
+            batch = input_handler.read_batch(4)
+            if not batch:
+                break
+            batches.append(len(batch))
+        assert batches == [4, 1, 3]
+        assert input_handler.rec_cnt == 8
+        assert input_handler.curr_file_rec_cnt == 3
+
+    def test_write_batch(self):
+        out_fqfn = pjoin(self.temp_dir, 'out.csv')
+        output_handler = mod.OutputHandler(out_fqfn, self.dialect)
+        output_handler.write_batch([['a', 'b,c'], ['d', 'e']])
+        output_handler.write_batch([])
+        output_handler.close()
+        assert output_handler.rec_cnt == 2
+        with open(out_fqfn, newline='') as inbuf:
+            assert inbuf.read() == 'a,"b,c"\nd,e\n'
+
+    def test_write_batch_dry_run(self):
+        out_fqfn = pjoin(self.temp_dir, 'out.csv')
+        output_handler = mod.OutputHandler(out_fqfn, self.dialect, dry_run=True)
+        output_handler.write_batch([['a', 'b'], ['d', 'e']])
+        output_handler.close()
+        assert output_handler.rec_cnt == 0
+        assert os.path.getsize(out_fqfn) == 0
+
+
+
+class TestOutputBuffering(object):
+
+    def setup_method(self, method):
+        self.temp_dir = tempfile.mkdtemp(prefix='gristle_test_')
+        self.dialect = Dialect(delimiter=',', quoting=csv.QUOTE_NONE, has_header=False)
+        self.out_fqfn = pjoin(self.temp_dir, 'out.csv')
+
+    def teardown_method(self, method):
+        shutil.rmtree(self.temp_dir)
+
+    def get_file_contents(self):
+        with open(self.out_fqfn, newline='') as inbuf:
+            return inbuf.read()
+
+    def test_coalesce_holds_rows_until_threshold(self):
+        output_handler = mod.OutputHandler(self.out_fqfn, self.dialect,
+                                           buffer_size=10, coalesce=True)
+        output_handler.write_rec(['a', 'b'])
+        assert output_handler.outbuf.getvalue() == 'a,b\n'
+        output_handler.write_batch([['c', 'd'], ['e', 'f']])
+        assert output_handler.outbuf.getvalue() == ''
+        output_handler.write_rec(['g', 'h'])
+        output_handler.close()
+        assert output_handler.rec_cnt == 4
+        assert self.get_file_contents() == 'a,b\nc,d\ne,f\ng,h\n'
+
+    def test_flush(self):
+        output_handler = mod.OutputHandler(self.out_fqfn, self.dialect, coalesce=True)
+        output_handler.write_rec(['a', 'b'])
+        assert self.get_file_contents() == ''
+        output_handler.flush()
+        assert self.get_file_contents() == 'a,b\n'
+        output_handler.close()
+
+    def test_no_coalesce_or_buffering(self):
+        output_handler = mod.OutputHandler(self.out_fqfn, self.dialect, buffer_size=0)
+        assert output_handler.outbuf is output_handler.outfile
+        output_handler.write_batch([['a', 'b']])
+        output_handler.close()
+        assert self.get_file_contents() == 'a,b\n'
+
+
+
+class TestGetSampledRecs(object):
+
+    def setup_method(self, method):
+        self.temp_dir = tempfile.mkdtemp(prefix='gristle_test_')
+        self.dialect = Dialect(delimiter=',', quoting=csv.QUOTE_NONE, has_header=True)
+        self.fqfn = pjoin(self.temp_dir, 'in.csv')
+        with open(self.fqfn, 'w', newline='') as outbuf:
+            outbuf.write('id,name\n' + ''.join(f'{x},name{x}\n' for x in range(10_000)))
+
+    def teardown_method(self, method):
+        shutil.rmtree(self.temp_dir)
+
+    def test_only_whole_records(self):
+        recs = mod.get_sampled_recs(self.fqfn, self.dialect, block_cnt=5, block_bytes=1000)
+        assert recs[0] == ['0', 'name0']
+        assert len(recs) > 250
+        for rec in recs:
+            assert rec == [rec[0], f'name{rec[0]}']
+
+    def test_more_blocks_than_file(self):
+        recs = mod.get_sampled_recs(self.fqfn, self.dialect, block_cnt=1000, block_bytes=1_000_000)
+        assert len(recs) == 10_000
+
+
+
+class TestBytesConverter(object):
+
+    def setup_method(self, method):
+        self.temp_dir = tempfile.mkdtemp(prefix='gristle_bytes_')
+        self.in_fqfn = pjoin(self.temp_dir, 'in.csv')
+
+    def teardown_method(self, method):
+        shutil.rmtree(self.temp_dir)
+
+    def convert(self, data, dialect, out_dialect, buffer_size):
+        with open(self.in_fqfn, 'w', newline='') as outbuf:
+            outbuf.write(data)
+
+        bytes_fqfn = pjoin(self.temp_dir, 'bytes.csv')
+        bytes_converter = mod.get_bytes_converter([self.in_fqfn], bytes_fqfn, dialect, out_dialect)
+        assert bytes_converter
+        bytes_rec_cnt = bytes_converter.convert(self.in_fqfn, bytes_fqfn, buffer_size)
+
+        recs_fqfn = pjoin(self.temp_dir, 'recs.csv')
+        input_handler = mod.InputHandler([self.in_fqfn], dialect)
+        output_handler = mod.OutputHandler(recs_fqfn, out_dialect)
+        mod.copy_recs(input_handler, output_handler)
+        input_handler.close()
+        output_handler.close()
+
+        with open(bytes_fqfn, newline='') as bytes_buf, open(recs_fqfn, newline='') as recs_buf:
+            assert bytes_buf.read() == recs_buf.read(), repr(data)
+        assert bytes_rec_cnt == input_handler.rec_cnt
+
+    def test_matches_copy_recs(self):
+        lines = ['a,b,c', 'ab,,cd', '', 'x|y', 'é,ü', ' a, b']
+        special_lines = ['"q",b', 'a\\,b', 'a"b']
+        random.seed(7)
+        for _ in range(200):
+            line_cnt = random.randint(1, 8)
+            data_lines = random.choices(lines + (special_lines if random.random() < 0.3 else []),
+                                        k=line_cnt)
+            data = ''.join(line + random.choice(['\n', '\r\n', '\r']) for line in data_lines)
+            if random.random() < 0.3:
+                data = data.rstrip('\r\n')
+            if not data:
+                continue
+            dialect = Dialect(delimiter=',', has_header=random.choice([True, False]),
+                              quoting=random.choice([csv.QUOTE_NONE, csv.QUOTE_MINIMAL]),
+                              escapechar=random.choice([None, '\\']))
+            out_dialect = Dialect(delimiter=random.choice([',', '|', '\t']),
+                                  has_header=random.choice([True, False]),
+                                  quoting=random.choice([csv.QUOTE_NONE, csv.QUOTE_MINIMAL]),
+                                  escapechar=random.choice([None, '\\']))
+            try:
+                self.convert(data, dialect, out_dialect, buffer_size=random.choice([4, 9, 1024]))
+            except csv.Error:
+                pass  # both raise the same errors - ex: need to escape
+
+    def test_unterminated_quote_at_end(self):
+        dialect = Dialect(delimiter=',', has_header=False, quoting=csv.QUOTE_MINIMAL)
+        out_dialect = Dialect(delimiter='|', has_header=False, quoting=csv.QUOTE_MINIMAL)
+        for buffer_size in (4, 1024):
+            self.convert('a,b\nc,"d', dialect, out_dialect, buffer_size)
+        with open(pjoin(self.temp_dir, 'bytes.csv'), newline='') as inbuf:
+            assert inbuf.read() == 'a|b\nc|d\n'
+
+    def test_plan(self):
+        dialect = Dialect(delimiter=',', has_header=False, quoting=csv.QUOTE_NONE)
+        out_dialect = Dialect(delimiter='|', has_header=False, quoting=csv.QUOTE_NONE)
+        quoted_dialect = Dialect(delimiter='|', has_header=False, quoting=csv.QUOTE_ALL)
+        with open(self.in_fqfn, 'w') as outbuf:
+            outbuf.write('a,b\n')
+        assert mod.get_bytes_converter([self.in_fqfn], '-', dialect, out_dialect)
+        assert not mod.get_bytes_converter([self.in_fqfn], '-', dialect, quoted_dialect)
+        assert not mod.get_bytes_converter([self.in_fqfn, self.in_fqfn], '-', dialect, out_dialect)
+        assert not mod.get_bytes_converter(['-'], '-', dialect, out_dialect)
+        assert not mod.get_bytes_converter([self.in_fqfn], 'out.csv.gz', dialect, out_dialect)
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+""" See the file "LICENSE" for the full license governing this code.
+    Copyright 2017-2022 Ken Farmer
+"""
+#adjust pylint for pytest oddities:
+#pylint: disable=missing-docstring
+#pylint: disable=unused-argument
+#pylint: disable=attribute-defined-outside-init
+#pylint: disable=protected-access
+#pylint: disable=no-self-use
+
+import csv
+import itertools
+from os.path import join as pjoin
+import shutil
+import tempfile
+
+import jsonschema
+import pytest
+
+import datagristle.csvhelper as csvhelper
+import datagristle.file_io as file_io
+import datagristle.file_validator as mod
+
+SCHEMA = {'items': [{'title': 'id', 'type': 'number', 'minimum': 1, 'maximum': 1000},
+                    {'title': 'name', 'type': 'string', 'minLength': 2, 'maxLength': 5,
+                     'pattern': '^[a-z]'},
+                    {'title': 'color', 'enum': ['red', 'blue', '1']},
+                    {'title': 'size', 'type': 'number', 'enum': [1, 2.5, 'big']},
+                    {'title': 'notes', 'minimum': 5, 'maxLength': 3},
+                    {'title': 'flag', 'type': 'boolean'}]}
+
+FIELD_VALUES = [['1', '0', '1000', '1000.5', ' 7 ', 'nan', 'inf', '1_000', 'x', ''],
+                ['ab', 'abcde', 'a', 'abcdef', 'Ab', '1b', ''],
+                ['red', 'blue', '1', 'green', ''],
+                ['1', '1.0', '2.5', 'big', '3', 'x'],
+                ['', 'abc', 'abcd', '9'],
+                ['true', '']]
+
+
+
+class TestCompiledSchema(object):
+
+    def setup_method(self, method):
+        self.compiled_schema = mod.CompiledSchema(SCHEMA)
+        self.validator = jsonschema.Draft7Validator(SCHEMA)
+
+    def is_valid_per_jsonschema(self, record, schema=SCHEMA):
+        typed_record = mod.RecValidator.fix_types(record, schema)
+        return not list(jsonschema.Draft7Validator(schema).iter_errors(typed_record))
+
+    def test_each_column_matches_jsonschema(self):
+        for col_num, values in enumerate(FIELD_VALUES):
+            schema = {'items': [SCHEMA['items'][col_num]]}
+            compiled_schema = mod.CompiledSchema(schema)
+            for value in values:
+                assert compiled_schema.is_valid([value]) == self.is_valid_per_jsonschema([value], schema), \
+                       f'col {col_num}: {value!r}'
+
+    def test_records_match_jsonschema(self):
+        for record in itertools.islice(itertools.product(*FIELD_VALUES[:5]), 0, None, 7):
+            record = list(record)
+            assert self.compiled_schema.is_valid(record) == self.is_valid_per_jsonschema(record)
+
+    def test_short_and_long_records(self):
+        assert self.compiled_schema.is_valid(['5', 'abc'])
+        assert not self.compiled_schema.is_valid(['5', 'abc', 'red', '1', '', 'true', 'extra'])
+
+    def test_columns_match_records(self):
+        recs = [list(rec) for rec in itertools.product(*FIELD_VALUES)]
+        expected = {position for position, rec in enumerate(recs)
+                    if not self.compiled_schema.is_valid(rec)}
+        assert self.compiled_schema.get_invalid_positions(recs) == expected
+
+    def test_columns_without_numpy(self, monkeypatch):
+        monkeypatch.setattr(mod, 'get_numpy', lambda: None)
+        self.compiled_schema = mod.CompiledSchema(SCHEMA)
+        self.test_columns_match_records()
+
+    def test_uncompilable_enum(self):
+        with pytest.raises(ValueError):
+            mod.CompiledSchema({'items': [{'type': 'number', 'enum': [True, 2]}]})
+
+
+
+class TestRecValidator(object):
+
+    def setup_method(self, method):
+        header = csvhelper.Header()
+        header.load_from_list(['id', 'name', 'color', 'size', 'notes', 'flag'])
+        self.rec_validator = mod.RecValidator(header, valid_field_cnt=6, rec_schema=SCHEMA)
+
+    def test_boolean_is_never_valid(self):
+        self.rec_validator.run_all_checks(['5', 'abc', 'red', '2.5', '', ''])
+        # flag is a boolean - which can never be valid
+        assert self.rec_validator.rec_error_count == 1
+        assert self.rec_validator.get_error_validator() == 'type'
+        assert self.rec_validator.get_error_column() == '5'
+
+    def test_detailed_errors(self):
+        self.rec_validator.run_all_checks(['0', 'Abcdefg', 'red', '2.5', '', ''])
+        assert self.rec_validator.rec_error_count == 4
+        assert [err['error.validator'] for err in self.rec_validator.rec_errors] \
+               == ['minimum', 'maxLength', 'pattern', 'type']
+
+
+
+class TestRecordProcessor(object):
+
+    def setup_method(self, method):
+        self.temp_dir = tempfile.mkdtemp(prefix='gristle_test_')
+        self.dialect = csvhelper.Dialect(delimiter=',', quoting=csv.QUOTE_NONE, has_header=True)
+        self.in_fqfn = pjoin(self.temp_dir, 'in.csv')
+        with open(self.in_fqfn, 'w') as outbuf:
+            outbuf.write('id,name\n')
+            for rec_num in range(5000):
+                if rec_num % 97 == 0:
+                    outbuf.write(f'{rec_num}\n')
+                else:
+                    outbuf.write(f'{rec_num},{"Name" if rec_num % 13 == 0 else "name"}{rec_num}\n')
+        self.schema = {'items': [{'type': 'number', 'maximum': 4000},
+                                 {'type': 'string', 'pattern': '^n'}]}
+
+    def teardown_method(self, method):
+        shutil.rmtree(self.temp_dir)
+
+    def get_processor(self, workers=1, columnar=False, max_errors=None):
+        self.input_handler = file_io.InputHandler([self.in_fqfn], self.dialect)
+        self.outfile_handler = file_io.OutputHandler(pjoin(self.temp_dir, 'valid.csv'), self.dialect)
+        self.outerr_handler = file_io.OutputHandler(pjoin(self.temp_dir, 'invalid.csv'), self.dialect)
+        header = csvhelper.Header()
+        header.load_from_list(self.input_handler.header)
+        rec_validator = mod.RecValidator(header, rec_schema=self.schema, columnar=columnar)
+        return mod.RecordProcessor(self.input_handler, self.outfile_handler, self.outerr_handler,
+                                   rec_validator, err_out_fields=False, err_out_text=False,
+                                   verbosity='normal', workers=workers, max_errors=max_errors)
+
+    @pytest.mark.parametrize('workers', [1, 2])
+    def test_max_errors(self, workers):
+        processor = self.get_processor(workers=workers, max_errors=3)
+        processor.process_recs()
+        self.outfile_handler.close()
+        self.outerr_handler.close()
+        assert processor.invalid_rec_cnt == 3
+        assert processor.valid_rec_cnt == 25  # the header and 24 recs up to the 3rd error at 26
+        with open(pjoin(self.temp_dir, 'invalid.csv')) as inbuf:
+            assert inbuf.read() == '0\n13,Name13\n26,Name26\n'
+
+    def test_quick_check(self):
+        processor = self.get_processor()
+        assert not processor.quick_check(block_cnt=1)
+        assert processor.invalid_rec_cnt > 0
+
+        self.schema = {'items': [{'type': 'number'}, {'type': 'string'}]}
+        with open(self.in_fqfn, 'w') as outbuf:
+            outbuf.write('id,name\n' + ''.join(f'{x},name{x}\n' for x in range(100_000)))
+        processor = self.get_processor()
+        assert processor.quick_check(block_cnt=3)
+        assert processor.invalid_rec_cnt == 0
+        assert processor.valid_rec_cnt == 0
+
+    def run_processor(self, workers, columnar=False):
+        input_handler = file_io.InputHandler([self.in_fqfn], self.dialect)
+        outfile_handler = file_io.OutputHandler(pjoin(self.temp_dir, f'valid_{workers}.csv'), self.dialect)
+        outerr_handler = file_io.OutputHandler(pjoin(self.temp_dir, f'invalid_{workers}.csv'), self.dialect)
+        header = csvhelper.Header()
+        header.load_from_list(input_handler.header)
+        rec_validator = mod.RecValidator(header, rec_schema=self.schema, columnar=columnar)
+        processor = mod.RecordProcessor(input_handler, outfile_handler, outerr_handler,
+                                        rec_validator, err_out_fields=True, err_out_text=True,
+                                        verbosity='normal', workers=workers)
+        processor.process_recs()
+        input_handler.close()
+        outfile_handler.close()
+        outerr_handler.close()
+        with open(pjoin(self.temp_dir, f'valid_{workers}.csv')) as valid_buf, \
+             open(pjoin(self.temp_dir, f'invalid_{workers}.csv')) as invalid_buf:
+            return (processor.valid_rec_cnt, processor.invalid_rec_cnt, processor.invalid_field_cnt,
+                    valid_buf.read(), invalid_buf.read())
+
+    def test_workers_match_serial(self):
+        serial_results = self.run_processor(workers=1)
+        assert serial_results[:2] == (3656, 1345)  # includes the header
+        assert self.run_processor(workers=3) == serial_results
+
+    def test_columnar_matches_serial(self):
+        serial_results = self.run_processor(workers=1)
+        assert self.run_processor(workers=1, columnar=True) == serial_results
+        assert self.run_processor(workers=2, columnar=True) == serial_results
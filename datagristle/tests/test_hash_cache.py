@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+""" See the file "LICENSE" for the full license governing this code.
+    Copyright 2022 Ken Farmer
+"""
+#adjust pylint for pytest oddities:
+#pylint: disable=missing-docstring
+#pylint: disable=unused-argument
+#pylint: disable=attribute-defined-outside-init
+#pylint: disable=protected-access
+#pylint: disable=no-self-use
+
+import hashlib
+import os
+from os.path import join as pjoin
+import shutil
+import tempfile
+import time
+
+import datagristle.hash_cache as mod
+
+
+
+class TestHashCache(object):
+
+    def setup_method(self, method):
+        self.temp_dir = tempfile.mkdtemp(prefix='gristle_hash_cache_')
+        self.fqfn = pjoin(self.temp_dir, 'data.bin')
+        self.write_file(b'\x00\xffabc' * 1000)
+        self.hash_cache = mod.HashCache(self.temp_dir)
+
+    def teardown_method(self, method):
+        self.hash_cache.close()
+        shutil.rmtree(self.temp_dir)
+
+    def write_file(self, data, mtime=None):
+        with open(self.fqfn, 'wb') as outbuf:
+            outbuf.write(data)
+        if mtime:
+            os.utime(self.fqfn, (mtime, mtime))
+
+    def test_get_file_digest(self):
+        assert mod.get_file_digest(self.fqfn) == hashlib.blake2b(b'\x00\xffabc' * 1000).hexdigest()
+        self.write_file(b'')
+        assert mod.get_file_digest(self.fqfn) == hashlib.blake2b(b'').hexdigest()
+
+    def test_unchanged_file_is_cached(self):
+        assert self.hash_cache.get_cached_digest(self.fqfn) is None
+        digest = self.hash_cache.get_digest(self.fqfn)
+        assert self.hash_cache.miss_cnt == 1
+        assert self.hash_cache.get_cached_digest(self.fqfn) == digest
+        assert self.hash_cache.get_digest(self.fqfn) == digest
+        assert self.hash_cache.hit_cnt == 2
+        assert self.hash_cache.miss_cnt == 1
+
+    def test_cache_persists(self):
+        digest = self.hash_cache.get_digest(self.fqfn)
+        self.hash_cache.close()
+        self.hash_cache = mod.HashCache(self.temp_dir)
+        assert self.hash_cache.get_cached_digest(self.fqfn) == digest
+
+    def test_changed_file_is_read_again(self):
+        self.write_file(b'abc', mtime=1000000000)
+        old_digest = self.hash_cache.get_digest(self.fqfn)
+        # Same size, new mtime:
+        self.write_file(b'xyz', mtime=1000000001)
+        assert self.hash_cache.get_cached_digest(self.fqfn) is None
+        assert self.hash_cache.get_digest(self.fqfn) != old_digest
+        # Only the current version of a file is kept:
+        assert self.hash_cache.connect.execute('SELECT COUNT(*) FROM file_digest').fetchone()[0] == 1
+
+    def test_prune(self):
+        self.hash_cache.get_digest(self.fqfn)
+        self.hash_cache.connect.execute('UPDATE file_digest SET last_used_epoch = ?',
+                                        (time.time() - mod.MAX_UNUSED_SECONDS - 1,))
+        assert self.hash_cache.prune() == 1
+        assert self.hash_cache.get_cached_digest(self.fqfn) is None
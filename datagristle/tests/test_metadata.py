@@ -10,6 +10,7 @@
 #pylint: disable=no-self-use
 
 import tempfile
+import time
 import os
 from os.path import join as pjoin, exists
 from pprint import pprint as pp
@@ -29,6 +30,7 @@ class TestSchema(object):
         self.schema_id, self.collection_id = create_basic_metadata(self.md)
 
     def teardown_method(self, method):
+        self.md.close()
         os.remove(os.path.join(self.tempdir, 'metadata.db'))
         os.rmdir(self.tempdir)
         if exists(pjoin('/tmp', 'datagristle_metadata.log')):
@@ -114,6 +116,7 @@ class TestCollection(object):
         self.schema_id, self.collection_id = create_basic_metadata(self.md)
 
     def teardown_method(self, method):
+        self.md.close()
         os.remove(os.path.join(self.tempdir, 'metadata.db'))
         os.rmdir(self.tempdir)
         if exists(pjoin('/tmp', 'datagristle_metadata.log')):
@@ -225,6 +228,7 @@ class TestField(object):
         self.schema_id, self.collection_id = create_basic_metadata(self.md)
 
     def teardown_method(self, method):
+        self.md.close()
         os.remove(os.path.join(self.tempdir, 'metadata.db'))
         os.rmdir(self.tempdir)
         if exists(pjoin('/tmp', 'datagristle_metadata.log')):
@@ -275,6 +279,7 @@ class TestElement(object):
         create_basic_metadata(self.md)
 
     def teardown_method(self, method):
+        self.md.close()
         os.remove(os.path.join(self.tempdir, 'metadata.db'))
         os.rmdir(self.tempdir)
         if exists(pjoin('/tmp', 'datagristle_metadata.log')):
@@ -309,6 +314,7 @@ class TestReports(object):
         create_basic_metadata(self.md)
 
     def teardown_method(self, method):
+        self.md.close()
         os.remove(os.path.join(self.tempdir, 'metadata.db'))
         os.rmdir(self.tempdir)
         if exists(pjoin('/tmp', 'datagristle_metadata.log')):
@@ -323,6 +329,181 @@ class TestReports(object):
             assert row.collection_name == 'geolite_country'
 
 
+class TestWriteAnalysis(object):
+
+    def setup_method(self, method):
+        self.tempdir = tempfile.mkdtemp()
+        self.md = mod.GristleMetaData(self.tempdir)
+        self.schema_id, self.collection_id = create_basic_metadata(self.md)
+        instance_id = self.md.instance_tools.get_instance_id(self.schema_id)
+        analysis_profile_id = self.md.analysis_profile_tools.get_analysis_profile_id(instance_id,
+                                                                                     self.collection_id)
+        self.analysis_id = self.md.analysis_tools.setter(instance_id=instance_id,
+                                                         analysis_profile_id=analysis_profile_id,
+                                                         analysis_tool='gristle_profiler')
+        self.collection_analysis = {'ca_name': 'unknown', 'ca_location': '/tmp/foo.csv',
+                                    'ca_row_cnt': 3, 'ca_field_cnt': 1000}
+
+    def teardown_method(self, method):
+        self.md.close()
+        os.remove(os.path.join(self.tempdir, 'metadata.db'))
+        os.rmdir(self.tempdir)
+        if exists(pjoin('/tmp', 'datagristle_metadata.log')):
+            os.remove(pjoin('/tmp', 'datagristle_metadata.log'))
+
+    def get_field_analyses(self, top_value):
+        return [{'field_order': sub,
+                 'field_name': 'dup' if sub in (5, 6) else f'col{sub}',
+                 'field_type': 'int',
+                 'field_len': None,
+                 'fa_type': 'integer',
+                 'fa_unique_cnt': 2,
+                 'fa_min': '1',
+                 'fa_max': '9',
+                 'top_values': [(top_value, 2), ('9', 1)]}
+                for sub in range(1000)]
+
+    def query(self, sql):
+        return self.md.engine.execute(sql).fetchall()
+
+    def test_write_analysis(self):
+        ca_id = self.md.write_analysis(self.analysis_id, self.collection_id, self.collection_analysis)
+        assert self.query('SELECT ca_id, ca_field_cnt FROM collection_analysis') == [(ca_id, 1000)]
+
+        assert self.md.write_analysis(self.analysis_id, self.collection_id, self.collection_analysis,
+                                      self.get_field_analyses('1')) == ca_id
+        assert self.query('SELECT COUNT(*) FROM collection_analysis') == [(1,)]
+        assert self.query('SELECT COUNT(*) FROM field WHERE field_order IS NOT NULL') == [(1000,)]
+        assert self.query('SELECT field_name FROM field WHERE field_order IN (5, 6)') == [('dup',), ('field6',)]
+        assert self.query('SELECT COUNT(*), MIN(fa_max) FROM field_analysis') == [(1000, '9')]
+        assert self.query('SELECT COUNT(*), SUM(fad_value_cnt) FROM field_analysis_dist') == [(1000, 2000)]
+
+        # Rewriting the analysis updates rather than duplicates it:
+        self.md.write_analysis(self.analysis_id, self.collection_id, self.collection_analysis,
+                               self.get_field_analyses('2'))
+        assert self.query('SELECT COUNT(*) FROM field WHERE field_order IS NOT NULL') == [(1000,)]
+        assert self.query('SELECT COUNT(*) FROM field_analysis') == [(1000,)]
+        assert self.query('SELECT COUNT(*) FROM field_analysis_dist') == [(1000,)]
+        packed = self.query('SELECT fad_values FROM field_analysis_dist LIMIT 1')[0][0]
+        assert mod.unpack_value_dist(packed) == [('2', 2), ('9', 1)]
+        assert mod.unpack_value_dist(packed, limit=1) == [('2', 2)]
+
+    def test_write_analysis_after_inserted_column(self):
+        def write_fields(field_names):
+            self.md.write_analysis(self.analysis_id, self.collection_id, self.collection_analysis,
+                                   [{'field_order': field_order, 'field_name': field_name,
+                                     'field_type': 'int', 'field_len': None, 'fa_max': field_name}
+                                    for field_order, field_name in enumerate(field_names)])
+
+        write_fields(['a', 'b'])
+        a_b_ids = self.query("SELECT field_id FROM field WHERE field_name IN ('a', 'b') ORDER BY field_name")
+        write_fields(['c', 'a', 'b'])
+        assert self.query("SELECT field_order, field_name FROM field WHERE field_order IS NOT NULL "
+                          "ORDER BY field_order") == [(0, 'c'), (1, 'a'), (2, 'b')]
+        assert self.query("SELECT field_id FROM field WHERE field_name IN ('a', 'b') "
+                          "ORDER BY field_name") == a_b_ids
+        assert self.query("SELECT f.field_name, fa.fa_max FROM field_analysis fa "
+                          "INNER JOIN field f ON fa.field_id = f.field_id "
+                          "ORDER BY f.field_order") == [('c', 'c'), ('a', 'a'), ('b', 'b')]
+
+    def test_write_analysis_is_atomic(self):
+        field_analyses = self.get_field_analyses('1')
+        field_analyses[-1]['fa_case'] = 'invalid'
+        with pytest.raises(exc.IntegrityError):
+            self.md.write_analysis(self.analysis_id, self.collection_id, self.collection_analysis,
+                                   field_analyses)
+        assert self.query('SELECT COUNT(*) FROM collection_analysis') == [(0,)]
+        assert self.query('SELECT COUNT(*) FROM field WHERE field_order IS NOT NULL') == [(0,)]
+
+
+
+class TestFileIndex(object):
+
+    def setup_method(self, method):
+        self.tempdir = tempfile.mkdtemp()
+        self.md = mod.GristleMetaData(self.tempdir)
+        self.fqfn = pjoin(self.tempdir, 'data.csv')
+        with open(self.fqfn, 'w') as outbuf:
+            outbuf.write('id,name\n1,foo\n')
+
+    def teardown_method(self, method):
+        self.md.close()
+        os.remove(self.fqfn)
+        os.remove(os.path.join(self.tempdir, 'metadata.db'))
+        os.rmdir(self.tempdir)
+        if exists(pjoin('/tmp', 'datagristle_metadata.log')):
+            os.remove(pjoin('/tmp', 'datagristle_metadata.log'))
+
+    def test_file_facts(self):
+        file_index_tools = self.md.file_index_tools
+        assert file_index_tools.get_file_facts(self.fqfn) == {}
+
+        file_index_tools.set_file_facts(self.fqfn, record_count=2, header={'raw_field_names': ['id', 'name']})
+        file_index_tools.set_file_facts(self.fqfn, column_count=2)
+        assert file_index_tools.get_file_facts(self.fqfn) == {'record_count': 2,
+                                                              'column_count': 2,
+                                                              'header': {'raw_field_names': ['id', 'name']}}
+
+        with pytest.raises(ValueError):
+            file_index_tools.set_file_facts(self.fqfn, colour='blue')
+
+    def test_changed_file_has_no_facts(self):
+        self.md.file_index_tools.set_file_facts(self.fqfn, record_count=2)
+        with open(self.fqfn, 'a') as outbuf:
+            outbuf.write('2,bar\n')
+        assert self.md.file_index_tools.get_file_facts(self.fqfn) == {}
+
+    def test_connection_pragmas(self):
+        assert self.md.engine.execute('PRAGMA journal_mode').scalar() == 'wal'
+        assert self.md.engine.execute('PRAGMA foreign_keys').scalar() == 1
+
+    def get_last_update_epoch(self):
+        return self.md.engine.execute('SELECT last_update_epoch FROM file_index').scalar()
+
+    def test_reads_batch_last_used_updates(self):
+        file_index_tools = self.md.file_index_tools
+        file_index_tools.set_file_facts(self.fqfn, record_count=2)
+        recent_epoch = self.get_last_update_epoch()
+
+        # Recently-used entries aren't updated by reads:
+        assert file_index_tools.get_file_facts(self.fqfn) == {'record_count': 2}
+        assert self.get_last_update_epoch() == recent_epoch
+        assert file_index_tools._pending_last_used == {}
+
+        # Older ones are - but only once flushed:
+        old_epoch = recent_epoch - mod.LAST_USED_RESOLUTION_SECONDS - 1
+        self.md.engine.execute('UPDATE file_index SET last_update_epoch = ?', old_epoch)
+        assert file_index_tools.get_file_facts(self.fqfn) == {'record_count': 2}
+        assert self.get_last_update_epoch() == old_epoch
+        file_index_tools.flush_last_used()
+        assert self.get_last_update_epoch() >= recent_epoch
+
+    def test_expired_entries_are_pruned_once(self):
+        expired_epoch = time.time() - mod.MAX_UNUSED_SECONDS - 1
+        self.md.engine.execute('INSERT INTO file_index (file_hash, last_update_epoch) VALUES (?, ?)',
+                               'old', expired_epoch)
+        self.md.file_index_tools.set_file_facts(self.fqfn, record_count=2)
+        assert self.md.engine.execute("SELECT COUNT(*) FROM file_index WHERE file_hash = 'old'").scalar() == 0
+
+        # Later writes within the process don't check again:
+        self.md.engine.execute('INSERT INTO file_index (file_hash, last_update_epoch) VALUES (?, ?)',
+                               'old', expired_epoch)
+        self.md.file_index_tools.set_file_facts(self.fqfn, column_count=2)
+        assert self.md.engine.execute("SELECT COUNT(*) FROM file_index WHERE file_hash = 'old'").scalar() == 1
+
+    def test_migrates_old_file_index(self):
+        self.md.engine.execute('DROP TABLE file_index')
+        self.md.engine.execute(''' CREATE TABLE file_index (file_hash VARCHAR(256) NOT NULL PRIMARY KEY,
+                                                            record_count INTEGER,
+                                                            column_count INTEGER,
+                                                            last_update_epoch FLOAT NOT NULL) ''')
+        md = mod.GristleMetaData(self.tempdir)
+        md.file_index_tools.set_file_facts(self.fqfn, dialect={'delimiter': ','})
+        assert md.file_index_tools.get_file_facts(self.fqfn) == {'dialect': {'delimiter': ','}}
+        md.close()
+
+
+
 
 def create_basic_metadata(md):
     """ Used by most above tests to insert a basic set of metadata.
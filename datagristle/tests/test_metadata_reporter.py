@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+""" See the file "LICENSE" for the full license governing this code.
+    Copyright 2022 Ken Farmer
+"""
+#adjust pylint for pytest oddities:
+#pylint: disable=missing-docstring
+#pylint: disable=unused-argument
+#pylint: disable=attribute-defined-outside-init
+#pylint: disable=protected-access
+#pylint: disable=no-self-use
+
+import shutil
+import tempfile
+
+from sqlalchemy import exc
+import pytest
+
+import datagristle.metadata as metadata
+import datagristle.metadata_reporter as mod
+
+
+
+class TestMetadataReporter(object):
+
+    def setup_method(self, method):
+        self.tempdir = tempfile.mkdtemp(prefix='gristle_md_reporter_')
+        self.md = metadata.GristleMetaData(self.tempdir)
+        schema_id = self.md.schema_tools.setter(schema_name='geoip', schema_desc='geoip data')
+        self.collection_id = self.md.collection_tools.setter(schema_id=schema_id,
+                                                             collection_name='geolite_country',
+                                                             collection_desc='maxmind feed')
+        self.instance_id = self.md.instance_tools.get_instance_id(schema_id)
+        self.analysis_ids = [self.write_analysis(row_cnt) for row_cnt in (10, 20, 30)]
+        self.reporter = mod.MetadataReporter(self.md)
+
+    def teardown_method(self, method):
+        self.reporter.close()
+        self.md.close()
+        shutil.rmtree(self.tempdir)
+
+    def write_analysis(self, row_cnt):
+        analysis_id = self.md.analysis_tools.setter(instance_id=self.instance_id,
+                                                    analysis_tool='gristle_profiler')
+        self.md.write_analysis(analysis_id, self.collection_id,
+                               {'ca_name': 'country', 'ca_location': '/tmp/country.csv',
+                                'ca_row_cnt': row_cnt, 'ca_field_cnt': 2},
+                               [{'field_order': 0, 'field_name': 'code', 'field_type': 'string',
+                                 'field_len': 2, 'fa_type': 'string', 'fa_max': str(row_cnt),
+                                 'top_values': [('us', 5), ('ca', 3), ('mx', 3)]},
+                                {'field_order': 1, 'field_name': 'name', 'field_type': 'string',
+                                 'field_len': 40, 'fa_type': 'string'}])
+        return analysis_id
+
+    def get_code_field_id(self):
+        return [field.field_id for field in self.reporter.get_fields(self.collection_id)
+                if field.field_name == 'code'][0]
+
+    def test_latest_analysis(self):
+        assert self.reporter.get_latest_analysis_id(self.collection_id) == self.analysis_ids[-1]
+        assert self.reporter.get_latest_analysis_id(self.collection_id + 1) is None
+
+        ca_row = self.reporter.get_collection_analysis(self.collection_id, self.analysis_ids[-1])
+        assert (ca_row.schema_name, ca_row.ca_row_cnt) == ('geoip', 30)
+
+        fields = self.reporter.get_field_analyses(self.collection_id, self.analysis_ids[0])
+        assert [(field.field_name, field.fa_max) for field in fields] == [('code', '10'), ('name', None)]
+        assert len(self.reporter.get_field_analyses(self.collection_id, self.analysis_ids[0],
+                                                    field_name='name')) == 1
+
+        top_values = self.reporter.get_top_values(fields[0].fa_id, limit=2)
+        assert top_values == [('us', 5), ('ca', 3)]
+
+        data_dictionary = self.reporter.get_data_dictionary(self.collection_id)
+        assert data_dictionary['collection_analysis'].analysis_id == self.analysis_ids[-1]
+        assert len(data_dictionary['top_values'][fields[0].field_id]) == 3
+        assert data_dictionary['top_values'][fields[1].field_id] == []
+
+    def test_top_values_written_by_earlier_versions(self):
+        fa_id = self.reporter.get_field_analyses(self.collection_id, self.analysis_ids[0])[1].fa_id
+        for fav_value, fav_count in (('x', 1), ('y', 3), ('z', 2)):
+            self.md.field_analysis_value_tools.setter(fa_id=fa_id, fav_value=fav_value,
+                                                      fav_count=fav_count)
+        assert self.reporter.get_top_values(fa_id, limit=2) == [('y', 3), ('z', 2)]
+
+    def test_field_values_are_paged(self):
+        field_id = self.get_code_field_id()
+        for fv_value in ('c', 'a', 'e', 'b', 'd'):
+            self.md.field_value_tools.setter(field_id=field_id, fv_value=fv_value, fv_desc=fv_value)
+
+        pages = [self.reporter.get_field_values(field_id, page_size=2)]
+        while pages[-1].next_key is not None:
+            pages.append(self.reporter.get_field_values(field_id, pages[-1].next_key, page_size=2))
+        assert [[row.fv_value for row in page.rows] for page in pages] == [['a', 'b'], ['c', 'd'], ['e']]
+        assert self.reporter.get_field_value(field_id, 'd').fv_desc == 'd'
+        assert self.reporter.get_field_value(field_id, 'z') is None
+
+    def test_field_history_is_paged(self):
+        field_id = self.get_code_field_id()
+        first_page = self.reporter.get_field_history(field_id, page_size=2)
+        assert [row.fa_max for row in first_page.rows] == ['30', '20']
+        last_page = self.reporter.get_field_history(field_id, first_page.next_key, page_size=2)
+        assert [row.fa_max for row in last_page.rows] == ['10']
+        assert last_page.next_key is None
+
+    def test_results_are_cached_until_the_db_changes(self):
+        assert len(self.reporter.get_schemas()) == 1
+        assert len(self.reporter.get_schemas()) == 1
+        assert (self.reporter.hit_cnt, self.reporter.miss_cnt) == (1, 1)
+
+        self.md.schema_tools.setter(schema_name='other', schema_desc='other data')
+        assert [row.schema_name for row in self.reporter.get_schemas()] == ['other', 'geoip']
+        assert (self.reporter.hit_cnt, self.reporter.miss_cnt) == (1, 2)
+
+    def test_connection_is_read_only(self):
+        with pytest.raises(exc.OperationalError):
+            self.reporter.connection.execute('DELETE FROM schema')
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+""" See the file "LICENSE" for the full license governing this code.
+    Copyright 2022 Ken Farmer
+"""
+#adjust pylint for pytest oddities:
+#pylint: disable=missing-docstring
+#pylint: disable=unused-argument
+#pylint: disable=attribute-defined-outside-init
+#pylint: disable=protected-access
+#pylint: disable=no-self-use
+
+from os.path import join as pjoin
+import shutil
+import tempfile
+
+import datagristle.profile_state as mod
+
+
+
+class TestProfileState(object):
+
+    def setup_method(self, method):
+        self.temp_dir = tempfile.mkdtemp(prefix='gristle_profile_state_')
+        self.fqfn = pjoin(self.temp_dir, 'data.csv')
+        self.settings = {'delimiter': ',', 'max_freq': 1000}
+
+    def teardown_method(self, method):
+        shutil.rmtree(self.temp_dir)
+
+    def write_file(self, data, mode='w'):
+        with open(self.fqfn, mode, newline='') as outbuf:
+            outbuf.write(data)
+
+    def get_state(self):
+        end_offset = mod.get_end_offset(self.fqfn)
+        return mod.ProfileState(end_offset=end_offset,
+                                block_digests=mod.get_block_digests(self.fqfn, end_offset),
+                                settings=self.settings,
+                                record_cnt=2,
+                                fields={0: mod.FieldState({'a': 1, 'b': 1}, False, 0)})
+
+    def test_end_offset_excludes_a_partial_last_line(self):
+        self.write_file('a,1\nb,2\nc,')
+        assert mod.get_end_offset(self.fqfn) == 8
+        self.write_file('3\n', mode='a')
+        assert mod.get_end_offset(self.fqfn) == 12
+        self.write_file('no newline')
+        assert mod.get_end_offset(self.fqfn) == 0
+
+    def test_byte_range(self):
+        self.write_file('a,1\nb,2\nc,3\nd,')
+        with mod.open_byte_range(self.fqfn, (4, 12)) as inbuf:
+            assert inbuf.read() == 'b,2\nc,3\n'
+
+    def test_resume_after_append(self):
+        self.write_file('a,1\nb,2\n')
+        state = self.get_state()
+        self.write_file('c,3\n', mode='a')
+        assert mod.get_resume_offset(state, self.fqfn, self.settings) == 8
+
+    def test_no_resume_after_changes(self):
+        self.write_file('a,1\nb,2\n')
+        state = self.get_state()
+        assert mod.get_resume_offset(None, self.fqfn, self.settings) == 0
+        assert mod.get_resume_offset(state, self.fqfn, {'delimiter': '|'}) == 0
+
+        self.write_file('a,1\nb,3\nc,3\n')
+        assert mod.get_resume_offset(state, self.fqfn, self.settings) == 0
+
+        self.write_file('a,1\n')
+        assert mod.get_resume_offset(state, self.fqfn, self.settings) == 0
+
+    def test_pack_and_unpack(self):
+        self.write_file('a,1\nb,2\n')
+        state = self.get_state()._replace(fields={0: mod.FieldState({'a': 1, 1.5: 2}, True, 3)})
+        assert mod.unpack_state(mod.pack_state(state)) == state
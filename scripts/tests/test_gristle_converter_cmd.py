@@ -10,6 +10,8 @@
 #pylint: disable=no-self-use
 #pylint: disable=empty-docstring
 
+import errno
+import shutil
 import tempfile
 import subprocess
 import os
@@ -75,6 +77,24 @@ class TestCommandLine(object):
             pytest.fail('produced output when input was empty')
 
 
+    def test_batch_mode(self):
+        out_dir = tempfile.mkdtemp()
+        try:
+            cmd = f"{PGM} -i {self.easy_fqfn} {self.empty_fqfn} -d '$' -D ',' --out-dir {out_dir} "
+            runner = subprocess.Popen(cmd,
+                                      stderr=subprocess.PIPE,
+                                      shell=True)
+            assert 'is empty' in cleaner(runner.communicate()[1])
+            assert runner.returncode == errno.ENODATA
+            assert os.listdir(out_dir) == [os.path.basename(self.easy_fqfn)]
+            with open(os.path.join(out_dir, os.path.basename(self.easy_fqfn))) as inbuf:
+                out_recs = inbuf.read()[:-1].split('\n')
+            assert len(out_recs) == 100
+            assert out_recs[0] == '0,A,B,C'
+        finally:
+            shutil.rmtree(out_dir)
+
+
 
 def cleaner(val):
     if val is None:
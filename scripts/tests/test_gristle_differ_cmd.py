@@ -293,6 +293,79 @@ class TestCommandLine(object):
         assert self.file_cnt(fn2, '.same') == 0
 
 
+    def test_option_snapshot_dir(self):
+        """ The second run should take its old file from the snapshot saved by
+            the first - and produce the same results as without it.
+        """
+        day1_fqfn = generate_test_file(self.temp_dir, 'day1_', '.csv', self.dialect,
+                                       [['del-row', '6', '16'], ['chg-row', '4', '14']])
+        day2_fqfn = generate_test_file(self.temp_dir, 'day2_', '.csv', self.dialect,
+                                       [['same-row', '8', '18'], ['chg-row', '4', '1a'],
+                                        ['same-row', '8', '18'], ['del-row', '6', '16']])
+        day3_fqfn = generate_test_file(self.temp_dir, 'day3_', '.csv', self.dialect,
+                                       [['chg-row', '4', '1b'], ['new-row', '13a', '45b'],
+                                        ['same-row', '8', '18']])
+        snapshot_dir = pjoin(self.temp_dir, 'snapshots')
+        plain_out_dir = pjoin(self.temp_dir, 'plain')
+        os.mkdir(plain_out_dir)
+
+        def run_differ(old_fqfn, new_fqfn, args):
+            return executor('%s --infiles %s %s -k 0 -c 2 --temp-dir %s '
+                            '--verbosity high %s'
+                            % (pjoin(script_dir, 'gristle_differ'), old_fqfn, new_fqfn,
+                               self.temp_dir, args))
+
+        assert 'snapshot used: False' in run_differ(day1_fqfn, day2_fqfn,
+                                                    f'--snapshot-dir {snapshot_dir}')
+        assert 'snapshot used: True' in run_differ(day2_fqfn, day3_fqfn,
+                                                   f'--snapshot-dir {snapshot_dir}')
+        run_differ(day2_fqfn, day3_fqfn, f'--out-dir {plain_out_dir}')
+
+        fn3 = basename(day3_fqfn)
+        for suffix in ('.insert', '.delete', '.same', '.chgold', '.chgnew'):
+            assert (get_file_contents(pjoin(self.temp_dir, fn3 + suffix), self.dialect)
+                    == get_file_contents(pjoin(plain_out_dir, fn3 + suffix), self.dialect))
+        assert self.file_cnt(fn3, '.delete') == 1
+        assert self.file_cnt(fn3, '.same') == 1
+        assert sorted(os.listdir(snapshot_dir)) == ['hash_cache.db', 'snapshot.csv', 'snapshot.json']
+
+
+    def test_option_snapshot_dir_with_sequence(self):
+        """ Sequences should start after the max of every record of the old
+            file - even those dropped as duplicates from the snapshot.
+        """
+        config = Config(self.temp_dir)
+        config.add_property({'delimiter': '|', 'quoting': 'quote_none', 'has_no_header': True})
+        config.add_assignment('insert', 2, 'sequence', None, 'old', 2)
+        config.write_config()
+        day1_fqfn = generate_test_file(self.temp_dir, 'day1_', '.csv', self.dialect,
+                                       [['a', 'x', '5']])
+        day2_fqfn = generate_test_file(self.temp_dir, 'day2_', '.csv', self.dialect,
+                                       [['a', 'x', '5'], ['b', 'y', '7'], ['a', 'z', '99']])
+        day3_fqfn = generate_test_file(self.temp_dir, 'day3_', '.csv', self.dialect,
+                                       [['a', 'x', '5'], ['b', 'y', '7'], ['d', 'w', ''],
+                                        ['e', 'w', '']])
+        snapshot_dir = pjoin(self.temp_dir, 'snapshots')
+        plain_out_dir = pjoin(self.temp_dir, 'plain')
+        os.mkdir(plain_out_dir)
+
+        def run_differ(old_fqfn, new_fqfn, args):
+            return executor('%s --infiles %s %s -k 0 -c 1 --config-fn %s --temp-dir %s '
+                            '--verbosity high %s'
+                            % (pjoin(script_dir, 'gristle_differ'), old_fqfn, new_fqfn,
+                               config.config_fqfn, self.temp_dir, args))
+
+        run_differ(day1_fqfn, day2_fqfn, f'--snapshot-dir {snapshot_dir}')
+        assert 'snapshot used: True' in run_differ(day2_fqfn, day3_fqfn,
+                                                   f'--snapshot-dir {snapshot_dir}')
+        run_differ(day2_fqfn, day3_fqfn, f'--out-dir {plain_out_dir}')
+
+        fn3 = basename(day3_fqfn)
+        inserts = get_file_contents(pjoin(self.temp_dir, fn3 + '.insert'), self.dialect)
+        assert inserts == [['d', 'w', '100'], ['e', 'w', '101']]
+        assert inserts == get_file_contents(pjoin(plain_out_dir, fn3 + '.insert'), self.dialect)
+
+
     def test_option_column_names_default(self):
         """
         Note that header records are not skipped, but can get used for column_names
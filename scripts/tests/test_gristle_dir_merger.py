@@ -10,13 +10,16 @@
 #pylint: disable=no-self-use
 #pylint: disable=empty-docstring
 
+import errno
 import tempfile
 import shutil
 import os
 from os.path import dirname, join as pjoin
 
 import envoy
+import pytest
 
+import datagristle.hash_cache as hash_cache_mod
 import datagristle.test_tools as test_tools
 
 pgm_path = dirname(dirname(os.path.realpath(__file__)))
@@ -60,6 +63,215 @@ class TestCreateUniqueFileName(object):
         touch(os.path.join(self.dir_name, 'test..'))
         assert mod.create_unique_file_name(self.dir_name, 'test..') == 'test..1.'
 
+    def test_simple_file_name_with_reserved_names(self):
+        touch(os.path.join(self.dir_name, 'test.txt'))
+        reserved = {os.path.join(self.dir_name, 'test.1.txt')}
+        assert mod.create_unique_file_name(self.dir_name, 'test.txt', reserved) == 'test.2.txt'
+
+
+
+class TestCompareFiles(object):
+
+    def setup_method(self, method):
+        self.dir_name = tempfile.mkdtemp(prefix='test_gristle_dir_merger_')
+        self.src_fqfn = pjoin(self.dir_name, 'src.dat')
+        self.dst_fqfn = pjoin(self.dir_name, 'dst.dat')
+        # Not valid utf-8 - and spans the first & last blocks plus several chunks:
+        self.data = bytes(range(256)) * 1000
+
+    def teardown_method(self, method):
+        shutil.rmtree(self.dir_name)
+
+    def write_files(self, src_data, dst_data):
+        with open(self.src_fqfn, 'wb') as outbuf:
+            outbuf.write(src_data)
+        with open(self.dst_fqfn, 'wb') as outbuf:
+            outbuf.write(dst_data)
+
+    def test_identical_binary_files(self):
+        self.write_files(self.data, self.data)
+        assert mod.compare_files(self.src_fqfn, self.dst_fqfn) == 'matched'
+
+    def test_empty_files(self):
+        self.write_files(b'', b'')
+        assert mod.compare_files(self.src_fqfn, self.dst_fqfn) == 'matched'
+
+    def test_different_sizes(self):
+        self.write_files(self.data, self.data + b'x')
+        assert mod.compare_files(self.src_fqfn, self.dst_fqfn) == 'not-matched'
+
+    def test_differences_anywhere(self, monkeypatch):
+        monkeypatch.setattr(mod, 'COMPARE_BLOCK_SIZE', 1000)
+        monkeypatch.setattr(mod, 'COMPARE_CHUNK_SIZE', 7000)
+        for offset in (0, 999, 1000, 6999, 7000, 150000, len(self.data) - 1001, len(self.data) - 1):
+            changed_data = bytearray(self.data)
+            changed_data[offset] ^= 0xFF
+            self.write_files(self.data, bytes(changed_data))
+            assert mod.compare_files(self.src_fqfn, self.dst_fqfn) == 'not-matched', offset
+
+    def test_small_files(self, monkeypatch):
+        monkeypatch.setattr(mod, 'COMPARE_BLOCK_SIZE', 1000)
+        self.write_files(b'abc', b'abc')
+        assert mod.compare_files(self.src_fqfn, self.dst_fqfn) == 'matched'
+        self.write_files(b'abc', b'abd')
+        assert mod.compare_files(self.src_fqfn, self.dst_fqfn) == 'not-matched'
+
+
+    def test_hash_cache(self, monkeypatch):
+        monkeypatch.setattr(mod, 'COMPARE_BLOCK_SIZE', 1000)
+        monkeypatch.setattr(mod, 'COMPARE_CHUNK_SIZE', 7000)
+        hash_cache = mod.HashCache(self.dir_name)
+        try:
+            # Only the digests of files that match are cached - and they're the
+            # same as those of the whole files:
+            for size in (3, 1500, 2500, len(self.data)):
+                self.write_files(self.data[:size], self.data[:size])
+                assert mod.compare_files(self.src_fqfn, self.dst_fqfn, hash_cache) == 'matched'
+                expected_digest = hash_cache_mod.get_file_digest(self.src_fqfn)
+                assert hash_cache.get_cached_digest(self.src_fqfn) == expected_digest
+                assert hash_cache.get_cached_digest(self.dst_fqfn) == expected_digest
+
+            hit_cnt = hash_cache.hit_cnt
+            assert mod.compare_files(self.src_fqfn, self.dst_fqfn, hash_cache) == 'matched'
+            assert hash_cache.hit_cnt == hit_cnt + 2
+
+            changed_data = bytearray(self.data)
+            changed_data[150000] ^= 0xFF
+            self.write_files(self.data, bytes(changed_data))
+            miss_cnt = hash_cache.miss_cnt
+            assert mod.compare_files(self.src_fqfn, self.dst_fqfn, hash_cache) == 'not-matched'
+            assert hash_cache.miss_cnt == miss_cnt
+            assert hash_cache.get_cached_digest(self.dst_fqfn) is None
+        finally:
+            hash_cache.close()
+
+
+
+class TestProcessDirs(object):
+
+    def setup_method(self, method):
+        self.temp_dir = tempfile.mkdtemp(prefix='test_gristle_dir_merger_')
+        self.src_dir = pjoin(self.temp_dir, 'src')
+        self.dst_dir = pjoin(self.temp_dir, 'dst')
+        os.makedirs(pjoin(self.src_dir, 'sub'))
+        os.makedirs(pjoin(self.dst_dir, 'sub'))
+        for file_num in range(50):
+            with open(pjoin(self.src_dir, 'sub', f'f{file_num:02}'), 'w') as outbuf:
+                outbuf.write(f'data {file_num}\n')
+            if file_num % 5:
+                with open(pjoin(self.dst_dir, 'sub', f'f{file_num:02}'), 'w') as outbuf:
+                    outbuf.write(f'data {file_num if file_num % 2 else -file_num}\n')
+        touch(pjoin(self.dst_dir, 'sub', '.hidden'))
+
+    def teardown_method(self, method):
+        shutil.rmtree(self.temp_dir)
+
+    def get_process_dirs(self, io_workers):
+        return mod.ProcessDirs(self.src_dir, 'name_and_md5', 'keep_dest', 'keep_source',
+                               recursive=True, dry_run=False, ignore_err=False,
+                               io_workers=io_workers)
+
+    def test_get_walk_entries(self):
+        touch(pjoin(self.src_dir, 'b'))
+        touch(pjoin(self.src_dir, 'a'))
+        process_dirs = self.get_process_dirs(1)
+        assert process_dirs.get_walk_entries(self.src_dir) == (['sub'], ['a', 'b'])
+
+    def test_is_srcfile_in_destdir(self):
+        process_dirs = self.get_process_dirs(1)
+        dst_subdir = pjoin(self.dst_dir, 'sub')
+        assert process_dirs._is_srcfile_in_destdir('f01', dst_subdir)
+        assert process_dirs._is_srcfile_in_destdir('.hidden', dst_subdir)
+        assert not process_dirs._is_srcfile_in_destdir('f00', dst_subdir)
+        assert not process_dirs._is_srcfile_in_destdir('f01', pjoin(self.dst_dir, 'missing'))
+
+    def test_concurrent_comparisons(self):
+        process_dirs = self.get_process_dirs(4)
+        try:
+            process_dirs.walk(self.src_dir, self.dst_dir)
+        finally:
+            process_dirs.close()
+        assert (process_dirs.full_match_cnt, process_dirs.partial_match_cnt,
+                process_dirs.no_match_cnt) == (20, 20, 10)
+        assert not os.path.exists(self.src_dir)
+        for file_num in range(50):
+            with open(pjoin(self.dst_dir, 'sub', f'f{file_num:02}')) as inbuf:
+                assert inbuf.read() == f'data {file_num}\n'
+
+
+
+class TestFileMover(object):
+
+    def setup_method(self, method):
+        self.src_dir = tempfile.mkdtemp(prefix='test_gristle_dir_merger_')
+        self.dst_dir = tempfile.mkdtemp(prefix='test_gristle_dir_merger_')
+        self.data = bytes(range(256)) * 4000
+        self.src_fqfns = []
+        for file_num in range(5):
+            self.src_fqfns.append(pjoin(self.src_dir, f'f{file_num}'))
+            with open(self.src_fqfns[-1], 'wb') as outbuf:
+                outbuf.write(self.data[file_num:])
+            os.utime(self.src_fqfns[-1], (1000000000, 1000000000))
+
+    def teardown_method(self, method):
+        shutil.rmtree(self.src_dir)
+        shutil.rmtree(self.dst_dir)
+
+    def assert_moved(self):
+        assert os.listdir(self.src_dir) == []
+        assert sorted(os.listdir(self.dst_dir)) == [f'f{file_num}' for file_num in range(5)]
+        for file_num in range(5):
+            dst_fqfn = pjoin(self.dst_dir, f'f{file_num}')
+            with open(dst_fqfn, 'rb') as inbuf:
+                assert inbuf.read() == self.data[file_num:]
+            assert os.path.getmtime(dst_fqfn) == 1000000000
+
+    def plan_moves(self, mover):
+        for src_fqfn in self.src_fqfns:
+            mover.plan(src_fqfn, pjoin(self.dst_dir, os.path.basename(src_fqfn)))
+        assert os.listdir(self.dst_dir) == []
+
+    def test_same_device_renames(self):
+        mover = mod.FileMover()
+        self.plan_moves(mover)
+        mover.run()
+        self.assert_moved()
+        assert (mover.rename_cnt, mover.copy_cnt) == (5, 0)
+        assert mover.planned_moves == []
+
+    def test_cross_device_copies(self, monkeypatch):
+        real_stat = os.stat
+        def fake_stat(path, *args, **kwargs):
+            # Puts the dest dir on a different device:
+            file_stat = real_stat(path, *args, **kwargs)
+            if str(path).startswith(self.dst_dir):
+                return os.stat_result((file_stat[0], file_stat[1], file_stat[2] + 1) + tuple(file_stat[3:]))
+            return file_stat
+        monkeypatch.setattr(os, 'stat', fake_stat)
+        mover = mod.FileMover(io_workers=3)
+        self.plan_moves(mover)
+        try:
+            mover.run()
+        finally:
+            mover.close()
+        self.assert_moved()
+        assert (mover.rename_cnt, mover.copy_cnt) == (0, 5)
+        assert mover.copy_bytes == sum(len(self.data[file_num:]) for file_num in range(5))
+        assert mover.get_copy_throughput() > 0
+
+    @pytest.mark.parametrize('unsupported', ['copy_file_range', 'sendfile'])
+    def test_copy_file_contents_fallbacks(self, monkeypatch, unsupported):
+        def unsupported_copier(*args):
+            raise OSError(errno.ENOSYS, 'not supported')
+        monkeypatch.setattr(os, 'copy_file_range', unsupported_copier, raising=False)
+        if unsupported == 'sendfile':
+            monkeypatch.setattr(os, 'sendfile', unsupported_copier, raising=False)
+        dst_fqfn = pjoin(self.dst_dir, 'copy')
+        with open(self.src_fqfns[0], 'rb') as src_f, open(dst_fqfn, 'wb') as dst_f:
+            assert mod.copy_file_contents(src_f, dst_f) == len(self.data)
+        with open(dst_fqfn, 'rb') as inbuf:
+            assert inbuf.read() == self.data
+
 
 
 def touch(fname, times=None):
@@ -678,6 +678,64 @@ class TestDryRun(TestFixture):
 
 
 
+class TestHashCache(TestFixture):
+    """ Tests gristle_dir_merger reusing content digests from a prior run.
+    """
+
+    def setup_method(self, method):
+        super().setup_method(method)
+        self.cache_dir = tempfile.mkdtemp(prefix='TestGristleDirMerger_cache_')
+
+    def teardown_method(self, method):
+        super().teardown_method(method)
+        shutil.rmtree(self.cache_dir)
+
+    def get_cmd(self, extra_args=''):
+        return """%(pgm)s                              \
+                      --source-dir %(source_dir)s      \
+                      --dest-dir %(dest_dir)s          \
+                      --hash-cache-dir %(cache_dir)s   \
+                      --on-partial-match keep_source  \
+                      --verbosity debug                \
+                      %(extra_args)s                   \
+               """ % {'pgm': PGM,
+                      'source_dir': self.source_dir,
+                      'dest_dir': self.dest_dir,
+                      'cache_dir': self.cache_dir,
+                      'extra_args': extra_args}
+
+    def test_real_run_after_dry_run(self):
+        create_test_file(self.source_dir, 'same.csv', records=1000)
+        create_test_file(self.dest_dir, 'same.csv', records=1000)
+        create_test_file(self.source_dir, 'diff.csv', records=1000, last_row_odd=True)
+        create_test_file(self.dest_dir, 'diff.csv', records=1000)
+
+        runner = envoy.run(self.get_cmd('--dry-run'))
+        print_outputs(runner)
+        assert runner.status_code == 0
+        # diff.csv differs within its last block - so it's never hashed:
+        assert 'Hash Cache Hit Cnt:         0' in runner.std_out
+        assert 'Hash Cache Miss Cnt:        2' in runner.std_out
+
+        runner = envoy.run(self.get_cmd())
+        print_outputs(runner)
+        assert runner.status_code == 0
+        assert 'Hash Cache Hit Cnt:         2' in runner.std_out
+        assert 'Hash Cache Miss Cnt:        0' in runner.std_out
+        assert sorted(os.listdir(self.dest_dir)) == ['diff.csv', 'same.csv']
+        assert get_file_contents(pjoin(self.dest_dir, 'diff.csv')).endswith('BLAHBLAHBLAHFIDOBLAHBLAH\n')
+
+    def test_no_hash_cache(self):
+        create_test_file(self.source_dir, 'same.csv')
+        create_test_file(self.dest_dir, 'same.csv')
+        runner = envoy.run(self.get_cmd('--no-hash-cache'))
+        print_outputs(runner)
+        assert runner.status_code == 0
+        assert 'Hash Cache' not in runner.std_out
+        assert os.listdir(self.cache_dir) == []
+
+
+
 class TestDeepDirectory(TestFixture):
     """ Tests gristle_dir_merger with action of keep_newest.
     """
@@ -444,3 +444,59 @@ class TestMaxFreq(object):
         assert self.field_struct['field_0']['main']['min'] == 'Alabama'
         assert self.field_struct['field_0']['main']['max'] == 'Kentucky' # affected
         assert self.field_struct['field_0']['main']['unique_values'] == '10' # affected
+
+
+
+class TestIncremental(object):
+
+    def setup_method(self, method):
+        self.tmp_dir = tempfile.mkdtemp(prefix='datagristle_profiler_')
+        self.env = {'XDG_DATA_HOME': pjoin(self.tmp_dir, 'data')}
+        os.makedirs(pjoin(self.tmp_dir, 'data', 'datagristle'))
+        self.fqfn = pjoin(self.tmp_dir, 'states.csv')
+        self.write_recs(0, 50, mode='w')
+
+    def teardown_method(self, teardown):
+        shutil.rmtree(self.tmp_dir)
+
+    def write_recs(self, start, stop, mode='a'):
+        with open(self.fqfn, mode) as outbuf:
+            for rec_num in range(start, stop):
+                outbuf.write(f'{rec_num},state{rec_num % 7},{rec_num * 1.5}\n')
+
+    def run_profiler(self, *args):
+        cmd = '%s --infiles %s -d , -q quote_none --has-no-header --output-format=parsable %s' \
+              % (pjoin(script_path, 'gristle_profiler'), self.fqfn, ' '.join(args))
+        runner = envoy.run(cmd, env=self.env)
+        print(runner.std_err)
+        assert runner.status_code == 0
+        return runner.std_out
+
+    def test_appended_records_match_a_full_profile(self):
+        assert self.run_profiler('--incremental') == self.run_profiler()
+        self.write_recs(50, 80)
+        with open(self.fqfn, 'a') as outbuf:
+            outbuf.write('80,sta')
+        incremental_out = self.run_profiler('--incremental')
+
+        full_out = self.run_profiler()
+        assert incremental_out != full_out
+        with open(self.fqfn, 'r+') as outbuf:
+            outbuf.truncate(outbuf.seek(0, os.SEEK_END) - len('80,sta'))
+        assert incremental_out == self.run_profiler()
+        assert get_value(incremental_out, 'file_analysis_results', 'main', 'main',
+                         'record_count') == '80'
+
+    def test_changed_files_are_profiled_from_the_start(self):
+        self.run_profiler('--incremental')
+        self.write_recs(0, 40, mode='w')
+        incremental_out = self.run_profiler('--incremental')
+        assert incremental_out == self.run_profiler()
+        assert get_value(incremental_out, 'file_analysis_results', 'main', 'main',
+                         'record_count') == '40'
+
+    def test_read_limit_is_rejected(self):
+        cmd = '%s --infiles %s --incremental --read-limit 10' \
+              % (pjoin(script_path, 'gristle_profiler'), self.fqfn)
+        runner = envoy.run(cmd, env=self.env)
+        assert runner.status_code != 0
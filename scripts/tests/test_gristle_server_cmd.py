@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+""" See the file "LICENSE" for the full license governing this code.
+    Copyright 2022 Ken Farmer
+"""
+#adjust pylint for pytest oddities:
+#pylint: disable=missing-docstring
+#pylint: disable=unused-argument
+#pylint: disable=attribute-defined-outside-init
+#pylint: disable=protected-access
+#pylint: disable=no-self-use
+
+import os
+from os.path import dirname, exists
+from os.path import join as pjoin
+import shutil
+import subprocess
+import tempfile
+import time
+
+import envoy
+
+SCRIPT_DIR = dirname(dirname(os.path.realpath((__file__))))
+SERVER_PGM = pjoin(SCRIPT_DIR, 'gristle_server')
+CLIENT_PGM = pjoin(SCRIPT_DIR, 'gristle_client')
+CONVERTER_PGM = pjoin(SCRIPT_DIR, 'gristle_converter')
+VALIDATOR_PGM = pjoin(SCRIPT_DIR, 'gristle_validator')
+
+
+
+class TestServer(object):
+
+    def setup_method(self, method):
+        self.temp_dir = tempfile.mkdtemp(prefix='gristle_server_')
+        self.socket_path = pjoin(self.temp_dir, 'server.sock')
+        self.env = {'GRISTLE_SERVER_SOCKET': self.socket_path,
+                    'PATH': SCRIPT_DIR + os.pathsep + os.environ.get('PATH', '')}
+        self.in_fqfn = pjoin(self.temp_dir, 'in.csv')
+        with open(self.in_fqfn, 'w') as outbuf:
+            outbuf.write('id,name,color\n')
+            for rec_num in range(100):
+                outbuf.write(f'{rec_num},name{rec_num},{"red" if rec_num % 3 else "blue"}\n')
+
+        self.server = subprocess.Popen([SERVER_PGM], env=dict(os.environ, **self.env))
+        for _ in range(100):
+            if exists(self.socket_path):
+                break
+            time.sleep(0.1)
+        assert exists(self.socket_path)
+
+    def teardown_method(self, method):
+        self.server.terminate()
+        self.server.wait(timeout=10)
+        shutil.rmtree(self.temp_dir)
+
+    def run_cmd(self, cmd):
+        return envoy.run(cmd, env=self.env, cwd=self.temp_dir)
+
+    def test_output_matches_direct_run(self):
+        args = f"-i {self.in_fqfn} -d ',' -q quote_none --has-header -D ':'"
+        direct_runner = self.run_cmd(f'{CONVERTER_PGM} {args}')
+        server_runner = self.run_cmd(f'{CLIENT_PGM} gristle_converter {args}')
+        assert direct_runner.status_code == server_runner.status_code == 0
+        assert server_runner.std_out == direct_runner.std_out
+        assert server_runner.std_out.startswith('id:name:color\n0:name0:blue\n')
+
+    def test_cwd_and_stdin(self):
+        with open(self.in_fqfn, 'rb') as inbuf:
+            runner = subprocess.run([CLIENT_PGM, 'gristle_slicer', '-i', '-', '-c', '0', '-d', ',',
+                                     '-q', 'quote_none', '--has-header', '-o', 'out.csv'],
+                                    stdin=inbuf, stderr=subprocess.PIPE, timeout=30,
+                                    env=dict(os.environ, **self.env), cwd=self.temp_dir)
+        assert runner.returncode == 0, runner.stderr
+        with open(pjoin(self.temp_dir, 'out.csv')) as inbuf:
+            assert inbuf.read() == 'id\n' + ''.join(f'{rec_num}\n' for rec_num in range(100))
+
+    def test_returncode(self):
+        args = f"-i {self.in_fqfn} -d ',' -q quote_none --has-header --field-cnt 4"
+        direct_runner = self.run_cmd(f'{VALIDATOR_PGM} {args}')
+        server_runner = self.run_cmd(f'{CLIENT_PGM} gristle_validator {args}')
+        assert direct_runner.status_code != 0
+        assert server_runner.status_code == direct_runner.status_code
+
+    def test_unknown_tool(self):
+        runner = self.run_cmd(f'{CLIENT_PGM} gristle_nonexistent -h')
+        assert runner.status_code == 1
+        assert 'not served' in runner.std_err
+
+    def test_direct_run_without_server(self):
+        self.server.terminate()
+        self.server.wait(timeout=10)
+        assert not exists(self.socket_path)
+
+        args = f"-i {self.in_fqfn} -d ',' -q quote_none --has-header -D ':'"
+        runner = self.run_cmd(f'{CLIENT_PGM} gristle_converter {args}')
+        assert runner.status_code == 0
+        assert runner.std_out.startswith('id:name:color\n0:name0:blue\n')
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+""" Tracks the startup import costs of the gristle scripts - which matter
+    when they're run many times within shell pipelines.
+
+    Run directly to get a benchmark of each script's import times:
+        $ python scripts/tests/test_gristle_startup_cmd.py
+
+    See the file "LICENSE" for the full license governing this code.
+    Copyright 2022 Ken Farmer
+"""
+#adjust pylint for pytest oddities:
+#pylint: disable=missing-docstring
+#pylint: disable=unused-argument
+#pylint: disable=attribute-defined-outside-init
+#pylint: disable=protected-access
+#pylint: disable=no-self-use
+
+import os
+from os.path import dirname
+from os.path import join as pjoin
+import sys
+from typing import List, NamedTuple
+
+import envoy
+import pytest
+
+SCRIPT_DIR = dirname(dirname(os.path.realpath((__file__))))
+
+SCRIPTS = ['gristle_converter', 'gristle_differ', 'gristle_dir_merger', 'gristle_freaker',
+           'gristle_profiler', 'gristle_slicer', 'gristle_sorter', 'gristle_validator',
+           'gristle_viewer']
+
+# These are slow to import, and must only be imported on the code paths that use them:
+HEAVY_MODULES = ['appdirs', 'jsonschema', 'numpy', 'psutil', 'pydantic', 'ruamel', 'sqlalchemy']
+
+
+
+class ImportTime(NamedTuple):
+    module: str
+    cumulative_usecs: int
+    is_top_level: bool
+
+
+
+def get_import_times(script: str) -> List[ImportTime]:
+    """ Returns the import time of every module imported by a script's help -
+        as reported by python -X importtime.
+    """
+    runner = envoy.run(f'{sys.executable} -X importtime {pjoin(SCRIPT_DIR, script)} --help')
+    assert runner.status_code == 0, runner.std_err
+    import_times = []
+    for line in runner.std_err.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_usecs, module = line.split('|')
+        import_times.append(ImportTime(module=module.strip(),
+                                       cumulative_usecs=int(cumulative_usecs),
+                                       is_top_level=not module.startswith('  ')))
+    return import_times
+
+
+
+class TestStartupImports(object):
+
+    @pytest.mark.parametrize('script', SCRIPTS)
+    def test_heavy_modules_are_not_imported(self, script):
+        modules = [import_time.module for import_time in get_import_times(script)]
+        assert 'datagristle.configulator' in modules
+        heavy_modules = [module for module in modules
+                         if module.split('.')[0] in HEAVY_MODULES]
+        assert heavy_modules == []
+
+
+
+def print_benchmark() -> None:
+    print(f'{"script":<22} {"total ms":>9}   slowest top-level imports')
+    for script in SCRIPTS:
+        top_level = [import_time for import_time in get_import_times(script)
+                     if import_time.is_top_level]
+        slowest = sorted(top_level, key=lambda import_time: import_time.cumulative_usecs, reverse=True)
+        total_ms = sum(import_time.cumulative_usecs for import_time in top_level) / 1000
+        print(f'{script:<22} {total_ms:>9.1f}   '
+              + ', '.join(f'{import_time.module}: {import_time.cumulative_usecs / 1000:.1f}'
+                          for import_time in slowest[:3]))
+
+
+
+if __name__ == '__main__':
+    print_benchmark()
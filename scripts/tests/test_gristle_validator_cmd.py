@@ -298,6 +298,54 @@ class TestEmptyFile(object):
 
 
 
+class TestBatchMode(object):
+
+    def setup_method(self, method):
+        self.tmp_dir = tempfile.mkdtemp(prefix='TestGristleValidator_')
+        for dir_name in ('in', 'out', 'err'):
+            os.mkdir(pjoin(self.tmp_dir, dir_name))
+        for file_num in range(6):
+            with open(pjoin(self.tmp_dir, 'in', f'in_{file_num}.csv'), 'w') as outbuf:
+                outbuf.write('foo,bar,batz,1.9,2,0\n')
+                # Every third file has a record with a bad field count:
+                outbuf.write('foo,bar,batz\n' if file_num % 3 == 0 else 'foo,bar,batz,1.9,2,1\n')
+
+    def teardown_method(self, method):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_batch_matches_single_runs(self):
+        cmd = f"""{fq_pgm} -i {pjoin(self.tmp_dir, 'in')}
+                  --out-dir {pjoin(self.tmp_dir, 'out')}
+                  --err-dir {pjoin(self.tmp_dir, 'err')}
+                  --out-pattern '{{stem}}.out'
+                  --file-workers 2
+                  -f 6
+               """
+        runner = envoy.run(cmd)
+        assert runner.status_code == errno.EBADMSG, runner.std_err
+        assert sorted(os.listdir(pjoin(self.tmp_dir, 'out'))) == [f'in_{x}.out' for x in range(6)]
+
+        for file_num in range(6):
+            in_fqfn = pjoin(self.tmp_dir, 'in', f'in_{file_num}.csv')
+            single_runner = envoy.run(f'{fq_pgm} -i {in_fqfn} -f 6')
+            with open(pjoin(self.tmp_dir, 'out', f'in_{file_num}.out')) as outbuf:
+                assert outbuf.read() == single_runner.std_out
+            with open(pjoin(self.tmp_dir, 'err', f'in_{file_num}.out')) as errbuf:
+                assert errbuf.read() == single_runner.std_err
+
+    def test_invalid_batch_options(self):
+        cmd = f"""{fq_pgm} -i {pjoin(self.tmp_dir, 'in')}
+                  --out-dir {pjoin(self.tmp_dir, 'out')}
+                  --outfile {pjoin(self.tmp_dir, 'out.csv')}
+               """
+        assert envoy.run(cmd).status_code == 1
+        cmd = f"""{fq_pgm} -i {pjoin(self.tmp_dir, 'in', 'in_1.csv')}
+                  --err-dir {pjoin(self.tmp_dir, 'err')}
+               """
+        assert envoy.run(cmd).status_code == 1
+
+
+
 def print_file(fn):
     pp('++++++++++++++++++++++++++++++++++++++++++++++++')
     for rec in fileinput.input(fn):
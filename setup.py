@@ -37,7 +37,8 @@ setup(name='datagristle',
                    'Topic :: Scientific/Engineering :: Information Analysis',
                    'Topic :: Text Processing',
                    'Topic :: Utilities'],
-      scripts=['scripts/gristle_converter',
+      scripts=['scripts/gristle_client',
+               'scripts/gristle_converter',
                'scripts/gristle_determinator',
                'scripts/gristle_differ',
                'scripts/gristle_dir_merger',
@@ -46,6 +47,7 @@ setup(name='datagristle',
                'scripts/gristle_metadata',
                'scripts/gristle_md_reporter',
                'scripts/gristle_profiler',
+               'scripts/gristle_server',
                'scripts/gristle_slicer',
                'scripts/gristle_sorter',
                'scripts/gristle_validator',
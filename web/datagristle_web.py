@@ -8,6 +8,7 @@ from flask import Flask, request, session, g, redirect, url_for, abort, \
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import datagristle.metadata as md
+import datagristle.metadata_reporter as metadata_reporter
 ###from sqlite3 import dbapi2 as sqlite3
 from sqlalchemy import (UniqueConstraint, ForeignKeyConstraint, CheckConstraint)
 
@@ -22,8 +23,13 @@ import appdirs
 #    os.makedirs(user_data_dir)
 
 meta = md.GristleMetaData()
+# All page reads share one connection, and cached results, through the reporter:
+reporter = metadata_reporter.MetadataReporter(meta)
 app  = Flask(__name__)
 
+HISTORY_PAGE_SIZE = 20
+TOP_VALUE_CNT = 100
+
 
 
 
@@ -34,22 +40,7 @@ app  = Flask(__name__)
 
 @app.route('/', methods=['GET'])
 def datagristle():
-    connection = meta.engine.connect()
-    raw_sql    = """SELECT s.schema_name,
-                         s.schema_id,
-                         s.schema_desc,
-                         COALESCE(COUNT(c.schema_id), 0) as coll_cnt
-                  FROM schema s
-                     LEFT OUTER JOIN collection c
-                        ON s.schema_id = c.schema_id
-                  GROUP BY s.schema_Name,
-                           s.schema_id,
-                           s.schema_desc
-                  ORDER BY 1 DESC
-               """
-    sql     = text(raw_sql)
-    result  = connection.execute(sql)
-    rows    = result.fetchall()
+    rows = reporter.get_schemas()
     return render_template('splash.html', schema_rows=rows)
 
 
@@ -57,36 +48,22 @@ def datagristle():
 @app.route('/schema<int:schema_id>/')
 def schema(schema_id):
 
-    connection = meta.engine.connect()
     msg     = ''
 
     #----- Get info for single schema row: -----
-    raw_sql = """SELECT schema_name, schema_id, schema_desc
-                   FROM schema
-                  WHERE schema_id = :schema_id"""
-    sql     = text(raw_sql)
-
-    # todo: handle odd exceptions here:
-    result = connection.execute(sql, schema_id=schema_id)
-    rows   = result.fetchall()
-    if len(rows) == 0:   # shouldn't normally happen
+    row = reporter.get_schema(schema_id)
+    if row is None:   # shouldn't normally happen
        si = ''
        sn = ''
        sd = ''
        msg = 'Schema not found'
     else:
        si = schema_id
-       sn = rows[0].schema_name
-       sd = rows[0].schema_desc
+       sn = row.schema_name
+       sd = row.schema_desc
 
     #----- Get list of collection rows: -----
-    raw_sql = """SELECT collection_id, collection_name, collection_desc
-                   FROM collection
-                  WHERE schema_id = :schema_id"""
-    sql     = text(raw_sql)
-    # todo: handle odd exceptions here:
-    result    = connection.execute(sql, schema_id=schema_id)
-    coll_rows = result.fetchall()
+    coll_rows = reporter.get_collections(schema_id)
 
     return render_template('schema.html',
             msg=msg,
@@ -164,12 +141,7 @@ def schema_delete(schema_id):
 def collection(schema_id, coll_id):
     coll_row   = meta.collection_tools.getter(collection_id=coll_id)
 
-    field_q = """SELECT field_id, field_name, field_desc, field_type,
-                        field_order, field_len
-                    FROM field
-                WHERE collection_id = :coll_id"""
-    fields  = meta.engine.execute(field_q, coll_id=coll_id)
-    field_rows = fields.fetchall()
+    field_rows = reporter.get_fields(coll_id)
 
     return render_template('collection.html',
             sid=schema_id, cid=coll_id, coll_rows=coll_row, field_rows=field_rows)
@@ -241,18 +213,29 @@ def collection_delete(schema_id, coll_id):
 def field(schema_id, coll_id, field_id):
     row   = meta.field_tools.getter(field_id=field_id)
 
-    fv_sql = """SELECT fv_value, fv_desc, fv_issues
-                    FROM field_value
-                WHERE field_id = :field_id"""
-    fvalues = meta.engine.execute(fv_sql, field_id=field_id)
-    fv_rows = fvalues.fetchall()
+    # Values & history are paged - by passing the last key of the prior page:
+    fv_after = request.args.get('fv_after')
+    fv_page = reporter.get_field_values(field_id, after_value=fv_after)
+    before_ca_id = request.args.get('history_before', type=int)
+    history_page = reporter.get_field_history(field_id, before_ca_id=before_ca_id,
+                                              page_size=HISTORY_PAGE_SIZE)
+    # The value distribution of the newest analysis on the page:
+    top_rows = []
+    if history_page.rows:
+        top_rows = reporter.get_top_values(history_page.rows[0].fa_id, limit=TOP_VALUE_CNT)
 
     return render_template('field.html',
                            sid=schema_id,
                            cid=coll_id,
                            fid=field_id,
                            field_rows=row,
-                           fv_rows=fv_rows)
+                           fv_rows=fv_page.rows,
+                           fv_after=fv_after,
+                           fv_next=fv_page.next_key,
+                           history_rows=history_page.rows,
+                           history_before=before_ca_id,
+                           history_next=history_page.next_key,
+                           top_rows=top_rows)
 
 
 @app.route('/schema<int:schema_id>/collection<int:coll_id>/field/new', methods=['GET', 'POST'])
@@ -330,21 +313,17 @@ def field_edit(schema_id, coll_id, field_id):
 @app.route('/schema<int:schema_id>/collection<int:coll_id>/field<int:field_id>/fv<fv_value>/', methods=['GET'])
 def fv(schema_id, coll_id, field_id, fv_value):
 
-    fv_sql = """SELECT fv_desc,
-                       fv_issues
-                    FROM field_value
-                WHERE field_id = :field_id
-                  AND fv_value = :fv_value"""
-    fvalues = meta.engine.execute(fv_sql, field_id=field_id, fv_value=fv_value)
-    fv_row = fvalues.fetchall()
+    fv_row = reporter.get_field_value(field_id, fv_value)
+    if fv_row is None:
+        abort(404)
 
     return render_template('fv.html',
                            sid=schema_id,
                            cid=coll_id,
                            fid=field_id,
                            fvv=fv_value,
-                           fvd=fv_row[0][0],
-                           fvi=fv_row[0][1])
+                           fvd=fv_row.fv_desc,
+                           fvi=fv_row.fv_issues)
 
 
 
@@ -396,19 +375,15 @@ def fv_edit(schema_id, coll_id, field_id, fv_value):
                return redirect('/schema%i/collection%i/field%i/fv%s' % \
                               (schema_id, coll_id, field_id, fv_value))
     else:
-        fv_sql = """SELECT fv_desc,
-                           fv_issues
-                        FROM field_value
-                    WHERE field_id = :field_id
-                    AND fv_value = :fv_value"""
-        fvalues = meta.engine.execute(fv_sql, field_id=field_id, fv_value=fv_value)
-        row = fvalues.fetchall()
+        row = reporter.get_field_value(field_id, fv_value)
+        if row is None:
+            abort(404)
 
         return render_template("fv_edit.html", action='edit', sid=schema_id, cid=coll_id,
                                fid=field_id,
                                fv=fv_value,
-                               fvd=row[0][0],
-                               fvi=row[0][1])
+                               fvd=row.fv_desc,
+                               fvi=row.fv_issues)
 
 @app.route('/schema<int:schema_id>/collection<int:coll_id>/field<int:field_id>/fv<fv_value>/delete', methods=['GET', 'POST'])
 def fv_delete(schema_id, coll_id, field_id, fv_value):